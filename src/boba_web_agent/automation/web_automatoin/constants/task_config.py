@@ -7,4 +7,6 @@ FIELD_NAME_TASK_CONFIG_ACTION_ARGS = 'args'
 FIELD_NAME_TASK_CONFIG_ACTION_INIT_COND = 'cond'
 FIELD_NAME_TASK_CONFIG_ACTION_REPEAT = 'repeat'
 FIELD_NAME_TASK_CONFIG_ACTION_REPEAT_COND = 'repeat_when'
+FIELD_NAME_TASK_CONFIG_ACTION_COND_TIMEOUT = 'cond_timeout'
+FIELD_NAME_TASK_CONFIG_ACTION_REPEAT_COND_TIMEOUT = 'repeat_cond_timeout'
 FIELD_NAME_TASK_CONFIG_ACTION_SCREENSHOT = 'screenshot'
\ No newline at end of file
@@ -0,0 +1,306 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from os import path, environ
+from typing import Optional, Mapping, Tuple, Callable, MutableMapping
+
+from boba_python_utils.path_utils.common import ensure_dir_existence
+
+ENV_NAME_DRIVER_REGISTRY_PATH = 'BOBA_WEB_AGENT_DRIVER_REGISTRY'
+DEFAULT_DRIVER_REGISTRY_PATH = path.join(path.expanduser('~'), '.cache', 'boba_web_agent', 'driver_registry.json')
+
+BROWSER_EXECUTABLES = {
+    'chrome': (
+        'google-chrome',
+        'google-chrome-stable',
+        'chromium',
+        'chromium-browser',
+        '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',
+        r'C:\Program Files\Google\Chrome\Application\chrome.exe',
+        r'C:\Program Files (x86)\Google\Chrome\Application\chrome.exe'
+    ),
+    'firefox': (
+        'firefox',
+        '/Applications/Firefox.app/Contents/MacOS/firefox',
+        r'C:\Program Files\Mozilla Firefox\firefox.exe'
+    ),
+    'edge': (
+        'microsoft-edge',
+        'microsoft-edge-stable',
+        '/Applications/Microsoft Edge.app/Contents/MacOS/Microsoft Edge',
+        r'C:\Program Files (x86)\Microsoft\Edge\Application\msedge.exe',
+        r'C:\Program Files\Microsoft\Edge\Application\msedge.exe'
+    )
+}
+
+VERSION_REGEX = re.compile(r'\d+(?:\.\d+)+')
+
+
+def _get_driver_type_name(driver_type) -> str:
+    return getattr(driver_type, 'value', driver_type)
+
+
+def find_browser_executable(driver_type) -> Optional[str]:
+    """
+    Finds the locally installed browser executable for a driver type ('chrome', 'firefox' or 'edge').
+    This is a pure filesystem lookup.
+    """
+    for executable in BROWSER_EXECUTABLES.get(_get_driver_type_name(driver_type), ()):
+        if path.isabs(executable):
+            if path.exists(executable):
+                return executable
+        else:
+            executable = shutil.which(executable)
+            if executable:
+                return executable
+
+
+def get_browser_version(browser_executable: str) -> Optional[str]:
+    """
+    Gets the version of a browser executable, e.g. '124.0.6367.91'.
+    """
+    if sys.platform.startswith('win'):
+        command = ['powershell', '-Command', f"(Get-Item '{browser_executable}').VersionInfo.ProductVersion"]
+    else:
+        command = [browser_executable, '--version']
+    try:
+        output = subprocess.run(command, capture_output=True, text=True, timeout=30).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = VERSION_REGEX.search(output)
+    if match:
+        return match.group(0)
+
+
+def get_major_version(version: str) -> str:
+    return version.split('.')[0]
+
+
+def install_driver_binary(driver_type, browser_version: str = None) -> str:
+    """
+    Downloads (if needed) the driver binary by `webdriver_manager`, and returns its path.
+
+    Args:
+        driver_type: One of 'chrome', 'firefox' or 'edge'.
+        browser_version: The version of the browser the chromedriver or msedgedriver must match;
+            if not specified, `webdriver_manager` detects the browser version by itself.
+            geckodriver is not versioned with the browser and always resolves to the latest release.
+    """
+    driver_type = _get_driver_type_name(driver_type)
+    if driver_type == 'firefox':
+        from webdriver_manager.firefox import GeckoDriverManager
+        return GeckoDriverManager().install()
+    elif driver_type == 'chrome':
+        from webdriver_manager.chrome import ChromeDriverManager
+        try:
+            driver_manager = ChromeDriverManager(driver_version=browser_version)
+        except TypeError:
+            # webdriver_manager < 4
+            driver_manager = ChromeDriverManager(version=browser_version)
+        return driver_manager.install()
+    elif driver_type == 'edge':
+        from webdriver_manager.microsoft import EdgeChromiumDriverManager
+        return EdgeChromiumDriverManager(version=browser_version).install()
+    else:
+        raise ValueError(f"Unsupported driver for the driver registry: {driver_type}")
+
+
+@contextmanager
+def _lock_file(lock_path: str):
+    """Holds an exclusive lock on `lock_path` across threads and processes."""
+    ensure_dir_existence(path.dirname(lock_path))
+    with open(lock_path, 'a') as lock_file:
+        if sys.platform.startswith('win'):
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class DriverBinaryRegistry:
+    """
+    A local on-disk registry of driver binaries (chromedriver, geckodriver, msedgedriver),
+    pinned to the major version of the locally installed browser.
+
+    A driver binary is resolved through `webdriver_manager` only once per browser major version; later resolutions
+    are pure filesystem lookups, as long as the browser executable has not been modified since the last version check.
+    Offline nodes can be pre-seeded by `seed`, and with `offline=True` the registry never goes to the network.
+
+    The registry file is located at `registry_path`, or the path in the environment variable
+    `BOBA_WEB_AGENT_DRIVER_REGISTRY`, or `~/.cache/boba_web_agent/driver_registry.json`. The file is shared by
+    threads and processes (e.g. the launch threads of a `WebDriverPool`): every update re-reads it under
+    an exclusive lock on a sibling `.lock` file and replaces it atomically, so no update is lost or half-written.
+
+    Examples:
+        >>> registry = DriverBinaryRegistry()  # doctest: +SKIP
+        >>> registry.resolve('chrome')  # doctest: +SKIP
+        '/root/.wdm/drivers/chromedriver/linux64/124.0.6367.91/chromedriver'
+        >>> registry.stats  # doctest: +SKIP
+        {'hits': 0, 'misses': 1, 'lookup_seconds': 0.0021, 'saved_seconds': 0.0}
+    """
+
+    def __init__(self, registry_path: str = None, offline: bool = False):
+        self.registry_path = registry_path or environ.get(ENV_NAME_DRIVER_REGISTRY_PATH, DEFAULT_DRIVER_REGISTRY_PATH)
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+        self.saved_seconds = 0.0
+        self._entries = self._load()
+
+    def _load(self) -> MutableMapping:
+        if path.exists(self.registry_path):
+            with open(self.registry_path) as f:
+                return json.load(f)
+        return {}
+
+    def _update_entry(self, driver_type: str, update: Callable[[MutableMapping], None]):
+        """Applies `update` to the entry of `driver_type` read afresh from the registry file, and saves it."""
+        with _lock_file(self.registry_path + '.lock'):
+            self._entries = self._load()
+            update(self._entries.setdefault(driver_type, {'drivers': {}}))
+            self._write()
+
+    @property
+    def stats(self) -> Mapping[str, float]:
+        """
+        The hit/miss counts, the total time spent on registry lookups, and the total startup time saved,
+        i.e. the recorded resolution time of the driver binaries served from the registry minus the lookup time.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'lookup_seconds': self.lookup_seconds,
+            'saved_seconds': self.saved_seconds
+        }
+
+    def _get_browser_version(self, driver_type: str) -> Tuple[Optional[str], Optional[str]]:
+        browser_executable = find_browser_executable(driver_type)
+        if browser_executable is None:
+            return None, None
+
+        entry = self._entries.setdefault(driver_type, {'drivers': {}})
+        browser_mtime = path.getmtime(browser_executable)
+        if entry.get('browser_executable', None) == browser_executable and entry.get('browser_mtime', None) == browser_mtime:
+            return browser_executable, entry['browser_version']
+
+        browser_version = get_browser_version(browser_executable)
+        if browser_version is not None:
+            self._update_entry(
+                driver_type,
+                lambda _entry: _entry.update(
+                    browser_executable=browser_executable,
+                    browser_mtime=browser_mtime,
+                    browser_version=browser_version
+                )
+            )
+        return browser_executable, browser_version
+
+    def _get_registered_driver(self, driver_type: str, browser_version: Optional[str]) -> Optional[Mapping]:
+        if browser_version is not None:
+            driver = self._entries[driver_type]['drivers'].get(get_major_version(browser_version), None)
+            if driver is not None and path.exists(driver['driver_path']):
+                return driver
+
+    def lookup(self, driver_type) -> Optional[str]:
+        """
+        Looks up the registered driver binary for the locally installed browser; returns None if not registered.
+        """
+        driver_type = _get_driver_type_name(driver_type)
+        _, browser_version = self._get_browser_version(driver_type)
+        driver = self._get_registered_driver(driver_type, browser_version)
+        if driver is not None:
+            return driver['driver_path']
+
+    def resolve(self, driver_type) -> str:
+        """
+        Resolves the driver binary path for the locally installed browser, from the registry if registered,
+        or otherwise through `webdriver_manager` (and then registers it).
+
+        Raises:
+            FileNotFoundError: If the driver is not registered and the registry is offline.
+        """
+        driver_type = _get_driver_type_name(driver_type)
+        start_time = time.perf_counter()
+        _, browser_version = self._get_browser_version(driver_type)
+        driver = self._get_registered_driver(driver_type, browser_version)
+        lookup_seconds = time.perf_counter() - start_time
+        self.lookup_seconds += lookup_seconds
+
+        if driver is not None:
+            self.hits += 1
+            self.saved_seconds += max(driver.get('install_seconds', 0.0) - lookup_seconds, 0.0)
+            return driver['driver_path']
+
+        self.misses += 1
+        if self.offline:
+            raise FileNotFoundError(f"no '{driver_type}' driver binary is registered for the local browser in '{self.registry_path}'")
+
+        start_time = time.perf_counter()
+        driver_path = install_driver_binary(driver_type, browser_version=browser_version)
+        install_seconds = time.perf_counter() - start_time
+        if browser_version is not None:
+            self.seed(driver_type, driver_path, browser_version=browser_version, install_seconds=install_seconds)
+        return driver_path
+
+    def seed(self, driver_type, driver_path: str, browser_version: str = None, install_seconds: float = 0.0):
+        """
+        Registers a driver binary, e.g. to pre-seed the registry on offline nodes.
+
+        Args:
+            driver_type: One of 'chrome', 'firefox' or 'edge'.
+            driver_path: The path to the driver binary.
+            browser_version: The browser version the driver binary is for; detected from the local browser if not specified.
+            install_seconds: The time it took to resolve the driver binary online, used to estimate the startup time saved.
+        """
+        driver_type = _get_driver_type_name(driver_type)
+        if browser_version is None:
+            _, browser_version = self._get_browser_version(driver_type)
+            if browser_version is None:
+                raise ValueError(f"cannot detect the local browser version for driver '{driver_type}'; specify 'browser_version'")
+        def _register(entry):
+            entry['drivers'][get_major_version(browser_version)] = {
+                'driver_path': path.abspath(driver_path),
+                'install_seconds': install_seconds
+            }
+
+        self._update_entry(driver_type, _register)
+
+    def _write(self):
+        registry_dir = path.dirname(self.registry_path)
+        ensure_dir_existence(registry_dir)
+        with tempfile.NamedTemporaryFile('w', dir=registry_dir, suffix='.tmp', delete=False) as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(f.name, self.registry_path)
+
+    def save(self):
+        """Writes the registry file, replacing it atomically under the registry lock."""
+        with _lock_file(self.registry_path + '.lock'):
+            self._write()
+
+
+_default_driver_registry: Optional[DriverBinaryRegistry] = None
+
+
+def get_default_driver_registry() -> DriverBinaryRegistry:
+    global _default_driver_registry
+    if _default_driver_registry is None:
+        _default_driver_registry = DriverBinaryRegistry()
+    return _default_driver_registry
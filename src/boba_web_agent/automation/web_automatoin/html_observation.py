@@ -0,0 +1,346 @@
+import re
+from typing import Callable, Iterable, Union, Sequence, Tuple
+
+from bs4 import BeautifulSoup, Comment, NavigableString, Tag
+
+from boba_web_agent.automation.web_automatoin.html_utils import (
+    HtmlDocument,
+    AttributePatternSet,
+    add_unique_index_to_html,
+    clean_html,
+    DEFAULT_HTML_CLEAN_TAGS_TO_KEEP,
+    DFAULT_HTML_CLEAN_TAGS_TO_REMOVE,
+    DEFAULT_HTML_CLEAN_ATTRIBUTE_TO_KEEP
+)
+
+DEFAULT_OBSERVATION_INDEX_NAME = '__index__'
+OBSERVATION_TRUNCATION_MARK = '…'
+OBSERVATION_TAIL_TRUNCATION_COMMENT = 'truncated'
+
+# (max repeated similar siblings, max attribute value length, max text length) of each pruning level,
+# from the mildest to the most aggressive
+OBSERVATION_PRUNING_LEVELS = (
+    (5, 120, 400),
+    (3, 64, 160),
+    (2, 32, 80),
+    (1, 16, 40)
+)
+
+_TOKEN_ESTIMATION_REGEX = re.compile(r'[^\W\d_]+|\d+|[^\w\s]+|_+')
+
+
+def estimate_token_count(text: str) -> int:
+    """
+    Estimates the number of LLM tokens of a text locally, erring on the high side for HTML, so that an observation
+    fitting the estimate also fits a real tokenizer (e.g. the `cl100k_base` BPE of GPT-4 models).
+
+    An ASCII word counts as one token per 6 letters, a non-ASCII word (e.g. CJK text) as one token per character,
+    a number as one token per 3 digits, and a run of other non-space characters (e.g. '="' or '</')
+    as one token per 2 characters; spaces are free, as BPE tokenizers merge a space into the token following it.
+
+    Examples:
+        >>> estimate_token_count('Hello, world!')
+        4
+        >>> estimate_token_count('<a href="/flights" __index__="12">Flights</a>')
+        19
+    """
+    token_count = 0
+    for piece in _TOKEN_ESTIMATION_REGEX.findall(text):
+        first_char = piece[0]
+        if first_char.isdigit():
+            token_count += (len(piece) + 2) // 3
+        elif first_char.isalpha():
+            token_count += (len(piece) + 5) // 6 if piece.isascii() else len(piece)
+        else:
+            token_count += (len(piece) + 1) // 2
+    return token_count
+
+
+# region pruning
+
+def _collapse_run(run: Sequence[Tag], max_repeated_siblings: int):
+    if len(run) > max_repeated_siblings:
+        last_kept = run[max_repeated_siblings - 1]
+        # the run is consecutive except for whitespace strings, which are removed together with the collapsed elements
+        while last_kept.next_sibling is not run[-1]:
+            last_kept.next_sibling.extract()
+        run[-1].extract()
+        last_kept.insert_after(Comment(f' {len(run) - max_repeated_siblings} more <{last_kept.name}> '))
+
+
+def collapse_repeated_siblings(soup: Tag, max_repeated_siblings: int):
+    """
+    Collapses each run of more than `max_repeated_siblings` consecutive similar sibling elements (the same tag name
+    and classes) into its first `max_repeated_siblings` elements, followed by a comment counting the collapsed ones.
+
+    Examples:
+        >>> soup = BeautifulSoup('<ul><li>1</li> <li>2</li> <li>3</li> <li>4</li></ul>', 'html.parser')
+        >>> collapse_repeated_siblings(soup, 2)
+        >>> str(soup)
+        '<ul><li>1</li> <li>2</li><!-- 2 more <li> --></ul>'
+    """
+    for parent in [soup, *soup.find_all()]:
+        run, run_signature = [], None
+        for child in list(parent.contents):
+            if isinstance(child, Tag):
+                signature = (child.name, tuple(child.get('class', ())))
+                if run and signature == run_signature:
+                    run.append(child)
+                    continue
+                _collapse_run(run, max_repeated_siblings)
+                run, run_signature = [child], signature
+            elif run and type(child) is NavigableString and not child.strip():
+                continue
+            else:
+                _collapse_run(run, max_repeated_siblings)
+                run, run_signature = [], None
+        _collapse_run(run, max_repeated_siblings)
+
+
+def truncate_attribute_values(soup: Tag, max_attribute_length: int, attributes_to_skip: Iterable[str] = ()):
+    """
+    Truncates attribute values (e.g. long hrefs) longer than `max_attribute_length`, except for `attributes_to_skip`.
+    """
+    attributes_to_skip = set(attributes_to_skip)
+    for element in soup.find_all():
+        for attr, value in element.attrs.items():
+            if attr in attributes_to_skip:
+                continue
+            if not isinstance(value, str):
+                value = ' '.join(value)
+            if len(value) > max_attribute_length:
+                element[attr] = value[:max_attribute_length] + OBSERVATION_TRUNCATION_MARK
+
+
+def truncate_texts(soup: Tag, max_text_length: int):
+    """Truncates texts longer than `max_text_length`."""
+    for string in soup.find_all(string=True):
+        if type(string) is NavigableString and len(string) > max_text_length:
+            string.replace_with(string[:max_text_length] + OBSERVATION_TRUNCATION_MARK)
+
+
+def drop_indexed_subtrees(soup: Tag, indexes: Iterable[Union[int, str]], index_name: str = DEFAULT_OBSERVATION_INDEX_NAME):
+    """Drops the subtrees of elements whose index attribute (see `add_unique_index_to_html`) is among `indexes`."""
+    indexes = {str(index) for index in indexes}
+    for element in soup.find_all(attrs={index_name: True}):
+        if element[index_name] in indexes:
+            element.extract()
+
+
+def _estimate_node_tokens(node, count_tokens: Callable[[str], int]) -> int:
+    if isinstance(node, Tag):
+        attrs = ''.join(
+            f' {attr}="{value if isinstance(value, str) else " ".join(value)}"'
+            for attr, value in node.attrs.items()
+        )
+        return count_tokens(f'<{node.name}{attrs}></{node.name}>')
+    return count_tokens(node)
+
+
+def truncate_tail(soup: Tag, token_budget: int, count_tokens: Callable[[str], int] = estimate_token_count) -> str:
+    """
+    Removes nodes from the end of the document (the content furthest down the page) until it fits `token_budget`,
+    cutting into the last text kept if only part of it fits, and renders the document
+    with a comment marking the truncation.
+
+    The cut is found in one pass over the nodes in document order, adding up the tokens of each node
+    (its start and end tags, or its text); as tokens are not exactly additive, the rendered document is counted again,
+    and the cut moves earlier by the overflow until the document fits.
+
+    Examples:
+        >>> soup = BeautifulSoup('<p>first paragraph</p><ul><li>one</li><li>two</li><li>three</li></ul>', 'html.parser')
+        >>> truncate_tail(soup, 28)
+        '<p>first paragraph</p><ul><li>one</li></ul><!--truncated-->'
+    """
+    observation = str(soup)
+    token_count = count_tokens(observation)
+    if token_count <= token_budget:
+        return observation
+
+    marker = f'<!--{OBSERVATION_TAIL_TRUNCATION_COMMENT}-->'
+    if count_tokens(marker) > token_budget:
+        marker = ''
+    content_token_budget = token_budget - count_tokens(marker)
+    while token_count > token_budget:
+        if content_token_budget <= 0:
+            soup.clear()
+            return marker
+
+        used_tokens = 0
+        cut_node = None
+        for node in soup.descendants:
+            node_tokens = _estimate_node_tokens(node, count_tokens)
+            if used_tokens + node_tokens > content_token_budget:
+                cut_node = node
+                break
+            used_tokens += node_tokens
+
+        if cut_node is not None:
+            for node in (cut_node, *cut_node.parents):
+                if node is soup:
+                    break
+                while node.next_sibling is not None:
+                    node.next_sibling.extract()
+            truncated_text = None
+            if type(cut_node) is NavigableString:
+                kept_length = int(len(cut_node) * (content_token_budget - used_tokens) / node_tokens)
+                if kept_length > 0:
+                    truncated_text = cut_node[:kept_length] + OBSERVATION_TRUNCATION_MARK
+            if truncated_text is not None and used_tokens + count_tokens(truncated_text) <= content_token_budget:
+                cut_node.replace_with(truncated_text)
+            else:
+                cut_node.extract()
+
+        observation = str(soup) + marker
+        token_count = count_tokens(observation)
+        content_token_budget -= max(token_count - token_budget, 1)
+    return observation
+
+# endregion
+
+
+def _get_attributes_to_keep_with_index(
+        attributes_to_keep: Union[str, Iterable[str], AttributePatternSet],
+        index_name: str
+) -> Union[str, Tuple[str, ...]]:
+    if isinstance(attributes_to_keep, AttributePatternSet):
+        attributes_to_keep = '*' if attributes_to_keep.match_all else attributes_to_keep.patterns
+    if attributes_to_keep == '*':
+        return attributes_to_keep
+    if not attributes_to_keep:
+        return (index_name,)
+    if isinstance(attributes_to_keep, str):
+        return attributes_to_keep, index_name
+    return (*attributes_to_keep, index_name)
+
+
+def build_html_observation(
+        html_content: Union[str, HtmlDocument],
+        token_budget: int,
+        count_tokens: Callable[[str], int] = estimate_token_count,
+        index_name: str = DEFAULT_OBSERVATION_INDEX_NAME,
+        add_index: bool = True,
+        offscreen_indexes: Iterable[Union[int, str]] = None,
+        pruning_levels: Sequence[Tuple[int, int, int]] = OBSERVATION_PRUNING_LEVELS,
+        attributes_to_keep: Union[str, Iterable[str], AttributePatternSet] = DEFAULT_HTML_CLEAN_ATTRIBUTE_TO_KEEP,
+        **clean_html_args
+) -> str:
+    """
+    Builds an observation of a page for an LLM prompt (e.g. for `openai_llm.generate_text`) from its HTML,
+    i.e. the `clean_html` output pruned to fit a token budget.
+
+    The HTML is first indexed by `add_unique_index_to_html` and then cleaned, keeping the index attribute,
+    so each element in the observation can be referred back to the page by its index. If the cleaned HTML is over
+    budget, it is pruned progressively by `pruning_levels`, each level collapsing repeated similar siblings
+    (see `collapse_repeated_siblings`) and truncating long attribute values and texts, more aggressively than the
+    previous one; if it is still over budget, the subtrees of `offscreen_indexes` are dropped, and at last
+    the tail of the page is cut off (see `truncate_tail`). Pruning never renumbers the elements,
+    so the indexes of the elements left stay the same as those of the page.
+
+    Args:
+        html_content: The HTML of the page, or its `HtmlDocument`.
+        token_budget: The maximum number of tokens of the observation, as counted by `count_tokens`.
+        count_tokens: Counts the tokens of a text; defaults to the local `estimate_token_count`, so that pruning can
+            iterate without calling any API; pass the length of a real tokenizer encoding for exact budgets.
+        index_name: The name of the index attribute.
+        add_index: False if the HTML already has the index attribute (e.g. indexed by `add_unique_index_to_html`
+            to resolve the elements in the observation back to the page).
+        offscreen_indexes: The indexes of elements outside the viewport, dropped when pruning by levels
+            is not enough to fit the budget; see `get_clean_body_html_with_offscreen_indexes`, or `build_page_observation`
+            which computes them from the page.
+        pruning_levels: The (max repeated similar siblings, max attribute value length, max text length)
+            of each pruning level; see `OBSERVATION_PRUNING_LEVELS`.
+        attributes_to_keep: See `clean_html`; the index attribute is always kept.
+        **clean_html_args: Other arguments for `clean_html`.
+
+    Returns:
+        The observation, no more than `token_budget` tokens by `count_tokens`.
+
+    Examples:
+        >>> items = ''.join(f'<li><a href="/products/{i}?ref=search_results_page_{i}">Product {i}</a></li>' for i in range(50))
+        >>> html = f'<div><h1>Results</h1><ul>{items}</ul></div>'
+        >>> estimate_token_count(clean_html(add_unique_index_to_html(html), attributes_to_keep=('href', '__index__')))
+        2176
+        >>> observation = build_html_observation(html, token_budget=300)
+        >>> estimate_token_count(observation) <= 300
+        True
+        >>> observation
+        '<h1 __index__="1">Results</h1><ul __index__="2"><li __index__="3"><a __index__="4" href="/products/0?ref=search_results_page_0">Product 0</a></li><li __index__="5"><a __index__="6" href="/products/1?ref=search_results_page_1">Product 1</a></li><li __index__="7"><a __index__="8" href="/products/2?ref=search_results_page_2">Product 2</a></li><li __index__="9"><a __index__="10" href="/products/3?ref=search_results_page_3">Product 3</a></li><li __index__="11"><a __index__="12" href="/products/4?ref=search_results_page_4">Product 4</a></li><!-- 45 more <li> --></ul>'
+        >>> estimate_token_count(build_html_observation(html, token_budget=100)) <= 100
+        True
+    """
+    html_content = str(html_content)
+    if add_index:
+        html_content = add_unique_index_to_html(html_content, index_name)
+    observation = clean_html(
+        html_content,
+        attributes_to_keep=_get_attributes_to_keep_with_index(attributes_to_keep, index_name),
+        **clean_html_args
+    )
+    if count_tokens(observation) <= token_budget:
+        return observation
+
+    cleaned_html = observation
+    soup = None
+    for max_repeated_siblings, max_attribute_length, max_text_length in pruning_levels:
+        soup = BeautifulSoup(cleaned_html, 'html.parser')
+        collapse_repeated_siblings(soup, max_repeated_siblings)
+        truncate_attribute_values(soup, max_attribute_length, attributes_to_skip=(index_name,))
+        truncate_texts(soup, max_text_length)
+        observation = str(soup)
+        if count_tokens(observation) <= token_budget:
+            return observation
+
+    if soup is None:
+        soup = BeautifulSoup(cleaned_html, 'html.parser')
+    if offscreen_indexes:
+        drop_indexed_subtrees(soup, offscreen_indexes, index_name)
+    return truncate_tail(soup, token_budget, count_tokens)
+
+
+def build_page_observation(
+        driver,
+        token_budget: int,
+        index_name: str = DEFAULT_OBSERVATION_INDEX_NAME,
+        element=None,
+        tags_to_keep=DEFAULT_HTML_CLEAN_TAGS_TO_KEEP,
+        tags_to_remove=DFAULT_HTML_CLEAN_TAGS_TO_REMOVE,
+        attributes_to_keep: Union[str, Iterable[str], AttributePatternSet] = DEFAULT_HTML_CLEAN_ATTRIBUTE_TO_KEEP,
+        keep_elements_with_immediate_text: bool = True,
+        **build_html_observation_args
+) -> str:
+    """
+    Builds an observation of the current page of a Selenium driver by `build_html_observation`, from the body HTML
+    (or the HTML of `element`) cleaned and indexed inside the page, dropping the subtrees outside the viewport
+    if pruning by levels is not enough (see `get_clean_body_html_with_offscreen_indexes`). The indexes are the same
+    as those of `get_clean_body_html(driver, index_name=index_name)`. `build_html_observation_args` are the other
+    arguments of `build_html_observation`, e.g. `count_tokens` and `pruning_levels`.
+
+    Examples:
+        >>> build_page_observation(driver, token_budget=2000)  # doctest: +SKIP
+        '<a __index__="3" href="/flights">Flights</a>...'
+    """
+    from boba_web_agent.automation.web_automatoin.selenium.common import get_clean_body_html_with_offscreen_indexes
+
+    clean_html_args = {
+        'tags_to_keep': tags_to_keep,
+        'tags_to_remove': tags_to_remove,
+        'keep_elements_with_immediate_text': keep_elements_with_immediate_text
+    }
+    html_content, offscreen_indexes = get_clean_body_html_with_offscreen_indexes(
+        driver,
+        attributes_to_keep=_get_attributes_to_keep_with_index(attributes_to_keep, index_name),
+        index_name=index_name,
+        element=element,
+        **clean_html_args
+    )
+    return build_html_observation(
+        html_content,
+        token_budget,
+        index_name=index_name,
+        add_index=False,
+        offscreen_indexes=offscreen_indexes,
+        attributes_to_keep=attributes_to_keep,
+        **clean_html_args,
+        **build_html_observation_args
+    )
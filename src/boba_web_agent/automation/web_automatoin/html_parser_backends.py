@@ -0,0 +1,549 @@
+import re
+from enum import Enum
+from functools import lru_cache
+from html.parser import HTMLParser
+from typing import Union, Mapping, Optional, Iterable, IO, List, Tuple
+
+from bs4.builder._htmlparser import BeautifulSoupHTMLParser, HTMLParserTreeBuilder
+
+HTML_STREAM_CHUNK_SIZE = 1 << 16
+
+
+class HtmlParserBackends(str, Enum):
+    """
+    Parsers the HTML utilities can run on.
+
+    `HTML_PARSER` is Python's built-in `html.parser` as used by BeautifulSoup, and is the reference
+    the other backends conform to and the default; `LXML` is libxml2 through `lxml`; `SELECTOLAX` is lexbor
+    through `selectolax`. The other backends agree with `html.parser` on well-formed HTML but repair malformed HTML
+    differently, so they are used only when asked for (see `get_fastest_html_parser_backend`).
+    """
+    HTML_PARSER = 'html.parser'
+    LXML = 'lxml'
+    SELECTOLAX = 'selectolax'
+
+
+# from the fastest to the slowest
+HTML_PARSER_BACKEND_PREFERENCE = (
+    HtmlParserBackends.SELECTOLAX,
+    HtmlParserBackends.LXML,
+    HtmlParserBackends.HTML_PARSER
+)
+
+STRING_TYPE_COMMENT = 'comment'
+STRING_TYPE_DOCTYPE = 'doctype'
+STRING_TYPE_CDATA = 'cdata'
+STRING_TYPE_DECLARATION = 'declaration'
+STRING_TYPE_PROCESSING_INSTRUCTION = 'pi'
+
+_HTML_TREE_BUILDER = HTMLParserTreeBuilder()
+HTML_VOID_TAGS = frozenset(_HTML_TREE_BUILDER.empty_element_tags)
+HTML_PRESERVE_WHITESPACE_TAGS = frozenset(_HTML_TREE_BUILDER.preserve_whitespace_tags)
+HTML_STRING_CONTAINER_TAGS = frozenset(_HTML_TREE_BUILDER.string_containers)
+HTML_MULTI_VALUED_ATTRIBUTES = {
+    tag: frozenset(attributes)
+    for tag, attributes in _HTML_TREE_BUILDER.cdata_list_attributes.items()
+}
+
+_ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+_HTML_DOCUMENT_TAG_REGEX = re.compile(r'<(?:!doctype|html|head|body)[\s/>]', re.IGNORECASE)
+_HTML_DOCUMENT_STRUCTURE_TAGS = ('html', 'head', 'body')
+_HTML_DOCTYPE_REGEX = re.compile(r'<!doctype[\s>][^>]*>?(\s*)', re.IGNORECASE)
+_SERIALIZED_TEMPLATE_START_TAG_REGEX = re.compile(r'<template(?:\s+[^\s=>]+(?:="[^"]*")?)*>')
+_HTML_NEWLINE_DROPPING_START_TAG_REGEX = re.compile(r'(<(?:pre|textarea|listing)(?:\s[^>]*)?>)\n', re.IGNORECASE)
+
+
+def is_multi_valued_attribute(tag: str, attribute: str) -> bool:
+    """Whether BeautifulSoup splits the value of an attribute into a list of values, e.g. 'class'."""
+    return (
+            attribute in HTML_MULTI_VALUED_ATTRIBUTES.get('*', ())
+            or attribute in HTML_MULTI_VALUED_ATTRIBUTES.get(tag, ())
+    )
+
+
+class HtmlEventHandler:
+    """
+    Receives the elements and strings of an HTML document in document order, in the shape of the tree
+    BeautifulSoup builds with the `html.parser` parser, whichever parser backend is used.
+
+    Text is delivered as strings the same way as BeautifulSoup stores them, e.g. whitespace-only text outside
+    `<pre>` and `<textarea>` is collapsed to a single space or newline. Special strings (comments, doctypes, etc.)
+    have their `string_type` set to one of the `STRING_TYPE_*` constants.
+    A handler can raise `StopHtmlEvents` to stop parsing early.
+    """
+
+    def start_element(self, name: str, attrs: Mapping[str, str]):
+        pass
+
+    def end_element(self, name: str):
+        pass
+
+    def add_string(self, text: str, string_type: Optional[str] = None):
+        pass
+
+
+class StopHtmlEvents(Exception):
+    pass
+
+
+class _HtmlEventEmitter:
+    """Passes elements and text to an `HtmlEventHandler`, turning text into strings as `BeautifulSoup.endData` does."""
+
+    def __init__(self, handler: HtmlEventHandler):
+        self.handler = handler
+        self._data: List[str] = []
+        self._preserve_whitespace_depth = 0
+
+    def start_element(self, name: str, attrs: Mapping[str, str]):
+        self.end_data()
+        if name in HTML_PRESERVE_WHITESPACE_TAGS:
+            self._preserve_whitespace_depth += 1
+        self.handler.start_element(name, attrs)
+
+    def end_element(self, name: str):
+        self.end_data()
+        if name in HTML_PRESERVE_WHITESPACE_TAGS:
+            self._preserve_whitespace_depth -= 1
+        self.handler.end_element(name)
+
+    def add_data(self, data: str):
+        self._data.append(data)
+
+    def add_string(self, text: str, string_type: str):
+        self.end_data()
+        self._data.append(text)
+        self.end_data(string_type)
+
+    def end_data(self, string_type: str = None):
+        if not self._data:
+            return
+        text = ''.join(self._data)
+        self._data = []
+        if not self._preserve_whitespace_depth and all(c in _ASCII_SPACES for c in text):
+            text = '\n' if '\n' in text else ' '
+        self.handler.add_string(text, string_type)
+
+
+class _HtmlParserEventReplayer(BeautifulSoupHTMLParser):
+    """
+    Runs the `html.parser` tokenizer BeautifulSoup uses, but instead of building a tree, replays the tree-building
+    rules of BeautifulSoup (closing void elements, popping up to the matching open element on an end tag,
+    ignoring unmatched end tags) on a stack of the open element names.
+    The parser also serves as the "soup" of the reference handlers inherited from `BeautifulSoupHTMLParser`.
+    """
+    original_encoding = None
+    contains_replacement_characters = False
+
+    def __init__(self, emitter: _HtmlEventEmitter):
+        HTMLParser.__init__(self, convert_charrefs=False)
+        self.soup = self
+        self.already_closed_empty_element = []
+        self.emitter = emitter
+        self._open_elements: List[str] = []
+        self._open_tag_counts = {}
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self.handle_endtag(tag, check_already_closed=False)
+
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        attr_dict = {}
+        for key, value in attrs:
+            attr_dict[key] = '' if value is None else value
+        self._open_elements.append(tag)
+        self._open_tag_counts[tag] = self._open_tag_counts.get(tag, 0) + 1
+        self.emitter.start_element(tag, attr_dict)
+
+        if tag in HTML_VOID_TAGS and handle_empty_element:
+            self.handle_endtag(tag, check_already_closed=False)
+            self.already_closed_empty_element.append(tag)
+
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and tag in self.already_closed_empty_element:
+            self.already_closed_empty_element.remove(tag)
+            return
+        self.emitter.end_data()
+        if self._open_tag_counts.get(tag):
+            while True:
+                name = self._pop_element()
+                if name == tag:
+                    break
+
+    def _pop_element(self) -> str:
+        name = self._open_elements.pop()
+        self._open_tag_counts[name] -= 1
+        self.emitter.end_element(name)
+        return name
+
+    def handle_data(self, data):
+        self.emitter.add_data(data)
+
+    def handle_comment(self, data):
+        self.emitter.add_string(data, STRING_TYPE_COMMENT)
+
+    def handle_decl(self, decl):
+        self.emitter.add_string(decl[len('DOCTYPE '):], STRING_TYPE_DOCTYPE)
+
+    def unknown_decl(self, data):
+        if data.upper().startswith('CDATA['):
+            self.emitter.add_string(data[len('CDATA['):], STRING_TYPE_CDATA)
+        else:
+            self.emitter.add_string(data, STRING_TYPE_DECLARATION)
+
+    def handle_pi(self, data):
+        self.emitter.add_string(data, STRING_TYPE_PROCESSING_INSTRUCTION)
+
+    def close(self):
+        HTMLParser.close(self)
+        self.emitter.end_data()
+        while self._open_elements:
+            self._pop_element()
+
+
+# region tree walks
+
+_NODE_ELEMENT = 0
+_NODE_STRING = 1
+_NODE_CONTAINER = 2  # a node whose children are walked but which is not reported itself, e.g. an implied <body>
+_NODE_SKIPPED = 3
+
+
+def _walk_tree(emitter: _HtmlEventEmitter, top_nodes: Iterable, read_node):
+    """
+    Walks a parsed tree iteratively (pages can nest deeper than the recursion limit), reporting it to the emitter.
+    `read_node` returns a tuple (node kind, element name or string text, attributes or string type, children).
+    """
+    stack = [iter(top_nodes)]
+    open_names = []
+    while stack:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+            if open_names:
+                name = open_names.pop()
+                if name is not None:
+                    emitter.end_element(name)
+            continue
+        kind, value, extra, children = read_node(node)
+        if kind == _NODE_STRING:
+            if extra is None:
+                emitter.add_data(value)
+            else:
+                emitter.add_string(value, extra)
+        elif kind == _NODE_ELEMENT or kind == _NODE_CONTAINER:
+            if kind == _NODE_ELEMENT:
+                emitter.start_element(value, extra)
+                open_names.append(value)
+            else:
+                open_names.append(None)
+            stack.append(iter(children))
+    emitter.end_data()
+
+
+def _get_implied_document_tags(html: str) -> set:
+    """The document structure tags a parser would add even though they are not in the HTML."""
+    return {
+        tag for tag in _HTML_DOCUMENT_STRUCTURE_TAGS
+        if not re.search(rf'<{tag}[\s/>]', html, re.IGNORECASE)
+    }
+
+
+def _get_doctype_text(doctype: str) -> str:
+    # '<!DOCTYPE html>' -> 'html', the same string BeautifulSoup keeps
+    return doctype[len('<!DOCTYPE '):-1] if doctype else doctype
+
+
+def _emit_doctype(html: str, doctype: str, emitter: _HtmlEventEmitter):
+    """Reports the doctype, and the whitespace after it which tree-building parsers drop."""
+    match = _HTML_DOCTYPE_REGEX.search(html)
+    if match:
+        emitter.add_string(_get_doctype_text(doctype), STRING_TYPE_DOCTYPE)
+        if match.group(1):
+            emitter.add_data(match.group(1))
+
+
+def _emit_lxml_events(html: str, emitter: _HtmlEventEmitter):
+    from lxml import etree
+
+    try:
+        root = etree.fromstring(html.encode('utf-8'), etree.HTMLParser(encoding='utf-8'))
+    except etree.XMLSyntaxError:
+        root = None
+    if root is None:
+        emitter.end_data()
+        return
+    implied_tags = _get_implied_document_tags(html)
+    # libxml2 gives boolean attributes (e.g. `disabled`) their names as values;
+    # they are taken as valueless unless the HTML assigns such an attribute a value anywhere
+    assigned_attributes = {}
+
+    def _get_attributes(element):
+        attrs = dict(element.attrib)
+        for name, value in attrs.items():
+            if value == name:
+                assigned = assigned_attributes.get(name, None)
+                if assigned is None:
+                    assigned = assigned_attributes[name] = re.search(rf'\s{re.escape(name)}\s*=', html, re.IGNORECASE) is not None
+                if not assigned:
+                    attrs[name] = ''
+        return attrs
+
+    def _iter_children(element):
+        if element.text:
+            yield element.text
+        for child in element:
+            yield child
+            if child.tag in HTML_VOID_TAGS:
+                # libxml2 does not know some void elements (e.g. <source>) and nests the following content in them
+                yield from _iter_children(child)
+            if child.tail:
+                yield child.tail
+
+    def _read_node(node):
+        if isinstance(node, str):
+            return _NODE_STRING, node, None, None
+        if node.tag is etree.Comment:
+            return _NODE_STRING, node.text or '', STRING_TYPE_COMMENT, None
+        if node.tag is etree.ProcessingInstruction:
+            return _NODE_STRING, f'{node.target} {node.text}' if node.text else node.target, STRING_TYPE_PROCESSING_INSTRUCTION, None
+        if not isinstance(node.tag, str):
+            return _NODE_SKIPPED, None, None, None
+        if node.tag in implied_tags and (node is root or node.getparent() is root):
+            return _NODE_CONTAINER, node.tag, None, _iter_children(node)
+        return _NODE_ELEMENT, node.tag, _get_attributes(node), (() if node.tag in HTML_VOID_TAGS else _iter_children(node))
+
+    top_nodes = list(reversed(list(root.itersiblings(preceding=True))))
+    top_nodes.append(root)
+    for node in root.itersiblings():
+        top_nodes.append(node)
+        if node.tail:
+            top_nodes.append(node.tail)
+
+    _emit_doctype(html, root.getroottree().docinfo.doctype, emitter)
+    _walk_tree(emitter, top_nodes, _read_node)
+
+
+def _emit_selectolax_events(html: str, emitter: _HtmlEventEmitter):
+    from selectolax.lexbor import LexborHTMLParser
+
+    # an HTML5 parser drops the newline right after <pre>, <textarea> and <listing>, while `html.parser` keeps it
+    html = _HTML_NEWLINE_DROPPING_START_TAG_REGEX.sub('\\1\n\n', html)
+    if _HTML_DOCUMENT_TAG_REGEX.search(html):
+        tree = LexborHTMLParser(html)
+        implied_tags = _get_implied_document_tags(html)
+    else:
+        # parses a fragment in the context of a <template>, where any element (e.g. a <td>) can appear,
+        # so that no document structure is added
+        tree = LexborHTMLParser(html, is_fragment=True, fragment_tag='template')
+        implied_tags = ()
+    if tree.root is None:
+        emitter.end_data()
+        return
+
+    def _iter_template_content(node):
+        # lexbor keeps the content of a <template> in a separate document fragment, not reachable by `iter`;
+        # parses it back from the serialized template, whose start tag is in the canonical form of the serializer
+        template_html = node.html
+        content_html = template_html[_SERIALIZED_TEMPLATE_START_TAG_REGEX.match(template_html).end():-len('</template>')]
+        content = LexborHTMLParser(content_html, is_fragment=True, fragment_tag='template')
+        return content.root.parent.iter(include_text=True) if content.root is not None else ()
+
+    def _read_node(node):
+        tag = node.tag
+        if tag == '-text':
+            return _NODE_STRING, node.text_content, None, None
+        if tag == '-comment':
+            # `comment_content` is stripped; takes the comment text from its markup '<!--...-->' instead
+            return _NODE_STRING, node.html[len('<!--'):-len('-->')], STRING_TYPE_COMMENT, None
+        if tag == '-doctype':
+            _emit_doctype(html, node.html, emitter)
+            return _NODE_SKIPPED, None, None, None
+        if tag.startswith('-'):
+            return _NODE_SKIPPED, None, None, None
+        # lexbor restores the case of SVG names (e.g. 'viewBox'), while `html.parser` lowercases all names
+        tag = tag.lower()
+        children = _iter_template_content(node) if tag == 'template' else node.iter(include_text=True)
+        if tag in implied_tags:
+            return _NODE_CONTAINER, tag, None, children
+        return (
+            _NODE_ELEMENT,
+            tag,
+            {name.lower(): ('' if value is None else value) for name, value in node.attributes.items()},
+            children
+        )
+
+    _walk_tree(emitter, tree.root.parent.iter(include_text=True), _read_node)
+
+
+# endregion
+
+def is_html_parser_backend_available(parser_backend: Union[str, HtmlParserBackends]) -> bool:
+    parser_backend = HtmlParserBackends(parser_backend)
+    try:
+        if parser_backend == HtmlParserBackends.LXML:
+            import lxml.etree
+        elif parser_backend == HtmlParserBackends.SELECTOLAX:
+            import selectolax.lexbor
+    except ImportError:
+        return False
+    return True
+
+
+def parse_html_events(
+        html_content: Union[str, Iterable[str], IO[str]],
+        handler: HtmlEventHandler,
+        parser_backend: Union[str, HtmlParserBackends] = None,
+        chunk_size: int = HTML_STREAM_CHUNK_SIZE
+) -> HtmlEventHandler:
+    """
+    Parses HTML with a parser backend and reports its elements and strings to `handler`
+    (see `HtmlEventHandler`); returns the handler.
+
+    Args:
+        html_content: The HTML; can also be a text file object or an iterable of text chunks. The `html.parser`
+            backend parses it chunk by chunk without building a tree; other backends read it as a whole.
+        handler: The event handler.
+        parser_backend: The parser backend; the default one (see `get_default_html_parser_backend`) if not specified.
+        chunk_size: The number of characters read at a time from a file object.
+
+    Examples:
+        >>> class TagCounter(HtmlEventHandler):
+        ...     def __init__(self):
+        ...         self.count = 0
+        ...     def start_element(self, name, attrs):
+        ...         self.count += 1
+        >>> parse_html_events('<ul><li>a<li>b</ul><br>', TagCounter(), 'html.parser').count
+        4
+    """
+    parser_backend = resolve_html_parser_backend(parser_backend)
+    emitter = _HtmlEventEmitter(handler)
+    try:
+        if parser_backend == HtmlParserBackends.HTML_PARSER:
+            parser = _HtmlParserEventReplayer(emitter)
+            if isinstance(html_content, str):
+                parser.feed(html_content)
+            elif hasattr(html_content, 'read'):
+                for chunk in iter(lambda: html_content.read(chunk_size), ''):
+                    parser.feed(chunk)
+            else:
+                for chunk in html_content:
+                    parser.feed(chunk)
+            parser.close()
+        else:
+            if not isinstance(html_content, str):
+                html_content = html_content.read() if hasattr(html_content, 'read') else ''.join(html_content)
+            if parser_backend == HtmlParserBackends.LXML:
+                _emit_lxml_events(html_content, emitter)
+            else:
+                _emit_selectolax_events(html_content, emitter)
+    except StopHtmlEvents:
+        pass
+    return handler
+
+
+# region conformance
+
+class _HtmlEventRecorder(HtmlEventHandler):
+    def __init__(self):
+        self.events = []
+
+    def start_element(self, name, attrs):
+        self.events.append(('start', name, sorted(attrs.items())))
+
+    def end_element(self, name):
+        self.events.append(('end', name))
+
+    def add_string(self, text, string_type=None):
+        self.events.append(('string', text, string_type))
+
+
+def get_html_events(html_content: str, parser_backend: Union[str, HtmlParserBackends] = None) -> List[Tuple]:
+    """Gets the elements and strings of HTML as a list of ('start', name, sorted attributes), ('end', name) and ('string', text, string type) tuples."""
+    return parse_html_events(html_content, _HtmlEventRecorder(), parser_backend=parser_backend).events
+
+
+# Well-formed HTML of the kinds the utilities handle: browser-serialized pages and element snippets.
+# Backends are expected to agree with `html.parser` on all of them; they may differ on malformed HTML,
+# where browsers (and lxml/lexbor, which follow browsers more closely) repair the tree differently.
+HTML_PARSER_BACKEND_CONFORMANCE_CASES = (
+    '',
+    'plain text &amp; entities &lt;b&gt; &nbsp;&copy;&#65;&#x42;',
+    '<div class="example" id="test"><p>Hello</p><p>World</p></div>',
+    '<input type="text" value="Sample" disabled>',
+    '<a href="#" title="Link">Click here</a>',
+    '<td class=" cell  first" data-row="1">cell</td>',
+    '<tr><td>1</td><td>2</td></tr>',
+    '<li aria-label="Item &quot;one&quot;">One</li><li>Two</li>',
+    '<option value="1" selected>One</option>',
+    '<div>\n  <span>a</span>\n  <br>\n  <img src="x.png" alt="">\n</div>',
+    '<pre>  keep\n  spaces  </pre><textarea>\n  text\n</textarea>',
+    '<div><!-- comment --><script>if (a < b && c > d) {}</script><style>a > b {}</style></div>',
+    '<form accept-charset="utf-8 latin1"><button type="submit" class="btn primary">Go</button></form>',
+    '<!DOCTYPE html>\n<html lang="en"><head><meta charset="utf-8"><title>Title</title></head>'
+    '<body><div id="main"><h1>Heading</h1><p>Some <b>bold</b> and <i>italic</i> text.</p>'
+    '<table><tbody><tr><th>A</th><td>1</td></tr></tbody></table>'
+    '<ul><li><a href="/a?x=1&amp;y=2">A</a></li><li><a href="/b" rel="nofollow noopener">B</a></li></ul>'
+    '</div></body></html>',
+    '<body><div>body only</div></body>',
+)
+
+
+def check_html_parser_backend_conformance(
+        parser_backend: Union[str, HtmlParserBackends],
+        html_samples: Iterable[str] = HTML_PARSER_BACKEND_CONFORMANCE_CASES
+) -> List[str]:
+    """
+    Checks that a parser backend reports the same elements and strings as the reference `html.parser` backend
+    (and hence gives identical results in the HTML utilities); returns the HTML samples on which it does not.
+
+    Examples:
+        >>> [
+        ...     parser_backend.value for parser_backend in HtmlParserBackends
+        ...     if is_html_parser_backend_available(parser_backend) and check_html_parser_backend_conformance(parser_backend)
+        ... ]
+        []
+    """
+    return [
+        html for html in html_samples
+        if get_html_events(html, parser_backend) != get_html_events(html, HtmlParserBackends.HTML_PARSER)
+    ]
+
+
+# endregion
+
+def get_default_html_parser_backend() -> HtmlParserBackends:
+    """
+    Gets the parser backend used when none is specified, i.e. the reference `html.parser` backend,
+    so that the results of the HTML utilities do not depend on which parsers are installed.
+    """
+    return HtmlParserBackends.HTML_PARSER
+
+
+@lru_cache(maxsize=None)
+def get_fastest_html_parser_backend() -> HtmlParserBackends:
+    """
+    Gets the fastest installed parser backend (in the order of `HTML_PARSER_BACKEND_PREFERENCE`)
+    that passes `check_html_parser_backend_conformance`, for callers that opt in to a faster backend
+    for well-formed HTML (e.g. browser-serialized pages).
+    """
+    for parser_backend in HTML_PARSER_BACKEND_PREFERENCE:
+        if (
+                parser_backend == HtmlParserBackends.HTML_PARSER
+                or (is_html_parser_backend_available(parser_backend) and not check_html_parser_backend_conformance(parser_backend))
+        ):
+            return parser_backend
+
+
+def resolve_html_parser_backend(parser_backend: Union[str, HtmlParserBackends] = None) -> HtmlParserBackends:
+    """
+    Resolves a parser backend; returns the default one (see `get_default_html_parser_backend`) if not specified.
+
+    Raises:
+        ImportError: If the specified parser backend is not installed.
+    """
+    if parser_backend is None:
+        return get_default_html_parser_backend()
+    parser_backend = HtmlParserBackends(parser_backend)
+    if not is_html_parser_backend_available(parser_backend):
+        raise ImportError(f"the HTML parser backend '{parser_backend.value}' is not installed")
+    return parser_backend
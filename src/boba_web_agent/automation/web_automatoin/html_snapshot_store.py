@@ -0,0 +1,355 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import zlib
+from bisect import bisect_left
+from os import path, makedirs, walk, remove
+from typing import Optional, List, Iterator, Mapping, Sequence, Union, Tuple, Dict
+
+HTML_SNAPSHOT_TOKEN_REGEX = re.compile(r'(?=<)')
+HTML_SNAPSHOT_FILE_NAME_REGEX = re.compile(r'^html_before_action.*\.html(\.gz)?$')
+
+SNAPSHOT_STORE_INDEX_FILE_NAME = 'index.jsonl'
+SNAPSHOT_STORE_OBJECTS_DIR_NAME = 'objects'
+
+_SNAPSHOT_OBJECT_TYPE_FULL = 'full'
+_SNAPSHOT_OBJECT_TYPE_DELTA = 'delta'
+_DELTA_OP_COST = 16
+_DELTA_ANCHOR_SIZE = 4
+
+# the positions of each token and of each `_DELTA_ANCHOR_SIZE`-gram of tokens in a base snapshot
+HtmlDeltaIndex = Tuple[Dict[str, List[int]], Dict[Tuple[str, ...], List[int]]]
+
+
+def tokenize_html_snapshot(html: str) -> List[str]:
+    """
+    Splits HTML into tokens at tag boundaries, so that deltas are computed at the DOM level
+    (which works for minified single-line pages, unlike line-based diffs).
+
+    Examples:
+        >>> tokenize_html_snapshot('<div>Hello <b>World</b></div>')
+        ['<div>Hello ', '<b>World', '</b>', '</div>']
+    """
+    return [token for token in HTML_SNAPSHOT_TOKEN_REGEX.split(html) if token]
+
+
+def index_html_snapshot_tokens(base_tokens: Sequence[str]) -> HtmlDeltaIndex:
+    """Indexes the tokens of a base snapshot for `compute_html_delta`, in linear time."""
+    token_positions = {}
+    anchor_positions = {}
+    for i, token in enumerate(base_tokens):
+        token_positions.setdefault(token, []).append(i)
+        if i + _DELTA_ANCHOR_SIZE <= len(base_tokens):
+            anchor_positions.setdefault(tuple(base_tokens[i:i + _DELTA_ANCHOR_SIZE]), []).append(i)
+    return token_positions, anchor_positions
+
+
+def _get_nearest_position(positions: Optional[List[int]], position: int) -> Optional[int]:
+    """Returns the first of the sorted `positions` at or after `position`, or the first one if there is none."""
+    if not positions:
+        return None
+    k = bisect_left(positions, position)
+    return positions[k] if k < len(positions) else positions[0]
+
+
+def compute_html_delta(
+        base_tokens: Sequence[str],
+        tokens: Sequence[str],
+        base_index: HtmlDeltaIndex = None,
+        max_size: int = None
+) -> Optional[list]:
+    """
+    Computes a compact delta turning `base_tokens` into `tokens`, as a list of operations,
+    either `[start, end]` to copy a range of base tokens, or a string to insert.
+
+    The delta is found greedily in near-linear time: the copy of base tokens continues while they match;
+    otherwise the next match is anchored at the nearest later position in the base of the same token, or of the same
+    `_DELTA_ANCHOR_SIZE` tokens (see `index_html_snapshot_tokens`), and extended as far as the tokens match.
+    Unlike an LCS diff (quadratic in the worst case), this keeps large pages cheap; the delta may be slightly
+    larger than a minimal one.
+
+    Args:
+        base_tokens: The tokens of the base snapshot.
+        tokens: The tokens of the new snapshot.
+        base_index: The index of `base_tokens`, if already built by `index_html_snapshot_tokens`.
+        max_size: Stops and returns None as soon as the delta (by `_get_delta_size`) grows beyond this size.
+
+    Examples:
+        >>> base = tokenize_html_snapshot('<ul><li>A</li><li>B</li></ul>')
+        >>> new = tokenize_html_snapshot('<ul><li>A</li><li>C</li><li>B</li></ul>')
+        >>> delta = compute_html_delta(base, new)
+        >>> delta
+        [[0, 3], '<li>C', [2, 6]]
+        >>> apply_html_delta(base, delta) == ''.join(new)
+        True
+        >>> compute_html_delta(base, tokenize_html_snapshot('<p>' + 'x' * 100 + '</p>'), max_size=50) is None
+        True
+    """
+    token_positions, anchor_positions = base_index or index_html_snapshot_tokens(base_tokens)
+    delta = []
+    size = 0
+    base_end = 0
+    j = 0
+    while j < len(tokens):
+        candidates = []
+        if base_end < len(base_tokens) and base_tokens[base_end] == tokens[j]:
+            candidates.append(base_end)
+        else:
+            candidates.append(_get_nearest_position(token_positions.get(tokens[j], None), base_end))
+            candidates.append(_get_nearest_position(
+                anchor_positions.get(tuple(tokens[j:j + _DELTA_ANCHOR_SIZE]), None), base_end
+            ))
+
+        match_start = match_length = 0
+        for i in candidates:
+            if i is None:
+                continue
+            length = 0
+            while i + length < len(base_tokens) and j + length < len(tokens) and base_tokens[i + length] == tokens[j + length]:
+                length += 1
+            if length > match_length:
+                match_start, match_length = i, length
+            # a continued copy or a long enough match needs no other candidate
+            if i == base_end or length >= _DELTA_ANCHOR_SIZE:
+                break
+
+        if match_length and (match_start == base_end or match_length > 1 or len(tokens[j]) >= _DELTA_OP_COST):
+            if delta and isinstance(delta[-1], list) and delta[-1][1] == match_start:
+                delta[-1][1] = match_start + match_length
+            else:
+                delta.append([match_start, match_start + match_length])
+                size += _DELTA_OP_COST
+            base_end = match_start + match_length
+            j += match_length
+        else:
+            if delta and isinstance(delta[-1], str):
+                delta[-1] += tokens[j]
+            else:
+                delta.append(tokens[j])
+            size += len(tokens[j])
+            j += 1
+        if max_size is not None and size > max_size:
+            return None
+    return delta
+
+
+def apply_html_delta(base_tokens: Sequence[str], delta: Sequence[Union[list, str]]) -> str:
+    return ''.join(
+        (''.join(base_tokens[op[0]:op[1]]) if isinstance(op, list) else op)
+        for op in delta
+    )
+
+
+def _get_delta_size(delta: Sequence[Union[list, str]]) -> int:
+    return sum((_DELTA_OP_COST if isinstance(op, list) else len(op)) for op in delta)
+
+
+class HtmlSnapshotStore:
+    """
+    A content-addressed store of HTML snapshots, keeping full base snapshots plus compact deltas.
+
+    Each snapshot is stored under its SHA-256 hash, so identical snapshots are stored only once.
+    A snapshot is stored as a tag-level delta against the current base snapshot of its page
+    (see `tokenize_html_snapshot` and `compute_html_delta`), unless the delta is larger than `rebase_ratio` of
+    the snapshot itself or than `max_delta_size`, in which case it is stored in full and becomes the new base of the page. Objects are zlib-compressed.
+    Snapshot names (e.g. relative paths in a recording directory) are mapped to hashes by an append-only index.
+
+    Examples:
+        >>> import tempfile
+        >>> store = HtmlSnapshotStore(tempfile.mkdtemp())
+        >>> page = '<body>' + ''.join(f'<div id="{i}">item {i}</div>' for i in range(100)) + '</body>'
+        >>> snapshot_hash = store.put('action_0/html_before_action-target_0-repeat_0.html', page)
+        >>> snapshot_hash = store.put('action_1/html_before_action-target_0-repeat_0.html', page.replace('item 50', 'selected'))
+        >>> store.put('action_2/html_before_action-target_0-repeat_0.html', page) == snapshot_hash
+        False
+        >>> store.get_hash('action_2/html_before_action-target_0-repeat_0.html') == store.get_hash('action_0/html_before_action-target_0-repeat_0.html')
+        True
+        >>> store.get('action_1/html_before_action-target_0-repeat_0.html') == page.replace('item 50', 'selected')
+        True
+        >>> store.stats
+        {'snapshots': 3, 'objects': 2, 'full_objects': 1, 'delta_objects': 1}
+    """
+
+    def __init__(self, root_path: str, rebase_ratio: float = 0.5, max_delta_size: int = 256 * 1024):
+        """
+        Args:
+            root_path: The directory of the store.
+            rebase_ratio: A snapshot is stored in full (and becomes the new base of its page)
+                if its delta is larger than this ratio of its own size.
+            max_delta_size: A snapshot is also stored in full if its delta is larger than this size.
+        """
+        self.root_path = root_path
+        self.rebase_ratio = rebase_ratio
+        self.max_delta_size = max_delta_size
+        self._objects_path = path.join(root_path, SNAPSHOT_STORE_OBJECTS_DIR_NAME)
+        self._index_path = path.join(root_path, SNAPSHOT_STORE_INDEX_FILE_NAME)
+        makedirs(self._objects_path, exist_ok=True)
+
+        self._index = {}
+        if path.exists(self._index_path):
+            self._load_index()
+        self._bases = {}
+        self._full_object_count = 0
+        self._delta_object_count = 0
+
+    def _load_index(self):
+        with open(self._index_path, 'rb') as f:
+            lines = f.readlines()
+        valid_size = 0
+        for line_index, line in enumerate(lines):
+            if line.strip():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    if line_index != len(lines) - 1:
+                        raise
+                    # the last line was cut off by a crash while it was appended; cut it off the file too,
+                    # so that the next appended line does not continue it
+                    with open(self._index_path, 'rb+') as f:
+                        f.truncate(valid_size)
+                    break
+                self._index[entry['name']] = entry['hash']
+            valid_size += len(line)
+        else:
+            if lines and not lines[-1].endswith(b'\n'):
+                # the crash has cut off only the line break
+                with open(self._index_path, 'ab') as f:
+                    f.write(b'\n')
+
+    def _get_object_path(self, snapshot_hash: str) -> str:
+        return path.join(self._objects_path, snapshot_hash[:2], snapshot_hash)
+
+    def _write_object(self, snapshot_hash: str, obj: Mapping):
+        # written to a temporary file and moved in place, so that an object file, whose existence means the snapshot
+        # is stored, is never left truncated by a crash
+        object_path = self._get_object_path(snapshot_hash)
+        object_dir_path = path.dirname(object_path)
+        makedirs(object_dir_path, exist_ok=True)
+        with tempfile.NamedTemporaryFile('wb', dir=object_dir_path, suffix='.tmp', delete=False) as f:
+            f.write(zlib.compress(json.dumps(obj).encode('utf-8')))
+        os.replace(f.name, object_path)
+
+    def _read_object(self, snapshot_hash: str) -> Mapping:
+        with open(self._get_object_path(snapshot_hash), 'rb') as f:
+            return json.loads(zlib.decompress(f.read()).decode('utf-8'))
+
+    def _append_index(self, name: str, snapshot_hash: str):
+        self._index[name] = snapshot_hash
+        with open(self._index_path, 'a') as f:
+            f.write(json.dumps({'name': name, 'hash': snapshot_hash}) + '\n')
+
+    def put(self, name: str, html: str, page_key: str = None) -> str:
+        """
+        Stores an HTML snapshot under a name, and returns its content hash.
+
+        Args:
+            name: The name of the snapshot, e.g. its relative path in a recording directory.
+            html: The HTML snapshot.
+            page_key: Identifies the page (e.g. its URL) so that the snapshot is delta-encoded against
+                the base snapshot of the same page; all snapshots share one base chain if not specified.
+        """
+        snapshot_hash = hashlib.sha256(html.encode('utf-8')).hexdigest()
+        if not path.exists(self._get_object_path(snapshot_hash)):
+            tokens = tokenize_html_snapshot(html)
+            base = self._bases.get(page_key, None)
+            delta = None
+            if base is not None:
+                base_hash, base_tokens, base_index = base
+                max_delta_size = self.rebase_ratio * len(html)
+                if self.max_delta_size is not None:
+                    max_delta_size = min(max_delta_size, self.max_delta_size)
+                delta = compute_html_delta(base_tokens, tokens, base_index=base_index, max_size=max_delta_size)
+
+            if delta is None:
+                self._write_object(snapshot_hash, {'type': _SNAPSHOT_OBJECT_TYPE_FULL, 'html': html})
+                self._bases[page_key] = (snapshot_hash, tokens, index_html_snapshot_tokens(tokens))
+                self._full_object_count += 1
+            else:
+                self._write_object(snapshot_hash, {'type': _SNAPSHOT_OBJECT_TYPE_DELTA, 'base': base_hash, 'delta': delta})
+                self._delta_object_count += 1
+
+        self._append_index(name, snapshot_hash)
+        return snapshot_hash
+
+    def get_by_hash(self, snapshot_hash: str) -> str:
+        obj = self._read_object(snapshot_hash)
+        if obj['type'] == _SNAPSHOT_OBJECT_TYPE_FULL:
+            return obj['html']
+        return apply_html_delta(tokenize_html_snapshot(self.get_by_hash(obj['base'])), obj['delta'])
+
+    def get(self, name: str) -> str:
+        """Reconstructs the HTML snapshot stored under a name."""
+        return self.get_by_hash(self._index[name])
+
+    def get_hash(self, name: str) -> Optional[str]:
+        return self._index.get(name, None)
+
+    def names(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __contains__(self, name: str):
+        return name in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def stats(self) -> Mapping[str, int]:
+        """Counts of named snapshots, distinct objects, and full/delta objects written by this store instance."""
+        return {
+            'snapshots': len(self._index),
+            'objects': len(set(self._index.values())),
+            'full_objects': self._full_object_count,
+            'delta_objects': self._delta_object_count
+        }
+
+
+def _natural_sort_key(s: str):
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', s)]
+
+
+def convert_recording_dir_to_snapshot_store(
+        recording_dir: str,
+        store_dir_name: str = 'html_snapshots',
+        remove_original_files: bool = False,
+        rebase_ratio: float = 0.5
+) -> HtmlSnapshotStore:
+    """
+    Converts the `html_before_action*.html` files of an existing recording directory into an `HtmlSnapshotStore`
+    at `<recording_dir>/<store_dir_name>`, with the snapshots named by their paths relative to `recording_dir`.
+
+    Args:
+        recording_dir: The recording directory, e.g. `test_case_recordings/<test_case_id>/turn_1`.
+        store_dir_name: The name of the store directory under the recording directory.
+        remove_original_files: True to delete the original HTML files after conversion.
+        rebase_ratio: See `HtmlSnapshotStore`.
+
+    Returns:
+        The snapshot store.
+    """
+    store_path = path.join(recording_dir, store_dir_name)
+    store = HtmlSnapshotStore(store_path, rebase_ratio=rebase_ratio)
+    html_file_paths = []
+    for dir_path, dir_names, file_names in walk(recording_dir):
+        if path.abspath(dir_path).startswith(path.abspath(store_path)):
+            continue
+        for file_name in file_names:
+            if HTML_SNAPSHOT_FILE_NAME_REGEX.match(file_name):
+                html_file_paths.append(path.join(dir_path, file_name))
+
+    for html_file_path in sorted(html_file_paths, key=lambda p: _natural_sort_key(path.relpath(p, recording_dir))):
+        if html_file_path.endswith('.gz'):
+            with gzip.open(html_file_path, 'rt', encoding='utf-8') as f:
+                html = f.read()
+            name = path.relpath(html_file_path[:-3], recording_dir)
+        else:
+            with open(html_file_path, encoding='utf-8') as f:
+                html = f.read()
+            name = path.relpath(html_file_path, recording_dir)
+        store.put(name, html)
+        if remove_original_files:
+            remove(html_file_path)
+    return store
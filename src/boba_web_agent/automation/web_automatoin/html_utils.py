@@ -1,8 +1,25 @@
-from typing import Union, List, Iterable, Optional, Mapping, Sequence, Any, Tuple
+from functools import lru_cache
+from typing import Union, List, Iterable, Optional, Mapping, Sequence, Any, Tuple, IO, Callable
 import re
-from bs4 import BeautifulSoup, NavigableString
+from bs4 import BeautifulSoup, NavigableString, Tag
 
 from boba_python_utils.string_utils import string_check
+from boba_web_agent.automation.web_automatoin.html_parser_backends import (
+    HtmlParserBackends,
+    HtmlEventHandler,
+    StopHtmlEvents,
+    parse_html_events,
+    resolve_html_parser_backend,
+    is_multi_valued_attribute,
+    HTML_VOID_TAGS,
+    HTML_STRING_CONTAINER_TAGS,
+    HTML_STREAM_CHUNK_SIZE,
+    STRING_TYPE_COMMENT,
+    STRING_TYPE_DOCTYPE,
+    STRING_TYPE_CDATA,
+    STRING_TYPE_DECLARATION,
+    STRING_TYPE_PROCESSING_INSTRUCTION
+)
 
 HTML_STYLE_STRING_REGEX = re.compile(r'^<([a-zA-Z][a-zA-Z0-9]*)[^>]*>.*?</\1>$', re.DOTALL)
 
@@ -42,14 +59,17 @@ def is_html_style_string(s: str) -> bool:
 
 
 def get_tag_text_and_attributes_from_element_html(
-        element_html: str
+        element_html: Union[str, 'HtmlDocument'],
+        parser_backend: Union[str, HtmlParserBackends] = None
 ) -> Tuple[Optional[str], Optional[str], Mapping[str, str]]:
     """
     Parses an HTML snippet to extract the tag name, combined text content of the element and its descendants,
     and all attributes of the element.
 
     Args:
-        element_html (str): A string containing the HTML snippet of a single element.
+        element_html (str): A string containing the HTML snippet of a single element, or its `HtmlDocument`.
+        parser_backend: The HTML parser backend (see `html_parser_backends`);
+            `html.parser` if not specified.
 
     Returns:
         tuple: Returns a tuple containing:
@@ -70,9 +90,21 @@ def get_tag_text_and_attributes_from_element_html(
         >>> get_tag_text_and_attributes_from_element_html(html_snippet)
         ('a', 'Click here', {'href': '#', 'title': 'Link'})
     """
-    soup = BeautifulSoup(element_html, 'html.parser')
-    # Access the first element that is not the document itself, usually the first child of the soup object.
-    element = soup.find()
+    if isinstance(element_html, HtmlDocument):
+        element = element_html.elements[0] if element_html.elements else None
+    else:
+        parser_backend = resolve_html_parser_backend(parser_backend)
+        if parser_backend != HtmlParserBackends.HTML_PARSER:
+            element = parse_html_events(
+                element_html, _HtmlElementCapture(lambda name, attrs: True), parser_backend=parser_backend
+            ).captured[0]
+            if element is None:
+                return None, None, {}
+            return element.name, element.text, _get_bs4_attributes(element.name, element.attrs)
+
+        soup = BeautifulSoup(element_html, 'html.parser')
+        # Access the first element that is not the document itself, usually the first child of the soup object.
+        element = soup.find()
     if element:
         tag_name: Optional[str] = element.name
         text: Optional[str] = element.get_text(strip=True)
@@ -93,13 +125,81 @@ def remove_immediate_text(element):
             child.extract()
 
 
-def get_attribute_names_by_pattern(element, attribute_pattern: Union[str, Iterable[str]]) -> List[str]:
+class AttributePatternSet:
+    """
+    A set of attribute name patterns (each checked by `string_check`), normalized once into one matcher,
+    with the verdict of whether an attribute name matches any of the patterns memoized per attribute name.
+    At most `max_memoized_verdicts` verdicts are memoized; the attribute names seen after that (e.g. per-build names
+    like `data-v-<hash>` on long runs) are checked without being memoized, so that the memo does not grow without bound.
+
+    Cleaning a page checks the same handful of attribute names against the same patterns for every element;
+    with the verdicts memoized, each check after the first one of an attribute name is a dictionary hit.
+    Use `compile_attribute_patterns` to get one; the attribute helpers and `clean_html` accept it in place of patterns.
+
+    Examples:
+        >>> patterns = compile_attribute_patterns(['class', '*name', '*label'])
+        >>> [patterns.matches(attr) for attr in ('class', 'aria-label', 'data-name', 'id')]
+        [True, True, True, False]
+        >>> compile_attribute_patterns('*').matches('id'), compile_attribute_patterns('').matches('id')
+        (True, False)
+        >>> compile_attribute_patterns(patterns) is patterns
+        True
+        >>> patterns = AttributePatternSet('*label', max_memoized_verdicts=2)
+        >>> [patterns.matches(f'data-{i}-label') for i in range(4)], len(patterns._verdicts)
+        ([True, True, True, True], 2)
+    """
+
+    __slots__ = ('patterns', 'match_all', 'max_memoized_verdicts', '_verdicts')
+
+    def __init__(self, attribute_pattern: Union[str, Iterable[str]], max_memoized_verdicts: int = 4096):
+        self.match_all = attribute_pattern == '*'
+        if self.match_all or not attribute_pattern:
+            self.patterns = ()
+        elif isinstance(attribute_pattern, str):
+            self.patterns = (attribute_pattern,)
+        else:
+            self.patterns = tuple(attribute_pattern)
+        self.max_memoized_verdicts = max_memoized_verdicts
+        self._verdicts = {}
+
+    def matches(self, attr: str) -> bool:
+        verdict = self._verdicts.get(attr, None)
+        if verdict is None:
+            verdict = self.match_all or any(string_check(attr, attr_pattern) for attr_pattern in self.patterns)
+            if len(self._verdicts) < self.max_memoized_verdicts:
+                self._verdicts[attr] = verdict
+        return verdict
+
+    def __call__(self, attr: str) -> bool:
+        return self.matches(attr)
+
+
+@lru_cache(maxsize=64)
+def _compile_hashable_attribute_patterns(attribute_pattern: Union[str, Tuple[str, ...]]) -> AttributePatternSet:
+    return AttributePatternSet(attribute_pattern)
+
+
+def compile_attribute_patterns(attribute_pattern: Union[str, Iterable[str], AttributePatternSet]) -> AttributePatternSet:
+    """
+    Compiles attribute name patterns into an `AttributePatternSet`; returns it as is if already compiled.
+    Patterns given as a string or a tuple (e.g. `DEFAULT_HTML_CLEAN_ATTRIBUTE_TO_KEEP`) share one compiled set
+    across calls, so its memoized verdicts carry over from page to page.
+    """
+    if isinstance(attribute_pattern, AttributePatternSet):
+        return attribute_pattern
+    if attribute_pattern is None or isinstance(attribute_pattern, (str, tuple)):
+        return _compile_hashable_attribute_patterns(attribute_pattern)
+    return AttributePatternSet(attribute_pattern)
+
+
+def get_attribute_names_by_pattern(element, attribute_pattern: Union[str, Iterable[str], AttributePatternSet]) -> List[str]:
     """
     Get attribute names of an element that match the specified pattern(s).
 
     Args:
         element: The BeautifulSoup element.
-        attribute_pattern: A single pattern or a list of patterns to match attribute names.
+        attribute_pattern: A single pattern or a list of patterns to match attribute names,
+            or an `AttributePatternSet`.
 
     Returns:
         A list of attribute names that match the pattern(s), or None if no matches.
@@ -122,32 +222,18 @@ def get_attribute_names_by_pattern(element, attribute_pattern: Union[str, Iterab
         >>> get_attribute_names_by_pattern(element, ['!^data-'])
         ['id', 'class']
     """
-    if attribute_pattern == '*':
-        return list(element.attrs.keys())
-    elif not attribute_pattern:
-        return []
-    elif isinstance(attribute_pattern, str):
-        return [
-            attr for attr in element.attrs
-            if string_check(attr, attribute_pattern)
-        ]
-    else:
-        return [
-            attr for attr in element.attrs
-            if any(
-                string_check(attr, _attr_pattern)
-                for _attr_pattern in attribute_pattern
-            )
-        ]
+    attribute_pattern = compile_attribute_patterns(attribute_pattern)
+    return [attr for attr in element.attrs if attribute_pattern.matches(attr)]
 
 
-def get_attribute_names_excluding_pattern(element, attribute_pattern: Union[str, Iterable[str]]) -> List[str]:
+def get_attribute_names_excluding_pattern(element, attribute_pattern: Union[str, Iterable[str], AttributePatternSet]) -> List[str]:
     """
     Get attribute names of an element excluding those that match the specified pattern(s).
 
     Args:
         element: The BeautifulSoup element.
-        attribute_pattern: A single pattern or a list of patterns to exclude attribute names.
+        attribute_pattern: A single pattern or a list of patterns to exclude attribute names,
+            or an `AttributePatternSet`.
 
     Returns:
         Optional[List[str]]: A list of attribute names that do not match the pattern(s), or None if no exclusions.
@@ -169,32 +255,17 @@ def get_attribute_names_excluding_pattern(element, attribute_pattern: Union[str,
         >>> get_attribute_names_excluding_pattern(element, ['!^data-'])
         ['data-value']
     """
-    if attribute_pattern == '*':
-        return []
-    elif not attribute_pattern:
-        return list(element.attrs.keys())
-    elif isinstance(attribute_pattern, str):
-        return [
-            attr for attr in element.attrs
-            if not string_check(attr, attribute_pattern)
-        ]
-    else:
-        return [
-            attr for attr in element.attrs
-            if not any(
-                string_check(attr, attr_pattern)
-                for attr_pattern in attribute_pattern
-            )
-        ]
+    attribute_pattern = compile_attribute_patterns(attribute_pattern)
+    return [attr for attr in element.attrs if not attribute_pattern.matches(attr)]
 
 
-def keep_specified_attributes(element, attributes_to_keep: Union[str, Iterable[str]]):
+def keep_specified_attributes(element, attributes_to_keep: Union[str, Iterable[str], AttributePatternSet]):
     """
     Keep specified attributes of an element and remove the rest.
 
     Args:
         element: The BeautifulSoup element.
-        attributes_to_keep: A single attribute or a list of attributes to keep.
+        attributes_to_keep: A single attribute or a list of attributes to keep, or an `AttributePatternSet`.
 
     Examples:
         >>> from copy import deepcopy
@@ -223,17 +294,123 @@ def keep_specified_attributes(element, attributes_to_keep: Union[str, Iterable[s
             del element[attr]
 
 
-def find_element_by_attribute(html_content: str, attribute_name: str, attribute_value: str) -> str:
+# region parse-once documents
+
+class HtmlDocument:
+    """
+    An HTML snapshot parsed once (by BeautifulSoup with `html.parser`), with lazily built indexes for repeated lookups.
+
+    The tag index (tag name to elements) and the attribute index (attribute name, then attribute value to elements)
+    are built on the first lookup that needs them; the attribute index is built one attribute name at a time.
+    As in `soup.find(attrs={...})`, a multi-valued attribute (e.g. 'class') is indexed by each of its values and by
+    the whole value string. Elements are listed in document order, so a lookup returns the same element as `soup.find`.
+
+    The helpers of this module accept an `HtmlDocument` in place of an HTML string; the lookups
+    (`find_element_by_attribute`, `find_element_by_any_attribute`, `extract_attributes`) then become dictionary hits.
+    The parsed tree is shared by all lookups and must not be modified.
+
+    Examples:
+        >>> document = HtmlDocument('<div id="a" class="box main"><span __id__="1">One</span><span __id__="2">Two</span></div>')
+        >>> document.find_by_attribute('__id__', '2')
+        <span __id__="2">Two</span>
+        >>> [element['__id__'] for element in document.find_all_by_tag('span')]
+        ['1', '2']
+        >>> document.find_by_attribute('class', 'main')['id']
+        'a'
+        >>> document.find_by_attribute('class', 'box main')['id']
+        'a'
+        >>> str(find_element_by_any_attribute(document, {'__id__': '3', 'id': 'a'})).startswith('<div class="box main" id="a">')
+        True
+        >>> extract_attributes(document, 'span', ['__id__'])
+        {'__id__': '1'}
+    """
+
+    def __init__(self, html_content: str):
+        self.html = html_content
+        self.soup = BeautifulSoup(html_content, 'html.parser')
+        self._elements = None
+        self._tag_index = None
+        self._attribute_index = {}
+
+    @property
+    def elements(self) -> List[Tag]:
+        """All elements of the document, in document order."""
+        if self._elements is None:
+            self._elements = self.soup.find_all()
+        return self._elements
+
+    def _get_tag_index(self) -> Mapping[str, List[Tag]]:
+        if self._tag_index is None:
+            self._tag_index = {}
+            for element in self.elements:
+                self._tag_index.setdefault(element.name, []).append(element)
+        return self._tag_index
+
+    def _get_attribute_value_index(self, attribute_name: str) -> Mapping[str, List[Tag]]:
+        attribute_value_index = self._attribute_index.get(attribute_name, None)
+        if attribute_value_index is None:
+            attribute_value_index = self._attribute_index[attribute_name] = {}
+            for element in self.elements:
+                value = element.attrs.get(attribute_name, None)
+                if value is None:
+                    continue
+                if isinstance(value, str):
+                    attribute_value_index.setdefault(value, []).append(element)
+                else:
+                    for _value in dict.fromkeys((*value, ' '.join(value))):
+                        attribute_value_index.setdefault(_value, []).append(element)
+        return attribute_value_index
+
+    def find_all_by_tag(self, tag: str) -> List[Tag]:
+        return self._get_tag_index().get(tag, [])
+
+    def find_by_tag(self, tag: str) -> Optional[Tag]:
+        elements = self.find_all_by_tag(tag)
+        return elements[0] if elements else None
+
+    def find_all_by_attribute(self, attribute_name: str, attribute_value: str) -> List[Tag]:
+        return self._get_attribute_value_index(attribute_name).get(attribute_value, [])
+
+    def find_by_attribute(self, attribute_name: str, attribute_value: str) -> Optional[Tag]:
+        elements = self.find_all_by_attribute(attribute_name, attribute_value)
+        return elements[0] if elements else None
+
+    def find_by_any_attribute(self, attributes: Mapping[str, str]) -> Optional[Tag]:
+        """Finds the first element with any of the attributes and values, trying the attributes in order."""
+        for attribute_name, attribute_value in attributes.items():
+            element = self.find_by_attribute(attribute_name, attribute_value)
+            if element is not None:
+                return element
+
+    def __str__(self):
+        return self.html
+
+
+def _get_html_string(html_content: Union[str, HtmlDocument]) -> str:
+    return html_content.html if isinstance(html_content, HtmlDocument) else html_content
+
+# endregion
+
+
+def find_element_by_attribute(
+        html_content: Union[str, HtmlDocument],
+        attribute_name: str,
+        attribute_value: str,
+        parser_backend: Union[str, HtmlParserBackends] = None
+) -> Optional[Tag]:
     """
     Finds the HTML element with the specified attribute and value.
 
     Args:
-        html_content: A string containing HTML content to be searched.
+        html_content: A string containing HTML content to be searched, or its `HtmlDocument`.
         attribute_name: The name of the attribute to search for.
         attribute_value: The value of the attribute to match.
+        parser_backend: The HTML parser backend (see `html_parser_backends`);
+            `html.parser` if not specified.
 
     Returns:
-        The HTML representation of the found element, or an empty string if not found.
+        The found BeautifulSoup element, or None if not found. With a backend other than `html.parser`,
+        only the found element is parsed by BeautifulSoup, so it has no parent or siblings.
 
     Examples:
         >>> sample_html = '''
@@ -247,12 +424,43 @@ def find_element_by_attribute(html_content: str, attribute_name: str, attribute_
 
         This example demonstrates finding an element with the specified attribute and value ('__id__="123"') within a more complex HTML structure.
     """
-    soup = BeautifulSoup(html_content, 'html.parser')
-    found_element = soup.find(attrs={attribute_name: attribute_value})
-    return found_element
+    return find_element_by_any_attribute(html_content, {attribute_name: attribute_value}, parser_backend=parser_backend)
+
+
+def find_element_by_any_attribute(
+        html_content: Union[str, HtmlDocument],
+        attributes: Mapping[str, str],
+        parser_backend: Union[str, HtmlParserBackends] = None
+) -> Optional[Tag]:
+    """
+    Finds the first HTML element with any of the specified attributes and values, trying the attributes in order;
+    returns the found BeautifulSoup element (see `find_element_by_attribute`), or None if not found.
 
+    Examples:
+        >>> sample_html = '<div id="a" class="box main">First</div><span __id__="1">Second</span>'
+        >>> str(find_element_by_any_attribute(sample_html, {'__id__': '1', 'class': 'box'}))
+        '<span __id__="1">Second</span>'
+        >>> str(find_element_by_any_attribute(sample_html, {'__id__': '2', 'class': 'box'}))
+        '<div class="box main" id="a">First</div>'
+    """
+    if isinstance(html_content, HtmlDocument):
+        return html_content.find_by_any_attribute(attributes)
+
+    parser_backend = resolve_html_parser_backend(parser_backend)
+    if parser_backend != HtmlParserBackends.HTML_PARSER:
+        capture = parse_html_events(
+            html_content,
+            _HtmlElementCapture(*(
+                (lambda name, attrs, _name=attribute_name, _value=attribute_value: _has_attribute_value(name, attrs, _name, _value))
+                for attribute_name, attribute_value in attributes.items()
+            )),
+            parser_backend=parser_backend
+        )
+        for found_element in capture.captured:
+            if found_element is not None:
+                return BeautifulSoup(found_element.html, 'html.parser').find()
+        return None
 
-def find_element_by_any_attribute(html_content: str, attributes: Mapping[str, str]) -> str:
     soup = BeautifulSoup(html_content, 'html.parser')
     for attribute_name, attribute_value in attributes.items():
         found_element = soup.find(attrs={attribute_name: attribute_value})
@@ -260,11 +468,26 @@ def find_element_by_any_attribute(html_content: str, attributes: Mapping[str, st
             return found_element
 
 
+XPATH_WHITESPACE_REGEX = re.compile(r'[ \t\r\n]+')
+
+
+def normalize_xpath_whitespace(text: str) -> str:
+    """
+    Normalizes whitespace as XPath's `normalize-space()`, which only treats spaces, tabs and line breaks as whitespace.
+
+    Examples:
+        >>> normalize_xpath_whitespace(' Book\\n\\t now\\xa0 ')
+        'Book now\\xa0'
+    """
+    return XPATH_WHITESPACE_REGEX.sub(' ', text).strip(' ')
+
+
 def get_xpath(
         tag_name: Optional[str] = '*',
         attributes: Mapping[str, Any] = None,
         text: str = None,
-        immediate_text: str = None
+        immediate_text: str = None,
+        normalize_whitespace: bool = False
 ) -> str:
     """
     Generate an XPath expression based on an optional tag name, attribute key-value pairs, and optional text content.
@@ -274,6 +497,11 @@ def get_xpath(
         attributes (dict, optional): A dictionary containing attribute key-value pairs.
         text (str, optional): The text content to search for within the element and its descendants.
         immediate_text (str, optional): The immediate text content to search for within the element.
+        normalize_whitespace (bool, optional): True to match `text` and `immediate_text` with whitespace normalized
+            on both sides as by `normalize-space()`, i.e. runs of spaces, tabs and line breaks collapsed to one space
+            and leading and trailing ones dropped; `immediate_text` is then matched in any of the element's own text
+            nodes instead of only the first one. This is how the page-side text index matches texts
+            (see `find_elements_by_text`).
 
     Returns:
         str: The generated XPath expression.
@@ -285,6 +513,8 @@ def get_xpath(
         '//a[contains(@class, "uitk-tab-anchor") and @href="/Flights" and contains(., "Book Now")]'
         >>> get_xpath(attributes={'class': ['button'], 'type': 'submit'}, text="Click Here")
         '//*[contains(@class, "button") and @type="submit" and contains(., "Click Here")]'
+        >>> get_xpath('a', text=" Book\\n  now ", normalize_whitespace=True)
+        '//a[contains(normalize-space(.), "Book now")]'
 
         >>> from lxml import etree
         >>> from lxml.html import fromstring
@@ -324,25 +554,37 @@ def get_xpath(
             else:
                 conditions.append(f'@{key}="{value}"')
 
-    if text:
-        conditions.append(f'contains(., "{text}")')
-
-    if immediate_text:
-        conditions.append(f'contains(text(), "{immediate_text}")')
+    if normalize_whitespace:
+        if text:
+            conditions.append(f'contains(normalize-space(.), "{normalize_xpath_whitespace(text)}")')
+        if immediate_text:
+            conditions.append(f'text()[contains(normalize-space(.), "{normalize_xpath_whitespace(immediate_text)}")]')
+    else:
+        if text:
+            conditions.append(f'contains(., "{text}")')
+        if immediate_text:
+            conditions.append(f'contains(text(), "{immediate_text}")')
 
     if conditions:
         xpath_parts.append('[' + ' and '.join(conditions) + ']')
     return ''.join(xpath_parts)
 
 
-def extract_attributes(html_content: str, tag: str, attributes: list) -> dict:
+def extract_attributes(
+        html_content: Union[str, HtmlDocument],
+        tag: str,
+        attributes: list,
+        parser_backend: Union[str, HtmlParserBackends] = None
+) -> dict:
     """
     Extracts specified attributes of an HTML element and returns them as a dictionary.
 
     Args:
-        html_content (str): A string containing HTML content to be searched.
+        html_content (str): A string containing HTML content to be searched, or its `HtmlDocument`.
         tag (str): The name of the HTML tag to search for.
         attributes (list): A list of attribute names to extract from the element.
+        parser_backend: The HTML parser backend (see `html_parser_backends`);
+            `html.parser` if not specified.
 
     Returns:
         dict: A dictionary containing the specified attributes and their values.
@@ -353,21 +595,41 @@ def extract_attributes(html_content: str, tag: str, attributes: list) -> dict:
         >>> print(extracted_attributes)
         {'id': '123', 'class': 'container', 'data-value': 'example'}
     """
-    soup = BeautifulSoup(html_content, 'html.parser')
-    element = soup.find(tag)
+    if isinstance(html_content, HtmlDocument):
+        element = html_content.find_by_tag(tag)
+    else:
+        parser_backend = resolve_html_parser_backend(parser_backend)
+        if parser_backend != HtmlParserBackends.HTML_PARSER:
+            element = parse_html_events(
+                html_content, _HtmlElementCapture(lambda name, attrs: name == tag), parser_backend=parser_backend
+            ).captured[0]
+            if element is None:
+                return {}
+            element_attributes = _get_bs4_attributes(element.name, element.attrs)
+            return {attr: element_attributes[attr] for attr in attributes if attr in element_attributes}
+
+        soup = BeautifulSoup(html_content, 'html.parser')
+        element = soup.find(tag)
     if element:
         return {attr: element.get(attr) for attr in attributes if element.get(attr) is not None}
     else:
         return {}
 
 
-def add_unique_index_to_html(html_content: str, index_name: str = '__index__') -> str:
+def add_unique_index_to_html(
+        html_content: Union[str, HtmlDocument],
+        index_name: str = '__index__',
+        parser_backend: Union[str, HtmlParserBackends] = None
+) -> str:
     """
     Adds a unique index to each HTML tag in the provided HTML content using a specified attribute name.
 
     Args:
-        html_content (str): A string containing HTML content to be processed.
+        html_content (str): A string containing HTML content to be processed, or its `HtmlDocument`
+            (whose parsed tree is left unchanged).
         index_name (str): The attribute name to use for the index. Defaults to '__index__'.
+        parser_backend: The HTML parser backend (see `html_parser_backends`);
+            `html.parser` if not specified.
 
     Returns:
         str: Modified HTML content with unique index attributes added to each tag.
@@ -381,6 +643,11 @@ def add_unique_index_to_html(html_content: str, index_name: str = '__index__') -
         This example demonstrates how each tag in the HTML string is assigned a unique index based on the order it appears,
         using the default index name '__index__'.
     """
+    html_content = _get_html_string(html_content)
+    parser_backend = resolve_html_parser_backend(parser_backend)
+    if parser_backend != HtmlParserBackends.HTML_PARSER:
+        return ''.join(parse_html_events(html_content, _HtmlRenderer(index_name), parser_backend=parser_backend).pieces)
+
     soup = BeautifulSoup(html_content, 'html.parser')
 
     index = 0  # Initialize a counter
@@ -401,18 +668,21 @@ DFAULT_HTML_CLEAN_TAGS_TO_REMOVE = ('script',)
 DEFAULT_HTML_CLEAN_ATTRIBUTE_TO_KEEP = ('class', 'href', '*name', '*label')
 
 
-def clean_html(html_content, tags_to_keep=DEFAULT_HTML_CLEAN_TAGS_TO_KEEP, tags_to_remove=DFAULT_HTML_CLEAN_TAGS_TO_REMOVE, attributes_to_keep: Union[str, Iterable[str]] = DEFAULT_HTML_CLEAN_ATTRIBUTE_TO_KEEP, keep_elements_with_immediate_text=True):
+def clean_html(html_content, tags_to_keep=DEFAULT_HTML_CLEAN_TAGS_TO_KEEP, tags_to_remove=DFAULT_HTML_CLEAN_TAGS_TO_REMOVE, attributes_to_keep: Union[str, Iterable[str], AttributePatternSet] = DEFAULT_HTML_CLEAN_ATTRIBUTE_TO_KEEP, keep_elements_with_immediate_text=True, parser_backend: Union[str, HtmlParserBackends] = None):
     """
     Cleans HTML content by selectively preserving and removing specified elements and attributes,
     and can conditionally keep direct text of non-kept elements.
 
     Args:
-        html_content (str): The HTML content to clean.
+        html_content (str): The HTML content to clean, or its `HtmlDocument` (whose parsed tree is left unchanged).
         tags_to_keep (list of str): Tags that should be preserved in the HTML.
         tags_to_remove (list of str): Tags that should be removed from the HTML.
-        attributes_to_keep (list of str): Attributes that should be preserved on the retained tags.
+        attributes_to_keep (list of str): Attributes that should be preserved on the retained tags;
+            can also be an `AttributePatternSet` (see `compile_attribute_patterns`).
         keep_elements_with_immediate_text (bool): If True, elements not in `tags_to_keep` will be
             removed but their direct text will be kept. If False, such elements will be completely removed.
+        parser_backend: The HTML parser backend (see `html_parser_backends`); `html.parser` if not specified.
+            Backends other than `html.parser` clean the HTML by `clean_html_streaming`.
 
     Returns:
         str: The cleaned HTML content as a string.
@@ -456,6 +726,19 @@ def clean_html(html_content, tags_to_keep=DEFAULT_HTML_CLEAN_TAGS_TO_KEEP, tags_
 
 
     """
+    html_content = _get_html_string(html_content)
+    parser_backend = resolve_html_parser_backend(parser_backend)
+    if parser_backend != HtmlParserBackends.HTML_PARSER:
+        return clean_html_streaming(
+            html_content,
+            tags_to_keep=tags_to_keep,
+            tags_to_remove=tags_to_remove,
+            attributes_to_keep=attributes_to_keep,
+            keep_elements_with_immediate_text=keep_elements_with_immediate_text,
+            parser_backend=parser_backend
+        )
+
+    attributes_to_keep = compile_attribute_patterns(attributes_to_keep)
     soup = BeautifulSoup(html_content, 'html.parser')
 
     # Remove explicitly unwanted tags
@@ -476,3 +759,385 @@ def clean_html(html_content, tags_to_keep=DEFAULT_HTML_CLEAN_TAGS_TO_KEEP, tags_
             element.unwrap()
 
     return str(soup)
+
+
+# region parser backends
+
+_NON_WHITESPACE_REGEX = re.compile(r'\S+')
+
+# the markup BeautifulSoup renders around special strings
+_SPECIAL_STRING_PREFIX_AND_SUFFIX = {
+    STRING_TYPE_COMMENT: ('<!--', '-->'),
+    STRING_TYPE_DOCTYPE: ('<!DOCTYPE ', '>\n'),
+    STRING_TYPE_CDATA: ('<![CDATA[', ']]>'),
+    STRING_TYPE_DECLARATION: ('<?', '?>'),
+    STRING_TYPE_PROCESSING_INSTRUCTION: ('<?', '>')
+}
+
+
+def _escape_html_text(text: str) -> str:
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _quote_html_attribute_value(value: str) -> str:
+    value = _escape_html_text(value)
+    if '"' in value:
+        if "'" in value:
+            return '"' + value.replace('"', '&quot;') + '"'
+        return "'" + value + "'"
+    return '"' + value + '"'
+
+
+def _render_html_start_tag(name: str, attrs: Mapping[str, str], is_attribute_kept: Callable[[str], bool] = None) -> str:
+    """Renders a start tag the same way as BeautifulSoup, i.e. with sorted attributes and with '/>' for void elements."""
+    rendered_attrs = []
+    for attr in sorted(attrs):
+        if is_attribute_kept is None or is_attribute_kept(attr):
+            value = attrs[attr]
+            if is_multi_valued_attribute(name, attr):
+                value = ' '.join(_NON_WHITESPACE_REGEX.findall(value))
+            rendered_attrs.append(f' {attr}={_quote_html_attribute_value(value)}')
+    return f"<{name}{''.join(rendered_attrs)}{'/' if name in HTML_VOID_TAGS else ''}>"
+
+
+def _render_html_end_tag(name: str) -> str:
+    return '' if name in HTML_VOID_TAGS else f'</{name}>'
+
+
+def _render_html_string(text: str, string_type: Optional[str], parent_name: Optional[str]) -> str:
+    if string_type is not None:
+        prefix, suffix = _SPECIAL_STRING_PREFIX_AND_SUFFIX[string_type]
+        return prefix + text + suffix
+    if parent_name in ('script', 'style'):
+        return text
+    return _escape_html_text(text)
+
+
+def _get_bs4_attributes(name: str, attrs: Mapping[str, str]) -> Mapping[str, Union[str, List[str]]]:
+    """Gets attributes as BeautifulSoup gives them, i.e. with multi-valued attributes (e.g. 'class') as lists."""
+    return {
+        attr: (_NON_WHITESPACE_REGEX.findall(value) if is_multi_valued_attribute(name, attr) else value)
+        for attr, value in attrs.items()
+    }
+
+
+def _is_bs4_text_string(string_type: Optional[str], container: Optional[str], element_container: Optional[str]) -> bool:
+    """
+    Whether `get_text` of an element includes a string. BeautifulSoup types the strings in a <script>, <style>
+    or <template> (the innermost one, `container`) after it, and an element only collects strings of its own type.
+    """
+    return (
+            (string_type is None and container == element_container)
+            or (string_type == STRING_TYPE_CDATA and element_container is None)
+    )
+
+
+class _HtmlRenderer(HtmlEventHandler):
+    """Renders HTML the same way as `str(BeautifulSoup(...))`; optionally numbers the elements by an index attribute."""
+
+    def __init__(self, index_name: str = None):
+        self.index_name = index_name
+        self.pieces: List[str] = []
+        self._open_elements: List[str] = []
+        self._index = 0
+
+    def start_element(self, name, attrs):
+        if self.index_name:
+            attrs = {**attrs, self.index_name: str(self._index)}
+            self._index += 1
+        self.pieces.append(_render_html_start_tag(name, attrs))
+        self._open_elements.append(name)
+
+    def end_element(self, name):
+        self._open_elements.pop()
+        self.pieces.append(_render_html_end_tag(name))
+
+    def add_string(self, text, string_type=None):
+        self.pieces.append(_render_html_string(text, string_type, self._open_elements[-1] if self._open_elements else None))
+
+
+class _CapturedElement:
+    __slots__ = ('name', 'attrs', 'container', 'depth', 'text_pieces', 'html_pieces')
+
+    def __init__(self, name: str, attrs: Mapping[str, str]):
+        self.name = name
+        self.attrs = attrs
+        self.container = name if name in HTML_STRING_CONTAINER_TAGS else None
+        self.depth = 0
+        self.text_pieces: List[str] = []
+        self.html_pieces: List[str] = []
+
+    @property
+    def text(self) -> str:
+        """The text of the element, as `get_text(strip=True)` of BeautifulSoup."""
+        return ''.join(self.text_pieces)
+
+    @property
+    def html(self) -> str:
+        return ''.join(self.html_pieces)
+
+
+class _HtmlElementCapture(HtmlEventHandler):
+    """
+    Captures the first element matching each of the predicates (each taking an element name and its attributes),
+    together with its text and HTML; stops parsing once the element of the first predicate is captured.
+    """
+
+    def __init__(self, *predicates: Callable[[str, Mapping[str, str]], bool]):
+        self.predicates = predicates
+        self.captured: List[Optional[_CapturedElement]] = [None] * len(predicates)
+        self._capturing: List[_CapturedElement] = []
+        self._open_elements: List[str] = []
+        self._containers: List[Optional[str]] = [None]
+
+    def start_element(self, name, attrs):
+        captured = None
+        for predicate_index, predicate in enumerate(self.predicates):
+            if self.captured[predicate_index] is None and predicate(name, attrs):
+                if captured is None:
+                    captured = _CapturedElement(name, attrs)
+                    self._capturing.append(captured)
+                self.captured[predicate_index] = captured
+        if self._capturing:
+            rendered = _render_html_start_tag(name, attrs)
+            for captured in self._capturing:
+                captured.html_pieces.append(rendered)
+                captured.depth += 1
+        self._open_elements.append(name)
+        if name in HTML_STRING_CONTAINER_TAGS:
+            self._containers.append(name)
+
+    def end_element(self, name):
+        self._open_elements.pop()
+        if name in HTML_STRING_CONTAINER_TAGS:
+            self._containers.pop()
+        if self._capturing:
+            rendered = _render_html_end_tag(name)
+            for captured in self._capturing:
+                captured.html_pieces.append(rendered)
+                captured.depth -= 1
+            self._capturing = [captured for captured in self._capturing if captured.depth]
+            if self.captured[0] is not None and self.captured[0].depth == 0:
+                raise StopHtmlEvents()
+
+    def add_string(self, text, string_type=None):
+        if self._capturing:
+            rendered = _render_html_string(text, string_type, self._open_elements[-1] if self._open_elements else None)
+            stripped_text = text.strip()
+            for captured in self._capturing:
+                captured.html_pieces.append(rendered)
+                if stripped_text and _is_bs4_text_string(string_type, self._containers[-1], captured.container):
+                    captured.text_pieces.append(stripped_text)
+
+
+def _has_attribute_value(name: str, attrs: Mapping[str, str], attribute_name: str, attribute_value: str) -> bool:
+    """Mirrors `soup.find(attrs={attribute_name: attribute_value})`, which also matches any single value of a multi-valued attribute."""
+    value = attrs.get(attribute_name, None)
+    if value is None:
+        return False
+    if is_multi_valued_attribute(name, attribute_name):
+        values = _NON_WHITESPACE_REGEX.findall(value)
+        return attribute_value in values or attribute_value == ' '.join(values)
+    return value == attribute_value
+
+
+class _HtmlTextCollector(HtmlEventHandler):
+    """Collects the text of HTML as `BeautifulSoup(...).get_text()`, skipping elements for which `skip_element` returns True."""
+
+    def __init__(self, skip_element: Callable[[str, Mapping[str, str]], bool] = None):
+        self.skip_element = skip_element
+        self.text_pieces: List[str] = []
+        self._skipped_depth = 0
+        self._containers: List[Optional[str]] = [None]
+
+    def start_element(self, name, attrs):
+        if self._skipped_depth or (self.skip_element is not None and self.skip_element(name, attrs)):
+            self._skipped_depth += 1
+        if name in HTML_STRING_CONTAINER_TAGS:
+            self._containers.append(name)
+
+    def end_element(self, name):
+        if self._skipped_depth:
+            self._skipped_depth -= 1
+        if name in HTML_STRING_CONTAINER_TAGS:
+            self._containers.pop()
+
+    def add_string(self, text, string_type=None):
+        if not self._skipped_depth and _is_bs4_text_string(string_type, self._containers[-1], None):
+            self.text_pieces.append(text)
+
+
+def get_html_text(
+        html_content: Union[str, HtmlDocument],
+        skip_element: Callable[[str, Mapping[str, str]], bool] = None,
+        parser_backend: Union[str, HtmlParserBackends] = None
+) -> str:
+    """
+    Gets the text of HTML, the same as `BeautifulSoup(html_content, 'html.parser').get_text()`,
+    after removing the elements for which `skip_element` (taking an element name and its attributes) returns True.
+
+    Examples:
+        >>> get_html_text('<div>Hello <span id="ad">Buy now!</span><b>World</b><script>x = 1</script></div>')
+        'Hello Buy now!World'
+        >>> get_html_text('<div>Hello <span id="ad">Buy now!</span><b>World</b></div>', lambda name, attrs: attrs.get('id') == 'ad')
+        'Hello World'
+    """
+    return ''.join(parse_html_events(
+        _get_html_string(html_content), _HtmlTextCollector(skip_element), parser_backend=parser_backend
+    ).text_pieces)
+
+
+class _HtmlCleanerElement:
+    __slots__ = ('name', 'attrs', 'removed', 'kept', 'has_text', 'start_slot', 'skip_next_child', 'removable_text_slots')
+
+    def __init__(self, name: str, attrs: Mapping, removed: bool):
+        self.name = name
+        self.attrs = attrs
+        self.removed = removed
+        self.kept = False
+        self.has_text = False
+        self.start_slot = None
+        self.skip_next_child = False
+        self.removable_text_slots = None
+
+
+class _HtmlCleaner(HtmlEventHandler):
+    """
+    Applies the rules of `clean_html` in a single pass over the elements and strings of HTML, appending the cleaned
+    markup to a list of output pieces; only the open elements are kept in memory.
+
+    The start tag of an element that is not in `tags_to_keep` is reserved as an empty slot in the output,
+    and filled once the element turns out to have immediate text; the end tag is only output if the start tag is.
+    """
+
+    def __init__(
+            self,
+            tags_to_keep,
+            tags_to_remove,
+            attributes_to_keep,
+            keep_elements_with_immediate_text: bool
+    ):
+        self.tags_to_keep = tags_to_keep
+        self.tags_to_remove = set(tags_to_remove)
+        self.attributes_to_keep = compile_attribute_patterns(attributes_to_keep)
+        self.keep_elements_with_immediate_text = keep_elements_with_immediate_text
+        self.pieces: List[str] = []
+        self._stack: List[_HtmlCleanerElement] = []
+
+    def start_element(self, name, attrs):
+        parent = self._stack[-1] if self._stack else None
+        removed = name in self.tags_to_remove or (parent is not None and parent.removed)
+        element = _HtmlCleanerElement(name, attrs, removed)
+        if not removed:
+            if parent is not None:
+                parent.skip_next_child = False
+            element.kept = name in self.tags_to_keep
+            element.start_slot = len(self.pieces)
+            self.pieces.append('')
+        self._stack.append(element)
+
+    def end_element(self, name):
+        element = self._stack.pop()
+        if not element.removed and (element.kept or (element.has_text and self.keep_elements_with_immediate_text)):
+            self.pieces[element.start_slot] = _render_html_start_tag(element.name, element.attrs, self.attributes_to_keep.matches)
+            self.pieces.append(_render_html_end_tag(element.name))
+
+    def add_string(self, text, string_type=None):
+        parent = self._stack[-1] if self._stack else None
+        if parent is not None and parent.removed:
+            return
+        rendered = _render_html_string(text, string_type, parent.name if parent is not None else None)
+        if parent is None or parent.kept:
+            self.pieces.append(rendered)
+            return
+
+        has_text = bool(text.strip())
+        if self.keep_elements_with_immediate_text:
+            parent.has_text = parent.has_text or has_text
+            self.pieces.append(rendered)
+            return
+
+        if has_text and not parent.has_text:
+            parent.has_text = True
+            for slot in parent.removable_text_slots or ():
+                self.pieces[slot] = ''
+            parent.removable_text_slots = None
+
+        # mirrors `remove_immediate_text`, which extracts strings while iterating the children,
+        # so that the child right after each extracted string is skipped (and a string there survives)
+        if parent.skip_next_child:
+            parent.skip_next_child = False
+            self.pieces.append(rendered)
+            return
+        parent.skip_next_child = True
+        if parent.has_text:
+            return
+        if parent.removable_text_slots is None:
+            parent.removable_text_slots = []
+        parent.removable_text_slots.append(len(self.pieces))
+        self.pieces.append(rendered)
+
+
+def clean_html_streaming(
+        html_content: Union[str, HtmlDocument, Iterable[str], IO[str]],
+        tags_to_keep=DEFAULT_HTML_CLEAN_TAGS_TO_KEEP,
+        tags_to_remove=DFAULT_HTML_CLEAN_TAGS_TO_REMOVE,
+        attributes_to_keep: Union[str, Iterable[str], AttributePatternSet] = DEFAULT_HTML_CLEAN_ATTRIBUTE_TO_KEEP,
+        keep_elements_with_immediate_text=True,
+        chunk_size: int = HTML_STREAM_CHUNK_SIZE,
+        parser_backend: Union[str, HtmlParserBackends] = HtmlParserBackends.HTML_PARSER
+) -> str:
+    """
+    Same as `clean_html`, but cleans the HTML in a single pass over its elements and strings,
+    without building a BeautifulSoup tree. With the `html.parser` backend, the HTML is not even parsed into a tree,
+    and besides the output, the memory used is bounded by the nesting depth of the HTML rather than its size,
+    so this is the one to use for multi-megabyte pages.
+
+    The output is identical to that of `clean_html` with the same arguments.
+
+    Args:
+        html_content: The HTML content to clean; can also be a text file object or an iterable of text chunks,
+            so that the HTML does not need to be loaded into memory as a whole.
+        tags_to_keep: See `clean_html`.
+        tags_to_remove: See `clean_html`.
+        attributes_to_keep: See `clean_html`.
+        keep_elements_with_immediate_text: See `clean_html`.
+        chunk_size: The number of characters fed to the tokenizer at a time when reading from a file object.
+        parser_backend: The parser backend; see `parse_html_events`.
+
+    Returns:
+        str: The cleaned HTML content as a string.
+
+    Examples:
+        >>> example_html = "<div><a href='http://example.com'>Link</a><script>alert('Hi');</script></div>"
+        >>> clean_html_streaming(example_html, ['a'], ['script'], ['href'], True)
+        '<a href="http://example.com">Link</a>'
+
+        >>> example_html = "<div>Hello <span>World</span><script>Code()</script></div>"
+        >>> clean_html_streaming(example_html, [], ['script'], [], True)
+        '<div>Hello <span>World</span></div>'
+
+        >>> example_html = "<div><span>More text</span></div>"
+        >>> clean_html_streaming(example_html, [], [], [], False)
+        ''
+
+        >>> example_html = "<ul class=' menu  main'><li data-id='1' aria-label='First'>One<br></li><li>Two &amp; <b>more</b></li></ul>"
+        >>> clean_html_streaming(example_html) == clean_html(example_html, parser_backend='html.parser')
+        True
+        >>> clean_html_streaming(example_html)
+        '<ul class="menu main"><li aria-label="First">One</li><li>Two &amp; <b>more</b></li></ul>'
+
+        >>> from io import StringIO
+        >>> clean_html_streaming(StringIO(example_html), chunk_size=7) == clean_html(example_html, parser_backend='html.parser')
+        True
+    """
+    cleaner = _HtmlCleaner(
+        tags_to_keep=tags_to_keep,
+        tags_to_remove=tags_to_remove,
+        attributes_to_keep=attributes_to_keep,
+        keep_elements_with_immediate_text=keep_elements_with_immediate_text
+    )
+    parse_html_events(_get_html_string(html_content), cleaner, parser_backend=parser_backend, chunk_size=chunk_size)
+    return ''.join(cleaner.pieces)
+
+# endregion
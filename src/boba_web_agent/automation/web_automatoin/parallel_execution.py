@@ -0,0 +1,361 @@
+import multiprocessing
+import os
+import signal
+import time
+import traceback
+from collections import deque
+from multiprocessing.connection import wait
+from os import path
+from typing import Mapping, Sequence, Iterable, Iterator, List, Optional
+
+from boba_python_utils.io_utils.json_io import write_json_objs
+from boba_python_utils.path_utils.common import ensure_dir_existence
+
+KEY_TEST_CASE_ID = 'test_case_id'
+KEY_TEST_CASE_TURNS = 'turns'
+KEY_TEST_CASE_TURN_ACTIONS = 'actions'
+
+JOB_STATUS_SUCCEEDED = 'succeeded'
+JOB_STATUS_FAILED = 'failed'
+JOB_STATUS_TIMEOUT = 'timeout'
+JOB_STATUS_CRASHED = 'crashed'
+
+# sent by a worker after launching a browser, with the ids of the browser and driver processes in place of the error
+_WORKER_MESSAGE_PROCESS_IDS = 'process_ids'
+
+
+def iter_test_case_jobs(
+        test_cases: Iterable[Mapping],
+        output_path_recordings_root: str = None,
+        turn_indexes: Sequence[int] = None
+) -> Iterator[Mapping]:
+    """
+    Iterates through the jobs of replaying test cases, one job per test case.
+
+    The turns of a test case are not independent (a turn continues on the page the previous turn left),
+    so a job replays the turns of its test case in order on one driver.
+    The action records of a turn are output to `<output_path_recordings_root>/<test_case_id>/turn_<turn_index>`,
+    the same layout as the one used by the action sequence reproduction tests.
+
+    Args:
+        test_cases: Test cases like `DATA_EXAMPLE`, each with a 'test_case_id' and a list of 'turns'.
+        output_path_recordings_root: The root directory of action records; None to not record actions.
+        turn_indexes: Indexes of the turns to replay, in order; all turns if not specified.
+
+    Examples:
+        >>> jobs = list(iter_test_case_jobs([{'test_case_id': 'flight-0', 'turns': [{'actions': []}, {'actions': []}]}], 'recordings'))
+        >>> jobs[0]['job_id'], [turn['output_path_action_records'] for turn in jobs[0]['turns']]
+        ('flight-0', ['recordings/flight-0/turn_0', 'recordings/flight-0/turn_1'])
+    """
+    for test_case in test_cases:
+        test_case_id = test_case[KEY_TEST_CASE_ID]
+        turns = test_case[KEY_TEST_CASE_TURNS]
+        yield {
+            'job_id': test_case_id,
+            KEY_TEST_CASE_ID: test_case_id,
+            KEY_TEST_CASE_TURNS: [
+                {
+                    'turn_index': turn_index,
+                    KEY_TEST_CASE_TURN_ACTIONS: turns[turn_index][KEY_TEST_CASE_TURN_ACTIONS],
+                    'output_path_action_records': (
+                        None if output_path_recordings_root is None
+                        else path.join(output_path_recordings_root, test_case_id, f'turn_{turn_index}')
+                    )
+                }
+                for turn_index in (range(len(turns)) if turn_indexes is None else turn_indexes)
+                if turn_index < len(turns)
+            ]
+        }
+
+
+def _quit_driver(driver):
+    try:
+        driver.driver.quit()
+    except Exception:
+        pass
+
+
+def _get_driver_process_ids(driver) -> List[int]:
+    """
+    Returns the ids of the browser and driver processes of `driver`. They are not necessarily children of the worker,
+    e.g. `UndetectedChrome` starts the browser detached in its own session.
+    """
+    process_ids = []
+    browser_pid = getattr(driver.driver, 'browser_pid', None)
+    if browser_pid:
+        process_ids.append(browser_pid)
+    service_process = getattr(getattr(driver.driver, 'service', None), 'process', None)
+    if service_process is not None and service_process.pid:
+        process_ids.append(service_process.pid)
+    return process_ids
+
+
+def _worker_main(connection, driver_kwargs: Mapping, execute_actions_kwargs: Mapping):
+    from boba_web_agent.automation.web_automatoin.web_driver import WebDriver
+    from boba_web_agent.automation.web_automatoin.web_driver_pool import reset_driver_session
+
+    driver = None
+    while True:
+        job = connection.recv()
+        if job is None:
+            break
+        if driver is not None:
+            # the previous test case must not leak cookies, storage or tabs into this one
+            try:
+                reset = reset_driver_session(driver.driver)
+            except Exception:
+                reset = False
+            if not reset:
+                _quit_driver(driver)
+                driver = None
+
+        turn_index = None
+        try:
+            if driver is None:
+                driver = WebDriver(**driver_kwargs)
+                connection.send((job['job_id'], _WORKER_MESSAGE_PROCESS_IDS, _get_driver_process_ids(driver)))
+            for turn in job[KEY_TEST_CASE_TURNS]:
+                turn_index = turn['turn_index']
+                driver.execute_actions(
+                    actions=turn[KEY_TEST_CASE_TURN_ACTIONS],
+                    output_path_action_records=turn['output_path_action_records'],
+                    **execute_actions_kwargs
+                )
+            connection.send((job['job_id'], JOB_STATUS_SUCCEEDED, None))
+        except Exception:
+            # the later turns continue on the page of the failed one, so the test case stops here
+            failure = 'the web driver failed to launch' if turn_index is None else f'turn {turn_index} failed'
+            connection.send((job['job_id'], JOB_STATUS_FAILED, f'{failure}:\n{traceback.format_exc()}'))
+            # the browser may be in a bad state; relaunches it for the next job
+            if driver is not None:
+                _quit_driver(driver)
+                driver = None
+
+    if driver is not None:
+        driver.driver.quit()
+
+
+def _get_processes(process_ids: Sequence[int]) -> list:
+    """
+    Returns `psutil.Process` objects of `process_ids`, which refuse to kill a process whose id is later reused;
+    returns the ids themselves if psutil is not installed.
+    """
+    try:
+        import psutil
+    except ImportError:
+        return list(process_ids)
+
+    processes = []
+    for process_id in process_ids:
+        try:
+            processes.append(psutil.Process(process_id))
+        except psutil.Error:
+            pass
+    return processes
+
+
+def _kill_process_tree(process, driver_processes: Sequence = ()):
+    """
+    Kills a worker process together with the browser and driver processes it has launched,
+    including `driver_processes` (see `_get_processes`) and their descendants, which are not necessarily
+    descendants of the worker.
+    """
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+
+    if psutil is not None:
+        processes_to_kill = []
+        for root_process in (process.pid, *driver_processes):
+            try:
+                if not isinstance(root_process, psutil.Process):
+                    root_process = psutil.Process(root_process)
+                if root_process.pid != process.pid:
+                    processes_to_kill.append(root_process)
+                processes_to_kill.extend(root_process.children(recursive=True))
+            except psutil.Error:
+                pass
+        for process_to_kill in processes_to_kill:
+            try:
+                process_to_kill.kill()
+            except psutil.Error:
+                pass
+    else:
+        for driver_process_id in driver_processes:
+            try:
+                os.kill(driver_process_id, getattr(signal, 'SIGKILL', signal.SIGTERM))
+            except OSError:
+                pass
+    process.kill()
+    process.join()
+
+
+class _Worker:
+    __slots__ = ('process', 'connection', 'job', 'start_time', 'driver_processes')
+
+    def __init__(self, context, driver_kwargs: Mapping, execute_actions_kwargs: Mapping):
+        self.connection, worker_connection = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(worker_connection, driver_kwargs, execute_actions_kwargs),
+            daemon=True
+        )
+        self.process.start()
+        worker_connection.close()
+        self.job = None
+        self.start_time = None
+        self.driver_processes = []
+
+    def assign(self, job: Mapping):
+        self.job = job
+        self.start_time = time.monotonic()
+        self.connection.send(job)
+
+    def receive_process_ids(self):
+        """Reads the messages left in the pipe of a dead or timed-out worker for the ids of its latest browser."""
+        try:
+            while self.connection.poll():
+                _, status, process_ids = self.connection.recv()
+                if status == _WORKER_MESSAGE_PROCESS_IDS:
+                    self.driver_processes = _get_processes(process_ids)
+        except (EOFError, OSError):
+            pass
+
+    def release(self):
+        self.job = None
+        self.start_time = None
+
+
+def execute_test_cases(
+        test_cases: Iterable[Mapping] = None,
+        output_path_recordings_root: str = None,
+        num_workers: int = None,
+        timeout_per_job: float = 1800,
+        turn_indexes: Sequence[int] = None,
+        jobs: Iterable[Mapping] = None,
+        driver_kwargs: Mapping = None,
+        execute_actions_kwargs: Mapping = None,
+        poll_interval: float = 1.0
+) -> List[Mapping]:
+    """
+    Replays test cases in parallel, distributed over worker processes each owning its own `WebDriver`.
+
+    A test case is the unit of distribution: its turns run in order on one driver (see `iter_test_case_jobs`).
+    Each worker runs one job at a time, and resets its driver's session (or relaunches the browser) between jobs.
+    A job that exceeds `timeout_per_job`, or whose worker dies (e.g. the browser crashes), only fails itself:
+    the worker is killed together with its browser and replaced by a new one.
+
+    Args:
+        test_cases: Test cases like `DATA_EXAMPLE`; converted to jobs by `iter_test_case_jobs`.
+        output_path_recordings_root: The root directory of action records; the results of all jobs are also written
+            to `execution_results.jsonl` under this directory.
+        num_workers: The number of worker processes; defaults to the number of CPUs.
+        timeout_per_job: The maximum seconds a job, i.e. all replayed turns of a test case, may run.
+        turn_indexes: Indexes of the test case turns to replay, in order; all turns if not specified.
+        jobs: Explicit jobs (as produced by `iter_test_case_jobs`) to run in place of `test_cases`.
+        driver_kwargs: Arguments to construct the `WebDriver` of each worker.
+        execute_actions_kwargs: Extra arguments for `WebDriver.execute_actions`.
+        poll_interval: Seconds between checks for timed-out and crashed workers.
+
+    Returns:
+        One result per job, in the order of the jobs, with the job id, status
+        ('succeeded', 'failed', 'timeout' or 'crashed'), error message and elapsed seconds.
+
+    Raises:
+        ValueError: If two jobs have the same job id.
+
+    Examples:
+        >>> results = execute_test_cases(  # doctest: +SKIP
+        ...     [DATA_EXAMPLE],
+        ...     output_path_recordings_root='test_case_recordings',
+        ...     num_workers=8,
+        ...     driver_kwargs={'headless': True}
+        ... )
+    """
+    if jobs is None:
+        jobs = iter_test_case_jobs(
+            test_cases=test_cases,
+            output_path_recordings_root=output_path_recordings_root,
+            turn_indexes=turn_indexes
+        )
+    jobs = list(jobs)
+    if not jobs:
+        return []
+    job_ids = set()
+    for job in jobs:
+        if job['job_id'] in job_ids:
+            raise ValueError(f"duplicate job id '{job['job_id']}'")
+        job_ids.add(job['job_id'])
+    driver_kwargs = driver_kwargs or {}
+    execute_actions_kwargs = execute_actions_kwargs or {}
+    num_workers = min(num_workers or multiprocessing.cpu_count(), len(jobs))
+
+    context = multiprocessing.get_context('spawn')
+    pending_jobs = deque(jobs)
+    results = {}
+
+    def _new_worker():
+        return _Worker(context, driver_kwargs, execute_actions_kwargs)
+
+    def _record(job: Mapping, status: str, error: Optional[str], start_time: float):
+        results[job['job_id']] = {
+            'job_id': job['job_id'],
+            'status': status,
+            'error': error,
+            'elapsed_seconds': time.monotonic() - start_time
+        }
+
+    workers = [_new_worker() for _ in range(num_workers)]
+    try:
+        while len(results) < len(jobs):
+            for worker in workers:
+                if worker.job is None and pending_jobs:
+                    worker.assign(pending_jobs.popleft())
+
+            busy_connections = {worker.connection: worker for worker in workers if worker.job is not None}
+            for connection in wait(list(busy_connections), timeout=poll_interval):
+                worker = busy_connections[connection]
+                try:
+                    job_id, status, error = connection.recv()
+                except (EOFError, OSError):
+                    # the worker has died; handled by the liveness check below
+                    continue
+                if status == _WORKER_MESSAGE_PROCESS_IDS:
+                    # the worker has (re)launched its browser; the processes of an earlier browser are gone
+                    worker.driver_processes = _get_processes(error)
+                    continue
+                if job_id == worker.job['job_id']:
+                    _record(worker.job, status, error, worker.start_time)
+                    worker.release()
+
+            for worker_index, worker in enumerate(workers):
+                if worker.job is None:
+                    continue
+                if not worker.process.is_alive():
+                    status, error = JOB_STATUS_CRASHED, f'worker exited with code {worker.process.exitcode}'
+                elif time.monotonic() - worker.start_time > timeout_per_job:
+                    status, error = JOB_STATUS_TIMEOUT, f'job exceeded {timeout_per_job} seconds'
+                else:
+                    continue
+                _record(worker.job, status, error, worker.start_time)
+                worker.receive_process_ids()
+                _kill_process_tree(worker.process, worker.driver_processes)
+                worker.connection.close()
+                workers[worker_index] = _new_worker()
+    finally:
+        for worker in workers:
+            try:
+                worker.connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in workers:
+            worker.process.join(timeout=60)
+            if worker.process.is_alive():
+                _kill_process_tree(worker.process, worker.driver_processes)
+
+    results = [results[job['job_id']] for job in jobs]
+    if output_path_recordings_root:
+        ensure_dir_existence(output_path_recordings_root)
+        write_json_objs(results, path.join(output_path_recordings_root, 'execution_results.jsonl'))
+    return results
@@ -0,0 +1,362 @@
+from enum import Enum
+from typing import List, Mapping, Any, Optional, Union
+
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.remote.webelement import WebElement
+
+from boba_web_agent.automation.web_automatoin.selenium.element_index import DEFAULT_ELEMENT_INDEX_ATTRIBUTE, find_element_by_index
+
+
+class AccessibilitySnapshotSources(str, Enum):
+    CDP = 'cdp'
+    PAGE = 'page'
+
+
+# roles that only group their children; such a node without a name is replaced by its children
+ACCESSIBILITY_GROUPING_ROLES = frozenset((
+    'generic', 'none', 'presentation', 'GenericContainer', 'Section', 'LayoutTable', 'LayoutTableRow', 'LayoutTableCell'
+))
+# roles never useful in an observation
+ACCESSIBILITY_DROPPED_ROLES = frozenset(('InlineTextBox', 'LineBreak'))
+ACCESSIBILITY_STATE_PROPERTIES = (
+    'checked', 'selected', 'expanded', 'pressed', 'disabled', 'focused', 'required', 'invalid', 'readonly', 'level'
+)
+
+# Walks the DOM inside the page and returns the accessibility tree approximated from the explicit and implicit
+# ARIA roles and names, as nested `[id, role, name, value, properties, children]` lists; elements with a role are
+# tagged with the element index attribute (see `index_interactive_elements`), which becomes their node id.
+GET_ACCESSIBILITY_TREE_SCRIPT = r"""
+var indexAttribute = arguments[0];
+var maxNameLength = arguments[1];
+var statePropertyNames = arguments[2];
+
+var IMPLICIT_ROLES = {
+    'button': 'button', 'select': 'combobox', 'textarea': 'textbox', 'img': 'img', 'nav': 'navigation',
+    'main': 'main', 'header': 'banner', 'footer': 'contentinfo', 'aside': 'complementary', 'form': 'form',
+    'table': 'table', 'tr': 'row', 'td': 'cell', 'th': 'columnheader', 'ul': 'list', 'ol': 'list',
+    'li': 'listitem', 'dialog': 'dialog', 'option': 'option', 'summary': 'button', 'progress': 'progressbar',
+    'h1': 'heading', 'h2': 'heading', 'h3': 'heading', 'h4': 'heading', 'h5': 'heading', 'h6': 'heading'
+};
+var INPUT_ROLES = {
+    'checkbox': 'checkbox', 'radio': 'radio', 'range': 'slider', 'number': 'spinbutton', 'search': 'searchbox',
+    'button': 'button', 'submit': 'button', 'reset': 'button', 'image': 'button'
+};
+var NAME_FROM_CONTENT_ROLES = {
+    'button': 1, 'link': 1, 'heading': 1, 'option': 1, 'tab': 1, 'menuitem': 1, 'menuitemcheckbox': 1,
+    'menuitemradio': 1, 'checkbox': 1, 'radio': 1, 'switch': 1, 'cell': 1, 'columnheader': 1, 'rowheader': 1,
+    'treeitem': 1, 'tooltip': 1
+};
+var SKIPPED_TAGS = {'script': 1, 'style': 1, 'noscript': 1, 'template': 1, 'head': 1, 'meta': 1, 'link': 1};
+
+function normalize(text) {
+    text = (text || '').replace(/\s+/g, ' ').trim();
+    return text.length > maxNameLength ? text.substring(0, maxNameLength) : text;
+}
+
+function getRole(element, tag) {
+    var role = element.getAttribute('role');
+    if (role) return role.split(' ')[0];
+    if (tag === 'a') return element.hasAttribute('href') ? 'link' : null;
+    if (tag === 'input') {
+        var type = (element.getAttribute('type') || 'text').toLowerCase();
+        if (type === 'hidden') return null;
+        return INPUT_ROLES[type] || 'textbox';
+    }
+    return IMPLICIT_ROLES[tag] || null;
+}
+
+function getLabelText(element) {
+    var labelledBy = element.getAttribute('aria-labelledby');
+    if (labelledBy) {
+        var texts = labelledBy.split(/\s+/).map(function (id) {
+            var label = document.getElementById(id);
+            return label ? label.textContent : '';
+        });
+        return texts.join(' ');
+    }
+    if (element.labels && element.labels.length) return element.labels[0].textContent;
+    return '';
+}
+
+function getName(element, tag, role) {
+    var name = element.getAttribute('aria-label') || getLabelText(element)
+        || element.getAttribute('alt') || '';
+    if (!name && NAME_FROM_CONTENT_ROLES[role]) name = element.innerText || element.textContent;
+    if (!name) name = element.getAttribute('title') || element.getAttribute('placeholder') || '';
+    return normalize(name);
+}
+
+function getProperties(element, tag, role) {
+    var properties = {};
+    for (var i = 0; i < statePropertyNames.length; i++) {
+        var value = element.getAttribute('aria-' + statePropertyNames[i]);
+        if (value !== null && value !== 'false') properties[statePropertyNames[i]] = value === 'true' ? true : value;
+    }
+    if ((role === 'checkbox' || role === 'radio') && element.checked) properties.checked = true;
+    if (tag === 'option' && element.selected) properties.selected = true;
+    if (element.disabled) properties.disabled = true;
+    if (element.required) properties.required = true;
+    if (element.readOnly) properties.readonly = true;
+    if (element === document.activeElement) properties.focused = true;
+    if (role === 'heading' && tag.charAt(0) === 'h') properties.level = +tag.charAt(1);
+    return properties;
+}
+
+function isHidden(element) {
+    if (element.getAttribute('aria-hidden') === 'true' || element.hidden) return true;
+    var style = window.getComputedStyle(element);
+    return style.display === 'none' || style.visibility === 'hidden';
+}
+
+var nextIndex = window.__bobaElementIndexNext || 0;
+function getIndex(element) {
+    var index = element.getAttribute(indexAttribute);
+    if (index === null || !/^\d+$/.test(index)) {
+        index = String(nextIndex++);
+        element.setAttribute(indexAttribute, index);
+    } else if (+index >= nextIndex) {
+        nextIndex = +index + 1;
+    }
+    return +index;
+}
+
+// returns the nodes of `element` to put under its parent: one node if it has a role, otherwise its children's
+function walk(element, nodes) {
+    var tag = element.tagName.toLowerCase();
+    if (SKIPPED_TAGS[tag] || isHidden(element)) return;
+    var role = getRole(element, tag);
+    var children = [];
+    var childNodes = element.shadowRoot ? element.shadowRoot.childNodes : element.childNodes;
+    for (var i = 0; i < childNodes.length; i++) {
+        var child = childNodes[i];
+        if (child.nodeType === 1) {
+            walk(child, children);
+        } else if (child.nodeType === 3) {
+            var text = normalize(child.data);
+            if (text) children.push([null, 'StaticText', text, null, {}, []]);
+        }
+    }
+    if (!role) {
+        Array.prototype.push.apply(nodes, children);
+        return;
+    }
+    var value = null;
+    if (tag === 'input' || tag === 'textarea' || tag === 'select') {
+        if (role !== 'checkbox' && role !== 'radio' && role !== 'button') value = normalize(element.value);
+    }
+    nodes.push([getIndex(element), role, getName(element, tag, role), value || null, getProperties(element, tag, role), children]);
+}
+
+var nodes = [];
+walk(document.body, nodes);
+window.__bobaElementIndexNext = nextIndex;
+return [null, 'RootWebArea', normalize(document.title), null, {}, nodes];
+"""
+
+# Tags the element of a DOM node resolved by DevTools with the element index attribute and returns its index;
+# the element of a document node (e.g. of the 'RootWebArea' node) is its root element.
+TAG_ELEMENT_INDEX_FUNCTION = """
+function (indexAttribute) {
+    var element = this.nodeType === 1 ? this : (this.nodeType === 9 ? this.documentElement : this.parentElement);
+    if (!element) return null;
+    var index = element.getAttribute(indexAttribute);
+    if (index === null || !/^\\d+$/.test(index)) {
+        index = String(window.__bobaElementIndexNext || 0);
+        window.__bobaElementIndexNext = +index + 1;
+        element.setAttribute(indexAttribute, index);
+    }
+    return +index;
+}
+"""
+
+
+def _get_ax_value(ax_node: Mapping, key: str):
+    value = ax_node.get(key)
+    return None if value is None else value.get('value')
+
+
+def _get_cdp_accessibility_tree(driver: WebDriver, max_name_length: int) -> list:
+    ax_nodes = driver.execute_cdp_cmd('Accessibility.getFullAXTree', {})['nodes']
+    ax_nodes_by_id = {ax_node['nodeId']: ax_node for ax_node in ax_nodes}
+
+    def _build(ax_node):
+        children = [
+            _build(ax_nodes_by_id[child_id])
+            for child_id in ax_node.get('childIds', ())
+            if child_id in ax_nodes_by_id
+        ]
+        if ax_node.get('ignored'):
+            return [None, 'none', '', None, {}, children]
+        properties = {}
+        for ax_property in ax_node.get('properties', ()):
+            if ax_property['name'] in ACCESSIBILITY_STATE_PROPERTIES:
+                value = _get_ax_value(ax_property, 'value')
+                if value not in (None, False, 'false'):
+                    properties[ax_property['name']] = value
+        name = ' '.join(str(_get_ax_value(ax_node, 'name') or '').split())[:max_name_length]
+        value = _get_ax_value(ax_node, 'value')
+        if value is not None:
+            value = ' '.join(str(value).split())[:max_name_length] or None
+        return [ax_node.get('backendDOMNodeId'), _get_ax_value(ax_node, 'role'), name, value, properties, children]
+
+    return _build(ax_nodes[0])
+
+
+def _prune_accessibility_tree(node: list, parent_name: str = None) -> List[Mapping[str, Any]]:
+    """
+    Converts a raw `[id, role, name, value, properties, children]` tree into nodes as of
+    `get_accessibility_snapshot`, replacing unnamed grouping nodes by their children, and dropping
+    text nodes that only repeat part of an ancestor's name; returns the nodes to put under the parent.
+
+    Examples:
+        >>> _prune_accessibility_tree(
+        ...     [1, 'generic', '', None, {}, [
+        ...         [2, 'link', 'Home page', None, {}, [[None, 'StaticText', 'Home', None, {}, []]]],
+        ...         [3, 'textbox', 'From', 'SEA', {'focused': True}, []]
+        ...     ]]
+        ... )
+        [{'id': 2, 'role': 'link', 'name': 'Home page'}, {'id': 3, 'role': 'textbox', 'name': 'From', 'value': 'SEA', 'properties': {'focused': True}}]
+    """
+    node_id, role, name, value, properties, children = node
+    if role in ACCESSIBILITY_DROPPED_ROLES or (role == 'StaticText' and (not name or (parent_name and name in parent_name))):
+        return []
+    pruned_children = []
+    for child in children:
+        pruned_children.extend(_prune_accessibility_tree(child, parent_name=name or parent_name))
+    if (role is None or role in ACCESSIBILITY_GROUPING_ROLES) and not name:
+        return pruned_children
+
+    pruned_node = {'id': node_id, 'role': role, 'name': name}
+    if value:
+        pruned_node['value'] = value
+    if properties:
+        pruned_node['properties'] = properties
+    if pruned_children:
+        pruned_node['children'] = pruned_children
+    return [pruned_node]
+
+
+def get_accessibility_snapshot(
+        driver: WebDriver,
+        source: Union[str, AccessibilitySnapshotSources] = None,
+        max_name_length: int = 80
+) -> Mapping[str, Any]:
+    """
+    Takes a compact snapshot of the accessibility tree of the page, as an alternative observation to the body HTML
+    that leaves out the layout elements and styling.
+
+    With the CDP source, the tree is the browser's own (`Accessibility.getFullAXTree`, Chrome-based drivers only),
+    and node ids are DevTools backend node ids. With the page source, the tree is approximated by one DOM walk inside
+    the page from the explicit and implicit ARIA roles and names, and node ids are the element indexes
+    of `index_interactive_elements`. Either way, `find_element_by_accessibility_node_id` maps a node id back to
+    the live element. Unnamed grouping nodes are replaced by their children, and text nodes repeating (part of)
+    the name of an ancestor are dropped.
+
+    Args:
+        driver: The Selenium WebDriver instance.
+        source: The source of the tree; the CDP source if the driver supports DevTools commands, otherwise the page source.
+        max_name_length: The maximum length of node names and values.
+
+    Returns:
+        A mapping with 'source' and 'root', the root node; each node has 'id', 'role' and 'name', and optionally
+        'value', 'properties' (states such as 'checked', 'expanded' or 'focused') and 'children'.
+
+    Examples:
+        >>> get_accessibility_snapshot(driver)  # doctest: +SKIP
+        {'source': 'cdp', 'root': {'id': 1, 'role': 'RootWebArea', 'name': 'Flights', 'children': [{'id': 15, 'role': 'link', 'name': 'Home'}, ...]}}
+    """
+    if source is None:
+        source = AccessibilitySnapshotSources.CDP if hasattr(driver, 'execute_cdp_cmd') else AccessibilitySnapshotSources.PAGE
+    else:
+        source = AccessibilitySnapshotSources(source)
+
+    if source == AccessibilitySnapshotSources.CDP:
+        tree = _get_cdp_accessibility_tree(driver, max_name_length=max_name_length)
+    else:
+        tree = driver.execute_script(
+            GET_ACCESSIBILITY_TREE_SCRIPT,
+            DEFAULT_ELEMENT_INDEX_ATTRIBUTE,
+            max_name_length,
+            list(ACCESSIBILITY_STATE_PROPERTIES)
+        )
+
+    # the root is kept even if it is a grouping node without a name
+    node_id, role, name, value, properties, children = tree
+    root = {'id': node_id, 'role': role, 'name': name}
+    pruned_children = []
+    for child in children:
+        pruned_children.extend(_prune_accessibility_tree(child, parent_name=name))
+    if pruned_children:
+        root['children'] = pruned_children
+    return {'source': source.value, 'root': root}
+
+
+def format_accessibility_snapshot(snapshot: Mapping[str, Any], indent: str = '  ') -> str:
+    """
+    Formats a snapshot from `get_accessibility_snapshot` as compact indented text, one node per line.
+
+    Examples:
+        >>> print(format_accessibility_snapshot({'source': 'page', 'root': {
+        ...     'id': None, 'role': 'RootWebArea', 'name': 'Flights', 'children': [
+        ...         {'id': 0, 'role': 'link', 'name': 'Home'},
+        ...         {'id': 1, 'role': 'textbox', 'name': 'From', 'value': 'SEA', 'properties': {'focused': True}},
+        ...         {'id': None, 'role': 'StaticText', 'name': 'Round trip'}
+        ...     ]
+        ... }}))
+        RootWebArea "Flights"
+          [0] link "Home"
+          [1] textbox "From" value="SEA" focused
+          StaticText "Round trip"
+    """
+    lines = []
+
+    def _format(node, depth):
+        parts = [] if node['id'] is None else [f"[{node['id']}]"]
+        parts.append(node['role'])
+        if node['name']:
+            parts.append(f'"{node["name"]}"')
+        if node.get('value'):
+            parts.append(f'value="{node["value"]}"')
+        for name, value in node.get('properties', {}).items():
+            parts.append(name if value is True else f'{name}={value}')
+        lines.append(indent * depth + ' '.join(parts))
+        for child in node.get('children', ()):
+            _format(child, depth + 1)
+
+    _format(snapshot['root'], 0)
+    return '\n'.join(lines)
+
+
+def find_element_by_accessibility_node_id(
+        driver: WebDriver,
+        node_id: int,
+        source: Union[str, AccessibilitySnapshotSources]
+) -> Optional[WebElement]:
+    """
+    Finds the live element of a node in a snapshot from `get_accessibility_snapshot` taken from `source`;
+    returns None if the element is no longer in the page.
+
+    A node id from the page source is an element index. A DevTools backend node id is resolved to its element
+    (the parent element of a text node, or the root element of the document node), which is then tagged with
+    an element index, so the returned element can also be targeted as 'index:<index>' afterwards.
+    """
+    from selenium.common import WebDriverException
+
+    if AccessibilitySnapshotSources(source) == AccessibilitySnapshotSources.CDP:
+        try:
+            object_id = driver.execute_cdp_cmd('DOM.resolveNode', {'backendNodeId': node_id})['object']['objectId']
+            response = driver.execute_cdp_cmd('Runtime.callFunctionOn', {
+                'objectId': object_id,
+                'functionDeclaration': TAG_ELEMENT_INDEX_FUNCTION,
+                'arguments': [{'value': DEFAULT_ELEMENT_INDEX_ATTRIBUTE}],
+                'returnByValue': True
+            })
+        except WebDriverException:
+            return None
+        # the function throws (reported in 'exceptionDetails') e.g. if the node was detached meanwhile
+        if 'exceptionDetails' in response:
+            return None
+        node_id = response['result'].get('value', None)
+        if node_id is None:
+            return None
+    return find_element_by_index(driver, node_id)
@@ -1,5 +1,8 @@
 import time
-from typing import Union, Tuple
+from enum import Enum
+from typing import Union, Tuple, Mapping, Callable, Optional
+from urllib.parse import urlparse
+
 import undetected_chromedriver as uc
 from selenium import webdriver
 from selenium.common import TimeoutException
@@ -8,7 +11,7 @@ from selenium.webdriver.remote.webelement import WebElement
 import base64
 from boba_python_utils.general_utils.console_util import hprint_message
 from boba_python_utils.time_utils.common import random_sleep
-from boba_web_agent.automation.web_automatoin.selenium.common import wait_for_page_loading
+from boba_web_agent.automation.web_automatoin.selenium.common import wait_for_page_loading, wait_for_page_settle
 
 
 def send_keys_with_random_delay(element, text, min_delay=0.1, max_delay=1):
@@ -27,6 +30,146 @@ def send_keys_with_random_delay(element, text, min_delay=0.1, max_delay=1):
         random_sleep(min_delay, max_delay)
 
 
+class InputTextStrategies(str, Enum):
+    HUMANLIKE = 'humanlike'
+    SEND_KEYS = 'send_keys'
+    CDP_INSERT_TEXT = 'cdp_insert_text'
+    JS_SET_VALUE = 'js_set_value'
+
+
+def send_keys_at_once(element: WebElement, text: str):
+    """Send the whole text to an element in a single `send_keys` call."""
+    element.click()
+    element.send_keys(text)
+
+
+def insert_text_by_cdp(driver: WebDriver, element: WebElement, text: str):
+    """
+    Inserts the text into the focused element by the DevTools `Input.insertText` command,
+    which fires a single `input` event as if the text were committed by an IME.
+    Falls back to `send_keys_at_once` for drivers without DevTools protocol support.
+    """
+    if not hasattr(driver, 'execute_cdp_cmd'):
+        send_keys_at_once(element, text)
+        return
+    element.click()
+    driver.execute_cdp_cmd('Input.insertText', {'text': text})
+
+
+SET_VALUE_SCRIPT = """
+    var element = arguments[0];
+    var text = arguments[1];
+    element.focus();
+    var prototype = Object.getPrototypeOf(element);
+    var descriptor = Object.getOwnPropertyDescriptor(prototype, 'value');
+    if (descriptor && descriptor.set) {
+        // calls the native setter so that frameworks tracking the value property (e.g. React) see the change
+        descriptor.set.call(element, text);
+    } else if (element.isContentEditable) {
+        element.textContent = text;
+    } else {
+        element.value = text;
+    }
+    element.dispatchEvent(new Event('input', {bubbles: true}));
+    element.dispatchEvent(new Event('change', {bubbles: true}));
+"""
+
+
+def set_value_by_js(driver: WebDriver, element: WebElement, text: str):
+    """Sets the element's value by JavaScript and dispatches the `input` and `change` events."""
+    driver.execute_script(SET_VALUE_SCRIPT, element, text)
+
+
+class InputTextPolicy:
+    """
+    Picks the strategy for the `input_text` action per element or per domain.
+
+    The element-level rule is checked first, then the domain rules, and then the default strategy.
+    A domain rule applies to the domain itself and to all its subdomains.
+
+    Examples:
+        >>> policy = InputTextPolicy(
+        ...     default_strategy=InputTextStrategies.SEND_KEYS,
+        ...     domain_strategies={'google.com': InputTextStrategies.HUMANLIKE}
+        ... )
+        >>> policy.get_strategy_for_url('https://www.google.com/search')
+        <InputTextStrategies.HUMANLIKE: 'humanlike'>
+        >>> policy.get_strategy_for_url('https://www.expedia.com/')
+        <InputTextStrategies.SEND_KEYS: 'send_keys'>
+    """
+
+    def __init__(
+            self,
+            default_strategy: InputTextStrategies = InputTextStrategies.HUMANLIKE,
+            domain_strategies: Mapping[str, InputTextStrategies] = None,
+            element_strategy: Callable[[WebElement], Optional[InputTextStrategies]] = None
+    ):
+        """
+        Args:
+            default_strategy: The strategy used when no other rule applies.
+            domain_strategies: A mapping from domains to strategies.
+            element_strategy: A function returning the strategy for an element, or None to defer to other rules.
+        """
+        self.default_strategy = default_strategy
+        self.domain_strategies = domain_strategies or {}
+        self.element_strategy = element_strategy
+
+    def get_strategy_for_url(self, url: str) -> InputTextStrategies:
+        if self.domain_strategies:
+            hostname = urlparse(url).hostname or ''
+            for domain, strategy in self.domain_strategies.items():
+                if hostname == domain or hostname.endswith('.' + domain):
+                    return strategy
+        return self.default_strategy
+
+    def get_strategy(self, driver: WebDriver, element: WebElement) -> InputTextStrategies:
+        if self.element_strategy is not None:
+            strategy = self.element_strategy(element)
+            if strategy is not None:
+                return strategy
+        if self.domain_strategies:
+            return self.get_strategy_for_url(driver.current_url)
+        return self.default_strategy
+
+
+def input_text(
+        driver: WebDriver,
+        element: WebElement,
+        text: str,
+        strategy: InputTextStrategies = None,
+        input_text_policy: InputTextPolicy = None,
+        **kwargs
+):
+    """
+    Inputs text into an element by the specified strategy.
+
+    Args:
+        driver: The Selenium WebDriver instance.
+        element: The WebElement where text will be input.
+        text: The text to input.
+        strategy: The strategy to use; if not specified, it is picked by `input_text_policy`,
+            or falls back to `InputTextStrategies.HUMANLIKE`.
+        input_text_policy: The policy to pick the strategy when `strategy` is not specified.
+        **kwargs: Extra arguments for `send_keys_with_random_delay` in the humanlike mode, e.g. `min_delay` and `max_delay`.
+    """
+    if strategy is None:
+        strategy = (
+            InputTextStrategies.HUMANLIKE if input_text_policy is None
+            else input_text_policy.get_strategy(driver, element)
+        )
+
+    if strategy == InputTextStrategies.HUMANLIKE:
+        send_keys_with_random_delay(element, text, **kwargs)
+    elif strategy == InputTextStrategies.SEND_KEYS:
+        send_keys_at_once(element, text)
+    elif strategy == InputTextStrategies.CDP_INSERT_TEXT:
+        insert_text_by_cdp(driver, element, text)
+    elif strategy == InputTextStrategies.JS_SET_VALUE:
+        set_value_by_js(driver, element, text)
+    else:
+        raise ValueError(f"Unsupported input text strategy: {strategy}")
+
+
 def center_element_in_view(driver: WebDriver, element: WebElement) -> None:
     """
     Scrolls the given WebElement into the center of the view.
@@ -41,6 +184,31 @@ def center_element_in_view(driver: WebDriver, element: WebElement) -> None:
     """, element)
 
 
+def click_at_point(driver: WebDriver, x: float, y: float) -> None:
+    """
+    Clicks at the point in document coordinates by a pointer action, e.g. as a fallback when the target element
+    cannot be resolved (see `LayoutSnapshot` for finding points); scrolls the point into view first if needed.
+
+    Args:
+        driver (WebDriver): The Selenium WebDriver instance.
+        x (float): The horizontal document coordinate of the point.
+        y (float): The vertical document coordinate of the point.
+    """
+    from selenium.webdriver.common.actions.action_builder import ActionBuilder
+
+    viewport_x, viewport_y = driver.execute_script("""
+        var x = arguments[0], y = arguments[1];
+        if (x < window.scrollX || x >= window.scrollX + window.innerWidth
+                || y < window.scrollY || y >= window.scrollY + window.innerHeight) {
+            window.scrollTo(x - window.innerWidth / 2, y - window.innerHeight / 2);
+        }
+        return [x - window.scrollX, y - window.scrollY];
+    """, x, y)
+    action_builder = ActionBuilder(driver)
+    action_builder.pointer_action.move_to_location(int(viewport_x), int(viewport_y)).click()
+    action_builder.perform()
+
+
 def set_zoom(driver: WebDriver, percentage: Union[int, float]) -> None:
     """
     Sets the zoom level of the webpage to the specified percentage.
@@ -108,23 +276,38 @@ def zoom_out_to_fit_element(driver: WebDriver, element: WebElement, buffer: floa
     """, element, buffer, current_zoom)
 
 
-def capture_full_page_screenshot(
+def capture_full_page_screenshot_as_base64(
         driver: WebDriver,
-        output_path,
         center_element: WebElement = None,
         restore_window_size: bool = False,
         reset_zoom: bool = True,
         use_cdp_cmd_for_chrome: bool = False,
         scale_based_on_content_size: bool = True,
-        scale: float = 1.0
-):
+        scale: float = 1.0,
+        quiet_window: float = None
+) -> str:
+    """
+    Captures a screenshot of the full page, and returns the base64-encoded PNG data as sent by the browser,
+    so that decoding and writing it can be left to the caller (e.g. a background writer).
+
+    If `quiet_window` is specified, waits for the page to settle (see `wait_for_page_settle`) after resizing
+    or zooming the window, instead of sleeping for a fixed time.
+    """
+
+    def _wait(seconds):
+        if quiet_window is None:
+            time.sleep(seconds)
+            wait_for_page_loading(driver)
+        else:
+            wait_for_page_settle(driver, quiet_window=quiet_window)
+
     if scale_based_on_content_size:
         scale *= 1 / driver.execute_script("return window.devicePixelRatio")
 
     if use_cdp_cmd_for_chrome and isinstance(driver, (webdriver.Chrome, uc.Chrome)):
         total_width = driver.execute_script("return document.body.parentNode.scrollWidth")
         total_height = driver.execute_script("return document.body.parentNode.scrollHeight")
-        screenshot = base64.b64decode(driver.execute_cdp_cmd("Page.captureScreenshot", {
+        return driver.execute_cdp_cmd("Page.captureScreenshot", {
             "clip": {
                 "x": 0,
                 "y": 0,
@@ -133,35 +316,128 @@ def capture_full_page_screenshot(
                 "scale": scale
             },
             "captureBeyondViewport": True
-        })['data'])
-
-        with open(output_path, "wb") as file:
-            file.write(screenshot)
+        })['data']
     else:
         original_size = driver.get_window_size()
         total_width = driver.execute_script('return document.body.parentNode.scrollWidth')
         total_height = driver.execute_script('return document.body.parentNode.scrollHeight')
         driver.set_window_size(total_width, total_height)
-        time.sleep(3)
+        if quiet_window is None:
+            time.sleep(3)
         page_zoomed = False
         if center_element is not None:
             zoom_out_to_fit_element(driver, center_element)
             center_element_in_view(driver, center_element)
             page_zoomed = True
-        wait_for_page_loading(driver)
+        _wait(0)
 
-        screenshot = driver.get_screenshot_as_png()
-        with open(output_path, "wb") as file:
-            file.write(screenshot)
+        screenshot = driver.get_screenshot_as_base64()
 
         if page_zoomed and reset_zoom:
             set_zoom(driver, 100)
-            time.sleep(2)
-            wait_for_page_loading(driver)
+            _wait(2)
         if restore_window_size:
             driver.set_window_size(original_size['width'], original_size['height'])
-            time.sleep(2)
-            wait_for_page_loading(driver)
+            _wait(2)
+        return screenshot
+
+
+def capture_full_page_screenshot(
+        driver: WebDriver,
+        output_path,
+        center_element: WebElement = None,
+        restore_window_size: bool = False,
+        reset_zoom: bool = True,
+        use_cdp_cmd_for_chrome: bool = False,
+        scale_based_on_content_size: bool = True,
+        scale: float = 1.0,
+        quiet_window: float = None
+):
+    """
+    Captures a screenshot of the full page and saves it as a PNG file at `output_path`.
+    See `capture_full_page_screenshot_as_base64`.
+    """
+    screenshot = base64.b64decode(capture_full_page_screenshot_as_base64(
+        driver=driver,
+        center_element=center_element,
+        restore_window_size=restore_window_size,
+        reset_zoom=reset_zoom,
+        use_cdp_cmd_for_chrome=use_cdp_cmd_for_chrome,
+        scale_based_on_content_size=scale_based_on_content_size,
+        scale=scale,
+        quiet_window=quiet_window
+    ))
+    with open(output_path, "wb") as file:
+        file.write(screenshot)
+
+
+class ScreenshotModes(str, Enum):
+    FULL_PAGE = 'full_page'
+    ELEMENT = 'element'
+
+
+GET_ELEMENT_CLIP_SCRIPT = """
+    var element = arguments[0];
+    var padding = arguments[1];
+    var rect = element.getBoundingClientRect();
+    var pageWidth = document.documentElement.scrollWidth;
+    var pageHeight = document.documentElement.scrollHeight;
+    var x = Math.max(0, rect.left + window.scrollX - padding);
+    var y = Math.max(0, rect.top + window.scrollY - padding);
+    return {
+        x: x,
+        y: y,
+        width: Math.max(1, Math.min(pageWidth, rect.right + window.scrollX + padding) - x),
+        height: Math.max(1, Math.min(pageHeight, rect.bottom + window.scrollY + padding) - y)
+    };
+"""
+
+
+def get_element_screenshot_format(driver: WebDriver, image_format: str = 'png') -> str:
+    """
+    Returns the image format `capture_element_screenshot_as_base64` actually produces for `image_format`,
+    which is always 'png' for drivers without DevTools protocol support.
+    """
+    return image_format if hasattr(driver, 'execute_cdp_cmd') else 'png'
+
+
+def capture_element_screenshot_as_base64(
+        driver: WebDriver,
+        element: WebElement = None,
+        padding: int = 100,
+        image_format: str = 'png',
+        quality: int = None,
+        scale: float = 1.0
+) -> str:
+    """
+    Captures a screenshot of a padded clip around an element by the DevTools `Page.captureScreenshot` command,
+    which is much cheaper than a full-page screenshot; returns the base64-encoded image data.
+
+    If `element` is None, the current viewport is captured. For drivers without DevTools protocol support,
+    falls back to Selenium's element screenshot (PNG only, without padding; see `get_element_screenshot_format`).
+
+    Args:
+        driver: The Selenium WebDriver instance.
+        element: The element to capture.
+        padding: The padding in CSS pixels around the element's bounding rect.
+        image_format: One of 'png', 'jpeg' and 'webp'.
+        quality: The compression quality (0-100) for 'jpeg' and 'webp'.
+        scale: The scale of the captured image.
+    """
+    if not hasattr(driver, 'execute_cdp_cmd'):
+        if element is None:
+            return driver.get_screenshot_as_base64()
+        return element.screenshot_as_base64
+
+    params = {'format': image_format}
+    if quality is not None and image_format != 'png':
+        params['quality'] = quality
+    if element is not None:
+        clip = driver.execute_script(GET_ELEMENT_CLIP_SCRIPT, element, padding)
+        clip['scale'] = scale
+        params['clip'] = clip
+        params['captureBeyondViewport'] = True
+    return driver.execute_cdp_cmd('Page.captureScreenshot', params)['data']
 
 
 def open_url(
@@ -1,26 +1,229 @@
+import json
+import time
+import weakref
 from typing import List, Optional, Tuple
 
 from bs4 import BeautifulSoup
+from selenium.common import TimeoutException, WebDriverException, NoSuchWindowException, InvalidSessionIdException
 from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support.wait import WebDriverWait
 
+from boba_web_agent.automation.web_automatoin.html_parser_backends import (
+    HtmlParserBackends,
+    resolve_html_parser_backend,
+    HTML_MULTI_VALUED_ATTRIBUTES,
+    HTML_VOID_TAGS,
+    HTML_PRESERVE_WHITESPACE_TAGS
+)
+from boba_web_agent.automation.web_automatoin.html_utils import (
+    get_html_text,
+    compile_attribute_patterns,
+    DEFAULT_HTML_CLEAN_TAGS_TO_KEEP,
+    DFAULT_HTML_CLEAN_TAGS_TO_REMOVE,
+    DEFAULT_HTML_CLEAN_ATTRIBUTE_TO_KEEP
+)
+
 
 # region page loading & status
 def get_ready_state(driver: WebDriver):
     return driver.execute_script("return document.readyState")
 
 
-def wait_for_page_loading(driver: WebDriver, timeout: int = 20):
+def wait_for_page_loading(driver: WebDriver, timeout: int = 20, quiet_window: float = None) -> bool:
     """
     Wait for the page to be fully loaded.
 
     Args:
         timeout: The maximum time to wait for the page to load. Default is 30 seconds.
+        quiet_window: If specified, also waits until the page has settled, i.e. no network activity and
+            no DOM mutation for this many seconds (see `wait_for_page_settle`).
+
+    Returns:
+        False if `quiet_window` is specified and the page did not settle within the timeout; otherwise True.
     """
     WebDriverWait(driver, timeout).until(
         lambda driver: get_ready_state(driver) == "complete"
     )
+    if quiet_window is not None:
+        return wait_for_page_settle(driver, quiet_window=quiet_window, timeout=timeout)
+    return True
+
+
+# fragments of the errors drivers report when the document is replaced (e.g. by a navigation) while a script runs
+DOCUMENT_UNLOADED_ERROR_MESSAGES = (
+    'document unloaded',
+    'document was unloaded',
+    'execution context was destroyed',
+    'inspected target navigated'
+)
+
+
+def is_document_unloaded_error(error: WebDriverException) -> bool:
+    """
+    Returns True if `error` was raised because the document was unloaded while a script was running,
+    which is worth retrying in the new document; errors of a closed window or a dead session never are.
+
+    Examples:
+        >>> is_document_unloaded_error(WebDriverException('javascript error: document unloaded while waiting for result'))
+        True
+        >>> is_document_unloaded_error(WebDriverException("javascript error: SyntaxError: Failed to execute 'evaluate'"))
+        False
+        >>> is_document_unloaded_error(NoSuchWindowException('no such window: target window already closed'))
+        False
+    """
+    if isinstance(error, (NoSuchWindowException, InvalidSessionIdException)):
+        return False
+    message = (error.msg or '').lower()
+    return any(fragment in message for fragment in DOCUMENT_UNLOADED_ERROR_MESSAGES)
+
+
+PAGE_SETTLE_SCRIPT = """
+    var restart = arguments[0];
+    var quietWindow = arguments[1];
+    var timeout = arguments[2];
+    var callback = arguments[arguments.length - 1];
+
+    var tracker = window.__bobaSettleTracker;
+    if (!tracker) {
+        tracker = window.__bobaSettleTracker = {lastActivity: performance.now(), inflight: 0};
+        var touch = function () {
+            tracker.lastActivity = performance.now();
+        };
+        var done = function () {
+            tracker.inflight--;
+            touch();
+        };
+        // style and class churn of CSS/JS animations never stops, so it does not count as activity
+        new MutationObserver(function (records) {
+            for (var i = 0; i < records.length; i++) {
+                var name = records[i].attributeName;
+                if (records[i].type !== 'attributes' || (name !== 'style' && name !== 'class')) {
+                    touch();
+                    return;
+                }
+            }
+        }).observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+        if (window.PerformanceObserver) {
+            try {
+                new PerformanceObserver(touch).observe({type: 'resource'});
+            } catch (e) {
+            }
+        }
+        if (window.fetch) {
+            var originalFetch = window.fetch;
+            window.fetch = function () {
+                tracker.inflight++;
+                touch();
+                return originalFetch.apply(this, arguments).finally(done);
+            };
+        }
+        var originalSend = XMLHttpRequest.prototype.send;
+        XMLHttpRequest.prototype.send = function () {
+            tracker.inflight++;
+            touch();
+            this.addEventListener('loadend', done);
+            return originalSend.apply(this, arguments);
+        };
+    } else if (restart) {
+        tracker.lastActivity = performance.now();
+    }
+
+    var deadline = performance.now() + timeout;
+    (function check() {
+        var now = performance.now();
+        var quietFor = now - tracker.lastActivity;
+        if (tracker.inflight <= 0 && quietFor >= quietWindow && document.readyState === 'complete') {
+            callback(true);
+        } else if (now >= deadline) {
+            callback(false);
+        } else {
+            setTimeout(check, Math.max(10, Math.min(50, quietWindow - quietFor)));
+        }
+    })();
+"""
+
+_inflight_network_requests = weakref.WeakKeyDictionary()
+
+
+def get_inflight_network_request_count(driver: WebDriver) -> Optional[int]:
+    """
+    Counts the network requests in flight according to the DevTools `Network` events in the performance log.
+
+    The performance log is only available for Chrome-based drivers created with
+    `get_driver(..., enable_network_tracking=True)`; for other drivers None is returned.
+    Log entries are consumed on each read, so the set of in-flight request ids is kept per driver. The set is cleared
+    when the main frame navigates, so that a request whose end was never logged (e.g. cancelled by the navigation)
+    is not counted for the life of the driver.
+    """
+    try:
+        log_entries = driver.get_log('performance')
+    except (AttributeError, WebDriverException):
+        return None
+
+    inflight_request_ids = _inflight_network_requests.setdefault(driver, set())
+    for log_entry in log_entries:
+        message = json.loads(log_entry['message'])['message']
+        method = message.get('method', None)
+        if method == 'Network.requestWillBeSent':
+            inflight_request_ids.add(message['params']['requestId'])
+        elif method == 'Network.loadingFinished' or method == 'Network.loadingFailed':
+            inflight_request_ids.discard(message['params']['requestId'])
+        elif method == 'Page.frameNavigated' and not message['params']['frame'].get('parentId', None):
+            # the requests of the previous document are gone with it
+            inflight_request_ids.clear()
+    return len(inflight_request_ids)
+
+
+def wait_for_page_settle(
+        driver: WebDriver,
+        quiet_window: float = 0.5,
+        timeout: float = 20,
+        max_inflight_requests: int = 0
+) -> bool:
+    """
+    Waits until the page has been quiet for `quiet_window` seconds, and returns as soon as it has.
+
+    The page is considered quiet when there is no DOM mutation (observed by a page-side MutationObserver;
+    changes of only `style` and `class` attributes, as made by animations, are ignored), no resource loading,
+    and no fetch/XHR request in flight. For Chrome-based drivers with network tracking enabled, in-flight requests
+    reported by the DevTools protocol are also checked, so that requests not visible to the page (e.g. from workers)
+    are waited for.
+
+    Args:
+        driver: The Selenium WebDriver instance.
+        quiet_window: The number of seconds without any page activity for the page to be considered settled.
+        timeout: The maximum time in seconds to wait.
+        max_inflight_requests: The number of DevTools-reported in-flight requests to tolerate, e.g. for
+            long-polling connections that never finish.
+
+    Returns:
+        True if the page settled within the timeout; otherwise False.
+    """
+    deadline = time.monotonic() + timeout
+    restart = False
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        try:
+            settled = driver.execute_async_script(PAGE_SETTLE_SCRIPT, restart, quiet_window * 1000, remaining * 1000)
+        except TimeoutException:
+            # exceeds the driver's script timeout; keep waiting until our own deadline
+            continue
+        except WebDriverException as error:
+            # the document was replaced (e.g. navigation) while waiting; the tracker will be re-installed
+            if is_document_unloaded_error(error):
+                continue
+            raise
+        if not settled:
+            return False
+
+        inflight_request_count = get_inflight_network_request_count(driver)
+        if inflight_request_count is None or inflight_request_count <= max_inflight_requests:
+            return True
+        # the network is still busy; requires another full quiet window
+        restart = True
 
 
 # endregion
@@ -55,6 +258,375 @@ def get_body_html(driver: WebDriver, return_dynamic_contents: bool = True) -> st
     )
 
 
+CLEAN_HTML_SCRIPT = r"""
+    var root = arguments[0] || document.body;
+    var tagsToKeep = new Set(arguments[1]);
+    var tagsToRemove = new Set(arguments[2]);
+    var attributePatterns = arguments[3];
+    var keepElementsWithImmediateText = arguments[4];
+    var indexName = arguments[5];
+    var multiValuedAttributes = {};
+    var multiValuedAttributeLists = arguments[6];
+    Object.keys(multiValuedAttributeLists).forEach(function (tag) {
+        multiValuedAttributes[tag] = new Set(multiValuedAttributeLists[tag]);
+    });
+    var voidTags = new Set(arguments[7]);
+    var preserveWhitespaceTags = new Set(arguments[8]);
+    // optional callbacks (only from other page scripts): the index of an element in place of its position
+    // (given as the second argument), and a notification for each element rendered in the output
+    var getElementIndex = arguments[9];
+    var onRenderElement = arguments[10];
+
+    // whitespace as of Python's `str.strip`, and as of BeautifulSoup's whitespace-only strings
+    var NON_WHITESPACE = /[^\t\n\v\f\r\x1c-\x20\x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]/;
+    var ASCII_SPACES_ONLY = /^[\x20\n\t\f\r]*$/;
+    // the serializer adds a newline to these elements if their text starts with one, which `html.parser` keeps
+    var NEWLINE_DOUBLING_TAGS = new Set(['pre', 'textarea', 'listing']);
+    // the serializer outputs the text of these elements as is, which `html.parser` parses as markup
+    var RAW_TEXT_MARKUP_TAGS = new Set(['noscript', 'iframe', 'noembed', 'noframes', 'xmp']);
+
+    function matchesPattern(name, pattern) {
+        var first = pattern.charAt(0);
+        if (first === '!') return !matchesPattern(name, pattern.substring(1));
+        if (first === '^') return name.startsWith(pattern.substring(1));
+        if (first === '$') return name.endsWith(pattern.substring(1));
+        if (first === '*') return name.indexOf(pattern.substring(1)) !== -1;
+        return name === pattern;
+    }
+
+    var attributeVerdicts = {};
+    function isAttributeKept(name) {
+        var verdict = attributeVerdicts[name];
+        if (verdict === undefined) {
+            verdict = attributeVerdicts[name] = (
+                name === indexName
+                || attributePatterns === '*'
+                || attributePatterns.some(function (pattern) { return matchesPattern(name, pattern); })
+            );
+        }
+        return verdict;
+    }
+
+    function escapeText(text) {
+        return text.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+    }
+
+    function quoteAttributeValue(value) {
+        value = escapeText(value);
+        if (value.indexOf('"') !== -1) {
+            if (value.indexOf("'") !== -1) return '"' + value.replace(/"/g, '&quot;') + '"';
+            return "'" + value + "'";
+        }
+        return '"' + value + '"';
+    }
+
+    function isMultiValued(tag, name) {
+        return (multiValuedAttributes['*'] && multiValuedAttributes['*'].has(name))
+            || (multiValuedAttributes[tag] && multiValuedAttributes[tag].has(name));
+    }
+
+    function renderStartTag(element) {
+        var names = Object.keys(element.attrs).filter(isAttributeKept).sort();
+        var rendered = '<' + element.name;
+        for (var i = 0; i < names.length; i++) {
+            var value = element.attrs[names[i]];
+            if (isMultiValued(element.name, names[i])) value = value.split(/[\t\n\f\r ]+/).filter(Boolean).join(' ');
+            rendered += ' ' + names[i] + '=' + quoteAttributeValue(value);
+        }
+        return rendered + (voidTags.has(element.name) ? '/>' : '>');
+    }
+
+    function getChildNodes(node) {
+        var name = node.localName.toLowerCase();
+        if (name === 'template' && node.content) return node.content.childNodes;
+        if (RAW_TEXT_MARKUP_TAGS.has(name) && node.childNodes.length && !node.children.length) {
+            var template = document.createElement('template');
+            template.innerHTML = node.textContent;
+            return template.content.childNodes;
+        }
+        return node.childNodes;
+    }
+
+    function countElements(node) {
+        var count = 0;
+        var children = getChildNodes(node);
+        for (var i = 0; i < children.length; i++) {
+            if (children[i].nodeType === 1) count += 1 + countElements(children[i]);
+        }
+        return count;
+    }
+
+    // the same single pass as `_HtmlCleaner` of `html_utils`; see `clean_html_streaming`
+    var pieces = [];
+    var stack = [];
+    var preserveWhitespaceDepth = 0;
+    var index = 0;
+
+    function addString(text, isComment) {
+        if (!preserveWhitespaceDepth && ASCII_SPACES_ONLY.test(text)) {
+            text = text.indexOf('\n') !== -1 ? '\n' : ' ';
+        }
+        var parent = stack.length ? stack[stack.length - 1] : null;
+        var rendered = isComment ? '<!--' + text + '-->' : (
+            parent !== null && (parent.name === 'script' || parent.name === 'style') ? text : escapeText(text)
+        );
+        if (parent === null || parent.kept) {
+            pieces.push(rendered);
+            return;
+        }
+        var hasText = NON_WHITESPACE.test(text);
+        if (keepElementsWithImmediateText) {
+            parent.hasText = parent.hasText || hasText;
+            pieces.push(rendered);
+            return;
+        }
+        if (hasText && !parent.hasText) {
+            parent.hasText = true;
+            (parent.removableTextSlots || []).forEach(function (slot) { pieces[slot] = ''; });
+            parent.removableTextSlots = null;
+        }
+        // mirrors `remove_immediate_text`, which skips the child right after each extracted string
+        if (parent.skipNextChild) {
+            parent.skipNextChild = false;
+            pieces.push(rendered);
+            return;
+        }
+        parent.skipNextChild = true;
+        if (parent.hasText) return;
+        (parent.removableTextSlots = parent.removableTextSlots || []).push(pieces.length);
+        pieces.push(rendered);
+    }
+
+    function walk(node) {
+        var name = node.localName.toLowerCase();
+        var elementIndex = index++;
+        if (tagsToRemove.has(name)) {
+            index += countElements(node);
+            return;
+        }
+        var attrs = {};
+        for (var i = 0; i < node.attributes.length; i++) {
+            attrs[node.attributes[i].name.toLowerCase()] = node.attributes[i].value;
+        }
+        if (indexName) attrs[indexName] = getElementIndex ? getElementIndex(node, elementIndex) : String(elementIndex);
+
+        var parent = stack.length ? stack[stack.length - 1] : null;
+        if (parent !== null) parent.skipNextChild = false;
+        var element = {
+            name: name, attrs: attrs, kept: tagsToKeep.has(name), hasText: false,
+            startSlot: pieces.length, skipNextChild: false, removableTextSlots: null
+        };
+        pieces.push('');
+        stack.push(element);
+        if (preserveWhitespaceTags.has(name)) preserveWhitespaceDepth++;
+
+        var children = getChildNodes(node);
+        var text = null;
+        for (var j = 0; j < children.length; j++) {
+            var child = children[j];
+            if (child.nodeType === 3 || child.nodeType === 4) {
+                if (j === 0 && NEWLINE_DOUBLING_TAGS.has(name) && child.data.charAt(0) === '\n') {
+                    text = '\n' + child.data;
+                } else {
+                    text = text === null ? child.data : text + child.data;
+                }
+                continue;
+            }
+            if (text !== null) {
+                addString(text, false);
+                text = null;
+            }
+            if (child.nodeType === 1) walk(child);
+            else if (child.nodeType === 8) addString(child.data, true);
+        }
+        if (text !== null) addString(text, false);
+
+        if (preserveWhitespaceTags.has(name)) preserveWhitespaceDepth--;
+        stack.pop();
+        if (element.kept || (element.hasText && keepElementsWithImmediateText)) {
+            pieces[element.startSlot] = renderStartTag(element);
+            if (!voidTags.has(name)) pieces.push('</' + name + '>');
+            if (onRenderElement) onRenderElement(node);
+        }
+    }
+
+    walk(root);
+    return pieces.join('');
+"""
+
+
+def get_clean_html_script_arguments(
+        tags_to_keep=DEFAULT_HTML_CLEAN_TAGS_TO_KEEP,
+        tags_to_remove=DFAULT_HTML_CLEAN_TAGS_TO_REMOVE,
+        attributes_to_keep=DEFAULT_HTML_CLEAN_ATTRIBUTE_TO_KEEP,
+        keep_elements_with_immediate_text: bool = True,
+        index_name: str = None
+) -> list:
+    """
+    Returns the arguments of `CLEAN_HTML_SCRIPT` after the element to clean, i.e. `arguments[1:]` of the script.
+
+    Examples:
+        >>> get_clean_html_script_arguments(tags_to_keep=('a',), tags_to_remove=('script',), attributes_to_keep=('href',))[:4]
+        [['a'], ['script'], ['href'], True]
+    """
+    attributes_to_keep = compile_attribute_patterns(attributes_to_keep)
+    return [
+        list(tags_to_keep),
+        list(tags_to_remove),
+        '*' if attributes_to_keep.match_all else list(attributes_to_keep.patterns),
+        keep_elements_with_immediate_text,
+        index_name,
+        {tag: sorted(attributes) for tag, attributes in HTML_MULTI_VALUED_ATTRIBUTES.items()},
+        sorted(HTML_VOID_TAGS),
+        sorted(HTML_PRESERVE_WHITESPACE_TAGS)
+    ]
+
+
+# `CLEAN_HTML_SCRIPT` wrapped as a function and applied with the position index of each element kept;
+# the rendered elements all of whose boxes (and those of their rendered descendants) lie outside the viewport
+# are returned by their indexes, outermost ones only.
+GET_CLEAN_HTML_WITH_OFFSCREEN_INDEXES_SCRIPT = r"""
+var cleanArguments = Array.prototype.slice.call(arguments, 1);
+
+var cleanHtml = function () {
+""" + CLEAN_HTML_SCRIPT + r"""
+};
+
+var indexes = new Map();
+var renderedNodes = [];
+
+function getElementIndex(node, position) {
+    var index = String(position);
+    indexes.set(node, index);
+    return index;
+}
+
+function onRenderElement(node) {
+    renderedNodes.push(node);
+}
+
+var html = cleanHtml.apply(null, [arguments[0]].concat(cleanArguments, [getElementIndex, onRenderElement]));
+
+var viewportWidth = window.innerWidth || document.documentElement.clientWidth;
+var viewportHeight = window.innerHeight || document.documentElement.clientHeight;
+
+// true if any box of the element intersects the viewport, false if none does, and null if the element has no box
+// (e.g. it is hidden, or in a template), i.e. it neither keeps its ancestors nor is dropped by itself
+function isOnscreen(node) {
+    var rects = node.getClientRects ? node.getClientRects() : [];
+    if (!rects.length) return null;
+    for (var i = 0; i < rects.length; i++) {
+        var rect = rects[i];
+        if (rect.bottom > 0 && rect.right > 0 && rect.top < viewportHeight && rect.left < viewportWidth) return true;
+    }
+    return false;
+}
+
+// the ancestors of on-screen elements are kept, e.g. an off-screen container of a fixed header
+var offscreenNodes = [];
+var containsOnscreen = new Set();
+renderedNodes.forEach(function (node) {
+    var onscreen = isOnscreen(node);
+    if (onscreen === false) offscreenNodes.push(node);
+    if (!onscreen) return;
+    for (var ancestor = node.parentNode; ancestor && !containsOnscreen.has(ancestor); ancestor = ancestor.parentNode) {
+        containsOnscreen.add(ancestor);
+    }
+});
+var droppedNodes = new Set(offscreenNodes.filter(function (node) { return !containsOnscreen.has(node); }));
+
+var offscreenIndexes = [];
+droppedNodes.forEach(function (node) {
+    for (var ancestor = node.parentNode; ancestor; ancestor = ancestor.parentNode) {
+        if (droppedNodes.has(ancestor)) return;
+    }
+    offscreenIndexes.push(indexes.get(node));
+});
+return {html: html, offscreenIndexes: offscreenIndexes};
+"""
+
+
+def get_clean_body_html(
+        driver: WebDriver,
+        tags_to_keep=DEFAULT_HTML_CLEAN_TAGS_TO_KEEP,
+        tags_to_remove=DFAULT_HTML_CLEAN_TAGS_TO_REMOVE,
+        attributes_to_keep=DEFAULT_HTML_CLEAN_ATTRIBUTE_TO_KEEP,
+        keep_elements_with_immediate_text: bool = True,
+        index_name: str = None,
+        element: WebElement = None
+) -> str:
+    """
+    Cleans the body HTML (or the HTML of `element`) inside the page by `CLEAN_HTML_SCRIPT` in one `execute_script`,
+    so that only the cleaned HTML, instead of the whole `outerHTML`, is sent over the WebDriver connection.
+
+    The result is the same as `clean_html(get_body_html(driver), ...)` with the same arguments; with `index_name`,
+    it is the same as first adding the index by `add_unique_index_to_html` (the index attribute is always kept),
+    so the indexes refer to the elements of `get_body_html(driver)`. Attribute patterns are matched in the page
+    by the `string_check` forms of exact name, '^' prefix, '$' suffix, '*' substring and '!' negation.
+
+    Args:
+        driver: The Selenium WebDriver instance.
+        tags_to_keep: See `clean_html`.
+        tags_to_remove: See `clean_html`.
+        attributes_to_keep: See `clean_html`.
+        keep_elements_with_immediate_text: See `clean_html`.
+        index_name: The name of the index attribute to add to each element; no index if not specified.
+        element: The element to clean instead of the body.
+
+    Examples:
+        >>> get_clean_body_html(driver, index_name='__index__')  # doctest: +SKIP
+        '<body __index__="0"><a __index__="3" href="/flights">Flights</a>...</body>'
+    """
+    return driver.execute_script(
+        CLEAN_HTML_SCRIPT,
+        element,
+        *get_clean_html_script_arguments(
+            tags_to_keep=tags_to_keep,
+            tags_to_remove=tags_to_remove,
+            attributes_to_keep=attributes_to_keep,
+            keep_elements_with_immediate_text=keep_elements_with_immediate_text,
+            index_name=index_name
+        )
+    )
+
+
+def get_clean_body_html_with_offscreen_indexes(
+        driver: WebDriver,
+        tags_to_keep=DEFAULT_HTML_CLEAN_TAGS_TO_KEEP,
+        tags_to_remove=DFAULT_HTML_CLEAN_TAGS_TO_REMOVE,
+        attributes_to_keep=DEFAULT_HTML_CLEAN_ATTRIBUTE_TO_KEEP,
+        keep_elements_with_immediate_text: bool = True,
+        index_name: str = '__index__',
+        element: WebElement = None
+) -> Tuple[str, List[str]]:
+    """
+    Cleans the body HTML with the index attribute `index_name` like `get_clean_body_html`, and in the same
+    `execute_script` finds the elements of the cleaned HTML that are off-screen, i.e. all of their boxes and those of
+    their descendants lie outside the viewport. Only the outermost ones are returned, by their indexes in the
+    cleaned HTML, e.g. as the `offscreen_indexes` of `build_html_observation`.
+
+    Returns:
+        The cleaned HTML, and the indexes of the off-screen elements in it.
+
+    Examples:
+        >>> html, offscreen_indexes = get_clean_body_html_with_offscreen_indexes(driver)  # doctest: +SKIP
+        >>> offscreen_indexes  # doctest: +SKIP
+        ['85', '112']
+    """
+    result = driver.execute_script(
+        GET_CLEAN_HTML_WITH_OFFSCREEN_INDEXES_SCRIPT,
+        element,
+        *get_clean_html_script_arguments(
+            tags_to_keep=tags_to_keep,
+            tags_to_remove=tags_to_remove,
+            attributes_to_keep=attributes_to_keep,
+            keep_elements_with_immediate_text=keep_elements_with_immediate_text,
+            index_name=index_name
+        )
+    )
+    return result['html'], result['offscreenIndexes']
+
+
 def get_body_html_from_url(
         driver: WebDriver,
         url: str = None,
@@ -83,7 +655,8 @@ def get_text(
         timeout_for_page_loading: int = 20,
         id_class_keywords_match_to_remove: List[str] = None,
         id_class_keywords_match_to_keep: List[str] = None,
-        return_dynamic_contents: bool = True
+        return_dynamic_contents: bool = True,
+        parser_backend=None
 ):
     html = get_body_html_from_url(
         driver=driver,
@@ -92,7 +665,6 @@ def get_text(
         timeout_for_page_loading=timeout_for_page_loading,
         return_dynamic_contents=return_dynamic_contents
     )
-    soup = BeautifulSoup(html, 'html.parser')
 
     def _filter(value):
         return (
@@ -108,6 +680,19 @@ def get_text(
                 )
         )
 
+    parser_backend = resolve_html_parser_backend(parser_backend)
+    if parser_backend != HtmlParserBackends.HTML_PARSER:
+        def _skip_element(name, attrs):
+            class_names = attrs.get('class', '').split()
+            return (
+                    _filter(attrs.get('id', None))
+                    or any(_filter(class_name) for class_name in class_names)
+                    or _filter(' '.join(class_names))
+            )
+
+        return get_html_text(html, _skip_element, parser_backend=parser_backend)
+
+    soup = BeautifulSoup(html, 'html.parser')
     for element in soup.find_all(id=_filter):
         element.decompose()
     for element in soup.find_all(class_=_filter):
@@ -1,9 +1,20 @@
-from typing import Union, Sequence
+import time
+from typing import Union, Sequence, Mapping, Any, List, Tuple, Callable
 
 from selenium.webdriver.chrome.webdriver import WebDriver
 
 from boba_python_utils.common_utils import iter__, iter_
-from boba_web_agent.automation.web_automatoin.selenium.element_selection import find_element, find_elements
+from boba_web_agent.automation.web_automatoin.selenium.common import wait_for_page_loading, is_document_unloaded_error
+from boba_web_agent.automation.web_automatoin.selenium.element_selection import (
+    find_element,
+    find_elements,
+    compile_target,
+    get_find_element_by_html_script_arguments,
+    HtmlMatchingEngines,
+    TargetTypes,
+    FIND_ELEMENT_BY_HTML_SCRIPT
+)
+from boba_web_agent.automation.web_automatoin.selenium.element_index import QUERY_SELECTOR_ALL_DEEP_FUNCTION
 from boba_web_agent.automation.web_automatoin.selenium.types import ElementDict, ElementConditions
 
 
@@ -21,8 +32,8 @@ def _check_existence_search_single_element(
             return False
     if not_exists:
         if any(
-                find_element(driver, target=exists_target, elements_dict=elements_dict) is not None
-                for exists_target in iter__(exists)
+                find_element(driver, target=not_exists_target, elements_dict=elements_dict) is not None
+                for not_exists_target in iter__(not_exists)
         ):
             return False
     return True
@@ -49,10 +60,10 @@ def _check_existence_search_multiple_elements(
         if any(
                 bool(find_elements(
                     driver=driver,
-                    target=exists_target,
+                    target=not_exists_target,
                     explicit_multiple_elements=explicit_multiple_elements,
                     elements_dict=elements_dict
-                )) for exists_target in iter__(exists)
+                )) for not_exists_target in iter__(not_exists)
         ):
             return False
     return True
@@ -74,7 +85,7 @@ def _check_element(
 
             for _condition_target in iter__(condition_target):
                 element = find_element(driver, target=_condition_target, elements_dict=elements_dict)
-                if element is not None and getattr(element, f'is_{condition_name}')(element) == reverse:
+                if element is not None and getattr(element, f'is_{condition_name}')() == reverse:
                     return False
 
     return _check_existence_search_single_element(
@@ -153,3 +164,448 @@ def check_elements(
         _check_elements(driver=driver, elements_dict=elements_dict, **condition)
         for condition in iter_(conditions)
     )
+
+
+# region page-side condition evaluation
+
+# Defines `evaluateClauses`, which evaluates compiled conditions (see `compile_element_conditions`) inside the page
+# and returns the result and per-clause diagnostics; `FIND_ELEMENT_BY_HTML_SCRIPT` is wrapped as a function
+# to resolve HTML targets, and index targets are also looked up in open shadow roots by `querySelectorAllDeep`.
+ELEMENT_CONDITIONS_FUNCTIONS = """
+var findElementByHtml = function () {
+""" + FIND_ELEMENT_BY_HTML_SCRIPT + """
+};
+""" + QUERY_SELECTOR_ALL_DEEP_FUNCTION + r"""
+
+function evaluateXPath(xpath) {
+    var snapshot = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var elements = [];
+    for (var i = 0; i < snapshot.snapshotLength; i++) elements.push(snapshot.snapshotItem(i));
+    return elements;
+}
+
+function findElements(locator) {
+    var elements;
+    if (locator.type === 'id') {
+        elements = Array.prototype.slice.call(
+            document.querySelectorAll('[id="' + locator.value.replace(/["\\]/g, '\\$&') + '"]')
+        );
+    } else if (locator.type === 'index') {
+        elements = Array.prototype.slice.call(document.querySelectorAll(locator.value));
+        if (!elements.length) elements = querySelectorAllDeep(locator.value);
+    } else if (locator.type === 'xpath') {
+        elements = evaluateXPath(locator.value);
+    } else if (locator.type === 'elements') {
+        elements = locator.value.filter(function (element) { return element && element.isConnected; });
+    } else {
+        var result = findElementByHtml.apply(null, locator.value);
+        elements = !result ? [] : (result.winner ? [result.winner] : result.candidates);
+    }
+    return locator.single ? elements.slice(0, 1) : elements;
+}
+
+function isDisplayed(element) {
+    if (element.localName === 'input' && (element.getAttribute('type') || '').toLowerCase() === 'hidden') return false;
+    if (element.checkVisibility) return element.checkVisibility({visibilityProperty: true, opacityProperty: true});
+    var rect = element.getBoundingClientRect();
+    var style = window.getComputedStyle(element);
+    return rect.width > 0 && rect.height > 0 && style.visibility !== 'hidden' && style.display !== 'none';
+}
+
+var STATE_CHECKS = {
+    displayed: isDisplayed,
+    enabled: function (element) { return !element.matches(':disabled'); },
+    selected: function (element) { return !!(element.checked || element.selected); }
+};
+
+function evaluateClauses(clauses) {
+    var result = false;
+    var diagnostics = clauses.map(function (clause) {
+        var exists = clause.exists.map(function (locator) { return findElements(locator).length > 0; });
+        var notExists = clause.not_exists.map(function (locator) { return findElements(locator).length === 0; });
+        var states = clause.states.map(function (state) {
+            var check = STATE_CHECKS[state.name];
+            var any = state.locators.some(function (locator) { return findElements(locator).some(check); });
+            return any !== state.reverse;
+        });
+        var satisfied = [exists, notExists, states].every(function (checks) {
+            return checks.every(function (check) { return check; });
+        });
+        result = result || satisfied;
+        return {satisfied: satisfied, exists: exists, not_exists: notExists, states: states};
+    });
+    return {result: result, clauses: diagnostics};
+}
+"""
+
+EVALUATE_ELEMENT_CONDITIONS_SCRIPT = ELEMENT_CONDITIONS_FUNCTIONS + """
+return evaluateClauses(arguments[0]);
+"""
+
+# Resolves (through the callback of `execute_async_script`) as soon as the compiled conditions hold, re-evaluating
+# them on DOM mutations (coalesced into one evaluation per task) and every `arguments[2]` milliseconds for changes
+# not visible as mutations (e.g. CSS transitions), or when the `arguments[1]` milliseconds deadline passes.
+WAIT_FOR_ELEMENT_CONDITIONS_SCRIPT = ELEMENT_CONDITIONS_FUNCTIONS + """
+var clauses = arguments[0];
+var timeout = arguments[1];
+var pollInterval = arguments[2];
+var done = arguments[arguments.length - 1];
+
+var evaluation = evaluateClauses(clauses);
+if (evaluation.result) {
+    evaluation.timed_out = false;
+    done(evaluation);
+    return;
+}
+
+var finished = false, scheduled = false, observer = null, poller = null, deadline = null;
+function finish(evaluation, timedOut) {
+    if (finished) return;
+    finished = true;
+    observer.disconnect();
+    clearInterval(poller);
+    clearTimeout(deadline);
+    evaluation.timed_out = timedOut;
+    done(evaluation);
+}
+function check() {
+    scheduled = false;
+    if (finished) return;
+    var evaluation = evaluateClauses(clauses);
+    if (evaluation.result) finish(evaluation, false);
+}
+
+observer = new MutationObserver(function () {
+    if (!scheduled) {
+        scheduled = true;
+        setTimeout(check, 0);
+    }
+});
+observer.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+if (pollInterval > 0) poller = setInterval(check, pollInterval);
+deadline = setTimeout(function () {
+    var evaluation = evaluateClauses(clauses);
+    finish(evaluation, !evaluation.result);
+}, timeout);
+"""
+
+ELEMENT_STATE_CONDITIONS = ('displayed', 'enabled', 'selected')
+
+
+def _compile_element_locator(
+        target: str,
+        elements_dict: ElementDict = None,
+        single_element: bool = False,
+        identifying_attributes=('id', 'aria-label', 'class')
+) -> Mapping[str, Any]:
+    if elements_dict and target in elements_dict and not isinstance(elements_dict[target], str):
+        # the element is already resolved in a plain dict and has no selector; it is looked up by name when evaluated
+        return {'type': 'name', 'value': target, 'single': single_element}
+
+    compiled_target = compile_target(target, elements_dict)
+    if compiled_target.target_type == TargetTypes.XPATH:
+        return {'type': 'xpath', 'value': compiled_target.value, 'single': single_element}
+    elif compiled_target.target_type == TargetTypes.ID:
+        return {'type': 'id', 'value': compiled_target.value, 'single': single_element}
+    elif compiled_target.target_type == TargetTypes.INDEX:
+        return {'type': 'index', 'value': compiled_target.value, 'single': single_element}
+    else:
+        return {
+            'type': 'html',
+            'value': get_find_element_by_html_script_arguments(
+                compiled_target.value, identifying_attributes, parsed_html=compiled_target.parsed_html
+            ),
+            'target': target,
+            'single': single_element
+        }
+
+
+def compile_element_conditions(
+        conditions: ElementConditions,
+        elements_dict: ElementDict = None,
+        single_element: bool = False
+) -> List[Mapping[str, Any]]:
+    """
+    Compiles `ElementConditions` into the clauses evaluated by `EVALUATE_ELEMENT_CONDITIONS_SCRIPT`, one per condition,
+    with the semantics of `check_elements` (or with `single_element`, of `check_element`): a condition is satisfied
+    if all its 'exists' targets are found, none of its 'not_exists' targets is found, and for each state condition
+    (e.g. 'displayed' or 'not_enabled'), any (or with the 'not_' prefix, none) of the found elements is in the state.
+
+    Targets are compiled into selectors only, never into elements, so the clauses stay valid across pages.
+    An element already resolved in a plain `elements_dict` is compiled into its name, and an HTML target keeps
+    its selector; both are resolved when evaluated, the same way as action targets (see `resolve_element_locators`).
+
+    Examples:
+        >>> compile_element_conditions({'exists': '//ul[@id="results"]', 'not_displayed': 'spinner'})
+        [{'exists': [{'type': 'xpath', 'value': '//ul[@id="results"]', 'single': False}], 'not_exists': [], 'states': [{'name': 'displayed', 'reverse': True, 'locators': [{'type': 'id', 'value': 'spinner', 'single': False}]}]}]
+    """
+    clauses = []
+    for condition in iter_(conditions):
+        condition = dict(condition)
+        exists = condition.pop('exists', None)
+        not_exists = condition.pop('not_exists', None)
+        explicit_multiple_elements = condition.pop('explicit_multiple_elements', False)
+
+        def _compile(target):
+            return _compile_element_locator(
+                target,
+                elements_dict=elements_dict,
+                single_element=(single_element or (explicit_multiple_elements and target[0] != '*'))
+            )
+
+        states = []
+        for condition_name, condition_target in condition.items():
+            reverse = condition_name.startswith('not_')
+            state_name = condition_name[4:] if reverse else condition_name
+            if state_name not in ELEMENT_STATE_CONDITIONS:
+                raise ValueError(f"unsupported element condition '{condition_name}'; expected one of {ELEMENT_STATE_CONDITIONS} with an optional 'not_' prefix")
+            states.append({
+                'name': state_name,
+                'reverse': reverse,
+                'locators': [_compile(target) for target in iter__(condition_target)]
+            })
+
+        clauses.append({
+            'exists': [_compile(target) for target in iter__(exists)] if exists else [],
+            'not_exists': [_compile(target) for target in iter__(not_exists)] if not_exists else [],
+            'states': states
+        })
+    return clauses
+
+
+def _map_element_locators(
+        clauses: Sequence[Mapping[str, Any]],
+        map_locator: Callable[[Mapping[str, Any]], Mapping[str, Any]]
+) -> List[Mapping[str, Any]]:
+    return [
+        {
+            'exists': [map_locator(locator) for locator in clause['exists']],
+            'not_exists': [map_locator(locator) for locator in clause['not_exists']],
+            'states': [{**state, 'locators': [map_locator(locator) for locator in state['locators']]} for state in clause['states']]
+        }
+        for clause in clauses
+    ]
+
+
+def _is_page_html_matching(find_args: Mapping[str, Any]) -> bool:
+    """Whether HTML targets are matched by `FIND_ELEMENT_BY_HTML_SCRIPT` with the options of `find_element`."""
+    return (
+            find_args.get('matching_engine', HtmlMatchingEngines.PYTHON) == HtmlMatchingEngines.JAVASCRIPT
+            and find_args.get('selector_cache', None) is None
+    )
+
+
+def resolve_element_locators(
+        driver: WebDriver,
+        clauses: Sequence[Mapping[str, Any]],
+        elements_dict: ElementDict = None,
+        **kwargs
+) -> Tuple[Sequence[Mapping[str, Any]], bool]:
+    """
+    Resolves the locators of compiled conditions (see `compile_element_conditions`) that are not resolved inside
+    the page by the same `find_elements` as action targets, with the same `elements_dict` and options (`kwargs`,
+    e.g. `matching_engine` and `selector_cache`): element names already resolved in a plain `elements_dict`,
+    and HTML targets unless matched by the page-side JavaScript engine without a selector cache.
+
+    Returns:
+        The clauses with these locators replaced by the found elements, and whether any locator was replaced.
+    """
+    page_html_matching = _is_page_html_matching(kwargs)
+    resolved = False
+
+    def _resolve(locator):
+        nonlocal resolved
+        if locator['type'] == 'name' or (locator['type'] == 'html' and not page_html_matching):
+            resolved = True
+            elements = find_elements(
+                driver,
+                target=locator['value'] if locator['type'] == 'name' else locator['target'],
+                elements_dict=elements_dict,
+                **kwargs
+            )
+            return {'type': 'elements', 'value': list(elements or ()), 'single': locator['single']}
+        return locator
+
+    clauses = _map_element_locators(clauses, _resolve)
+    return clauses, resolved
+
+
+def _drop_stale_elements(clauses: Sequence[Mapping[str, Any]]) -> List[Mapping[str, Any]]:
+    from selenium.common import StaleElementReferenceException
+
+    def _is_attached(element) -> bool:
+        try:
+            element.tag_name
+            return True
+        except StaleElementReferenceException:
+            return False
+
+    return _map_element_locators(
+        clauses,
+        lambda locator: (
+            {**locator, 'value': [element for element in locator['value'] if _is_attached(element)]}
+            if locator['type'] == 'elements' else locator
+        )
+    )
+
+
+def _evaluate_resolved_element_conditions(driver: WebDriver, clauses: Sequence[Mapping[str, Any]], resolved: bool) -> Mapping[str, Any]:
+    from selenium.common import StaleElementReferenceException
+
+    try:
+        return driver.execute_script(EVALUATE_ELEMENT_CONDITIONS_SCRIPT, clauses)
+    except StaleElementReferenceException:
+        # a resolved element detached from the page cannot even be passed to the script
+        if not resolved:
+            raise
+        return driver.execute_script(EVALUATE_ELEMENT_CONDITIONS_SCRIPT, _drop_stale_elements(clauses))
+
+
+def evaluate_element_conditions(
+        driver: WebDriver,
+        conditions: ElementConditions,
+        elements_dict: ElementDict = None,
+        single_element: bool = False,
+        **kwargs
+) -> Mapping[str, Any]:
+    """
+    Evaluates `ElementConditions` inside the page in a single `execute_script` call, instead of one `find_element`
+    per target and one WebDriver call per element state as `check_elements` does. The targets not resolved inside
+    the page are resolved first by `resolve_element_locators`, with `kwargs` being the options of `find_element`.
+
+    Returns:
+        A mapping with 'result', True if any condition is satisfied, and 'clauses', the diagnostics per condition
+        with 'satisfied' and the results of its 'exists', 'not_exists' and state checks in order.
+
+    Examples:
+        >>> evaluate_element_conditions(driver, {'exists': 'next-page', 'enabled': 'next-page'})  # doctest: +SKIP
+        {'result': True, 'clauses': [{'satisfied': True, 'exists': [True], 'not_exists': [], 'states': [True]}]}
+    """
+    if not conditions:
+        return {'result': False, 'clauses': []}
+    return evaluate_compiled_element_conditions(
+        driver,
+        compile_element_conditions(conditions, elements_dict=elements_dict, single_element=single_element),
+        elements_dict=elements_dict,
+        **kwargs
+    )
+
+
+def evaluate_compiled_element_conditions(
+        driver: WebDriver,
+        clauses: Sequence[Mapping[str, Any]],
+        elements_dict: ElementDict = None,
+        **kwargs
+) -> Mapping[str, Any]:
+    """Same as `evaluate_element_conditions`, but with conditions already compiled by `compile_element_conditions`."""
+    if not clauses:
+        return {'result': False, 'clauses': []}
+    return _evaluate_resolved_element_conditions(
+        driver, *resolve_element_locators(driver, clauses, elements_dict=elements_dict, **kwargs)
+    )
+
+
+def wait_for_element_conditions(
+        driver: WebDriver,
+        conditions: ElementConditions,
+        timeout: float = 10,
+        elements_dict: ElementDict = None,
+        poll_interval: float = 0.25,
+        **kwargs
+) -> Mapping[str, Any]:
+    """
+    Waits until `ElementConditions` hold or `timeout` seconds pass, with one blocking `execute_async_script` call
+    that installs a MutationObserver in the page and re-evaluates the conditions (see `evaluate_element_conditions`)
+    as soon as the DOM changes, instead of polling from the client with sleeps. The conditions are also re-evaluated
+    every `poll_interval` seconds inside the page, for changes not visible as DOM mutations (e.g. CSS transitions);
+    0 disables this. If any target is resolved outside the page (see `resolve_element_locators`, with `kwargs` being
+    the options of `find_element`), the page cannot re-resolve it on DOM changes, and the conditions are instead
+    evaluated every `poll_interval` seconds (0.25 if 0) from the client.
+
+    If the page navigates away during the wait, the wait continues in the new document for the remaining time.
+
+    Returns:
+        The result of `evaluate_element_conditions` at the time the wait ended, plus 'timed_out'.
+
+    Examples:
+        >>> wait_for_element_conditions(driver, {'exists': '//ul[@id="results"]'}, timeout=20)['result']  # doctest: +SKIP
+        True
+    """
+    if not conditions:
+        return {'result': False, 'clauses': [], 'timed_out': False}
+    return wait_for_compiled_element_conditions(
+        driver,
+        compile_element_conditions(conditions, elements_dict=elements_dict),
+        timeout=timeout,
+        poll_interval=poll_interval,
+        elements_dict=elements_dict,
+        **kwargs
+    )
+
+
+def wait_for_compiled_element_conditions(
+        driver: WebDriver,
+        clauses: Sequence[Mapping[str, Any]],
+        timeout: float = 10,
+        poll_interval: float = 0.25,
+        elements_dict: ElementDict = None,
+        **kwargs
+) -> Mapping[str, Any]:
+    """Same as `wait_for_element_conditions`, but with conditions already compiled by `compile_element_conditions`."""
+    from selenium.common import WebDriverException
+
+    if not clauses:
+        return {'result': False, 'clauses': [], 'timed_out': False}
+
+    deadline = time.monotonic() + timeout
+    resolved_clauses, resolved = resolve_element_locators(driver, clauses, elements_dict=elements_dict, **kwargs)
+    if resolved:
+        while True:
+            try:
+                evaluation = _evaluate_resolved_element_conditions(driver, resolved_clauses, resolved)
+            except WebDriverException as error:
+                # the document was unloaded during the evaluation; evaluated again in the new document
+                if not is_document_unloaded_error(error) or time.monotonic() >= deadline:
+                    raise
+                wait_for_page_loading(driver)
+            else:
+                if evaluation['result'] or time.monotonic() >= deadline:
+                    evaluation['timed_out'] = not evaluation['result']
+                    return evaluation
+                time.sleep(min(poll_interval or 0.25, max(deadline - time.monotonic(), 0)))
+            resolved_clauses, resolved = resolve_element_locators(driver, clauses, elements_dict=elements_dict, **kwargs)
+
+    script_timeout = driver.timeouts.script
+    if script_timeout is not None and script_timeout < timeout + 5:
+        driver.set_script_timeout(timeout + 5)
+    try:
+        while True:
+            remaining = max(deadline - time.monotonic(), 0)
+            try:
+                return driver.execute_async_script(
+                    WAIT_FOR_ELEMENT_CONDITIONS_SCRIPT,
+                    resolved_clauses,
+                    int(remaining * 1000),
+                    int(poll_interval * 1000)
+                )
+            except WebDriverException as error:
+                # the document was unloaded before the callback was called; the wait continues in the new document,
+                # while any other error (e.g. an invalid XPath, a closed window or a dead session) is not retried
+                if not is_document_unloaded_error(error) or time.monotonic() >= deadline:
+                    raise
+                wait_for_page_loading(driver)
+    finally:
+        if script_timeout is not None and script_timeout < timeout + 5:
+            driver.set_script_timeout(script_timeout)
+
+
+def check_elements_in_page(
+        driver: WebDriver,
+        conditions: ElementConditions,
+        elements_dict: ElementDict = None,
+        **kwargs
+) -> bool:
+    """Same as `check_elements`, but evaluated inside the page in a single round trip; see `evaluate_element_conditions`."""
+    return evaluate_element_conditions(driver, conditions, elements_dict=elements_dict, **kwargs)['result']
+
+# endregion
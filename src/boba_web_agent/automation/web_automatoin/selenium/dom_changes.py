@@ -0,0 +1,234 @@
+from typing import Mapping, Any
+
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from boba_web_agent.automation.web_automatoin.html_utils import (
+    DEFAULT_HTML_CLEAN_TAGS_TO_KEEP,
+    DFAULT_HTML_CLEAN_TAGS_TO_REMOVE,
+    DEFAULT_HTML_CLEAN_ATTRIBUTE_TO_KEEP
+)
+from boba_web_agent.automation.web_automatoin.selenium.common import CLEAN_HTML_SCRIPT, get_clean_html_script_arguments
+
+DEFAULT_DOM_CHANGE_NODE_ID_ATTRIBUTE = 'data-boba-node'
+
+# Installs a MutationObserver on the first call in a document (and returns the full cleaned body for a resync);
+# on later calls, reduces the buffered mutation records to the changed subtrees and returns them cleaned.
+# `CLEAN_HTML_SCRIPT` is wrapped as a function and applied to each changed subtree; every element it renders
+# gets a node id (kept in a WeakMap, the page is not modified) in the index attribute of `arguments[0]`.
+GET_DOM_CHANGES_SCRIPT = r"""
+var cleanArguments = arguments[0];
+var maxBufferedRecords = arguments[1];
+var attributePatterns = cleanArguments[2];
+
+var cleanHtml = function () {
+""" + CLEAN_HTML_SCRIPT + r"""
+};
+
+var feed = window.__bobaDomChangeFeed;
+
+function getNodeId(node) {
+    var id = feed.ids.get(node);
+    if (id === undefined) {
+        id = String(feed.nextId++);
+        feed.ids.set(node, id);
+    }
+    // set again by `onRenderElement` if the element is still rendered
+    feed.rendered.delete(node);
+    return id;
+}
+
+function onRenderElement(node) {
+    feed.rendered.add(node);
+}
+
+function clean(element) {
+    return cleanHtml.apply(null, [element].concat(cleanArguments, [getNodeId, onRenderElement]));
+}
+
+function resync(feed) {
+    feed.records = [];
+    feed.overflow = false;
+    feed.rendered = new WeakSet();
+    return {resync: true, html: clean(document.body), changes: []};
+}
+
+if (!feed || feed.document !== document || feed.body !== document.body) {
+    if (feed) feed.observer.disconnect();
+    feed = window.__bobaDomChangeFeed = {
+        document: document, body: document.body, records: [], overflow: false,
+        ids: new WeakMap(), nextId: 0, rendered: new WeakSet()
+    };
+    feed.observer = new MutationObserver(function (records) {
+        if (feed.overflow) return;
+        Array.prototype.push.apply(feed.records, records);
+        if (feed.records.length > maxBufferedRecords) {
+            feed.records = [];
+            feed.overflow = true;
+        }
+    });
+    feed.observer.observe(document.body, {
+        childList: true, subtree: true, attributes: true, characterData: true
+    });
+    return resync(feed);
+}
+
+var records = feed.records.concat(feed.observer.takeRecords());
+if (feed.overflow || records.length > maxBufferedRecords) return resync(feed);
+feed.records = [];
+
+function matchesPattern(name, pattern) {
+    var first = pattern.charAt(0);
+    if (first === '!') return !matchesPattern(name, pattern.substring(1));
+    if (first === '^') return name.startsWith(pattern.substring(1));
+    if (first === '$') return name.endsWith(pattern.substring(1));
+    if (first === '*') return name.indexOf(pattern.substring(1)) !== -1;
+    return name === pattern;
+}
+
+function isAttributeKept(name) {
+    return attributePatterns === '*' || attributePatterns.some(function (pattern) { return matchesPattern(name, pattern); });
+}
+
+var body = document.body;
+function isInBody(node) {
+    return node.isConnected && (node === body || body.contains(node));
+}
+
+// the nearest element (or ancestor) rendered in the HTML sent so far, i.e. whose node id the receiver has;
+// undefined if there is none and the change can only be sent as a resync
+function getAnchor(node) {
+    for (; node && node.nodeType === 1; node = node === body ? null : node.parentNode) {
+        if (feed.rendered.has(node)) return node;
+    }
+}
+
+// the rendered elements to send again, the rendered elements removed (or moved), and the kept attribute changes
+var anchors = new Set(), removed = new Map(), attributeChanges = new Map(), needsResync = false;
+function addAnchor(node) {
+    if (!isInBody(node)) return;
+    var anchor = getAnchor(node);
+    if (anchor === undefined) needsResync = true;
+    else anchors.add(anchor);
+}
+records.forEach(function (record) {
+    var target = record.target;
+    if (record.type === 'childList') {
+        // removing a rendered element removes exactly its own HTML; anything else re-sends the parent
+        var resend = record.addedNodes.length > 0;
+        record.removedNodes.forEach(function (node) {
+            if (node.nodeType === 1 && feed.rendered.has(node)) removed.set(node, target);
+            else resend = true;
+        });
+        if (resend) addAnchor(target);
+    } else if (record.type === 'attributes') {
+        if (feed.rendered.has(target) && isAttributeKept(record.attributeName)) {
+            if (!attributeChanges.has(target)) attributeChanges.set(target, new Set());
+            attributeChanges.get(target).add(record.attributeName);
+        }
+    } else if (target.parentNode) {
+        addAnchor(target.parentNode);
+    }
+});
+if (needsResync) return resync(feed);
+
+// an anchor is sent only if none of its ancestors is, shallowest first
+var roots = new Set();
+function isUnderRoot(node) {
+    for (var ancestor = node; ancestor && ancestor !== body; ancestor = ancestor.parentNode) {
+        if (roots.has(ancestor)) return true;
+    }
+    return roots.has(body);
+}
+var depths = new Map();
+anchors.forEach(function (node) {
+    var depth = 0;
+    for (var ancestor = node; ancestor && ancestor !== body; ancestor = ancestor.parentNode) depth++;
+    depths.set(node, depth);
+});
+Array.from(anchors).sort(function (a, b) { return depths.get(a) - depths.get(b); }).forEach(function (node) {
+    if (!isUnderRoot(node)) roots.add(node);
+});
+
+// removals first, so that an element moved into a re-sent subtree is not located twice
+var changes = [];
+removed.forEach(function (parent, node) {
+    if (isInBody(parent) && isUnderRoot(parent)) return;
+    changes.push({type: 'removed', id: feed.ids.get(node)});
+    if (!isInBody(node)) feed.rendered.delete(node);
+});
+roots.forEach(function (node) {
+    changes.push({type: 'changed', id: feed.ids.get(node), html: clean(node)});
+});
+attributeChanges.forEach(function (names, node) {
+    if (!isInBody(node) || isUnderRoot(node) || !feed.rendered.has(node)) return;
+    var attributes = {};
+    names.forEach(function (name) { attributes[name] = node.getAttribute(name); });
+    changes.push({type: 'attributes', id: feed.ids.get(node), attributes: attributes});
+});
+
+return {resync: false, html: null, changes: changes};
+"""
+
+
+def get_body_html_changes(
+        driver: WebDriver,
+        tags_to_keep=DEFAULT_HTML_CLEAN_TAGS_TO_KEEP,
+        tags_to_remove=DFAULT_HTML_CLEAN_TAGS_TO_REMOVE,
+        attributes_to_keep=DEFAULT_HTML_CLEAN_ATTRIBUTE_TO_KEEP,
+        keep_elements_with_immediate_text: bool = True,
+        max_buffered_records: int = 5000,
+        node_id_attribute: str = DEFAULT_DOM_CHANGE_NODE_ID_ATTRIBUTE
+) -> Mapping[str, Any]:
+    """
+    Returns the changes of the body HTML since the previous call, observed by a MutationObserver injected
+    into the page, so that the cost of an observation scales with what changed rather than with the page size.
+
+    The first call in a document installs the observer and returns a resync with the whole cleaned body,
+    the same as `get_clean_body_html` with the same arguments, except that every rendered element has a node id
+    in `node_id_attribute`. A node id is stable: it stays with its element for the life of the document
+    (ids are kept in the page, not written to the DOM). A resync also happens automatically after a navigation
+    (the new document has no observer), when more than `max_buffered_records` mutation records are pending,
+    in which case re-sending the body is cheaper than the delta, and when a change is outside any element
+    rendered so far (i.e. the cleaning unwrapped all its ancestors).
+
+    Otherwise, the mutation records are reduced to non-overlapping changes, each located by the node id of an element
+    in the HTML sent so far (by the resync and the previous changes):
+        * 'changed': the element with 'id' is to be replaced by 'html', its cleaned HTML now with node ids; an added,
+          removed or changed element, or changed text, is sent as the nearest element (or ancestor) rendered so far,
+          since the cleaning unwraps or drops the others (see `clean_html`) and so they have no place to locate;
+        * 'removed': the element with 'id' was removed;
+        * 'attributes': the element with 'id' has its kept attributes (see `attributes_to_keep`) changed to the new
+          values (None for a removed attribute) in 'attributes'.
+    Elements added and removed again between two calls are not reported, nor are changes inside a reported subtree.
+    Changes of attributes not kept by `attributes_to_keep` (e.g. styles) are ignored.
+
+    Args:
+        driver: The Selenium WebDriver instance.
+        tags_to_keep: See `clean_html`.
+        tags_to_remove: See `clean_html`.
+        attributes_to_keep: See `clean_html`.
+        keep_elements_with_immediate_text: See `clean_html`.
+        max_buffered_records: The maximum number of pending mutation records before falling back to a resync.
+        node_id_attribute: The attribute to render the node id of each element in.
+
+    Returns:
+        A mapping with 'resync' (True if 'html' is the whole cleaned body), 'html' and 'changes'.
+
+    Examples:
+        >>> get_body_html_changes(driver)['html']  # doctest: +SKIP
+        '...<ul data-boba-node="12"><li data-boba-node="13">Portland</li></ul>...'
+        >>> driver.find_element(By.ID, 'from').click()  # doctest: +SKIP
+        >>> get_body_html_changes(driver)  # doctest: +SKIP
+        {'resync': False, 'html': None, 'changes': [{'type': 'changed', 'id': '12', 'html': '<ul data-boba-node="12"><li data-boba-node="13">Portland</li><li data-boba-node="57">Seattle</li></ul>'}]}
+    """
+    return driver.execute_script(
+        GET_DOM_CHANGES_SCRIPT,
+        get_clean_html_script_arguments(
+            tags_to_keep=tags_to_keep,
+            tags_to_remove=tags_to_remove,
+            attributes_to_keep=attributes_to_keep,
+            keep_elements_with_immediate_text=keep_elements_with_immediate_text,
+            index_name=node_id_attribute
+        ),
+        max_buffered_records
+    )
@@ -0,0 +1,238 @@
+from typing import List, Mapping, Any, Optional, Sequence
+
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.remote.webelement import WebElement
+
+DEFAULT_ELEMENT_INDEX_ATTRIBUTE = 'data-boba-index'
+DEFAULT_ELEMENT_INDEX_KEY_ATTRIBUTES = (
+    'id', 'name', 'type', 'href', 'value', 'placeholder', 'aria-label', 'title', 'alt'
+)
+ELEMENT_INDEX_TABLE_COLUMNS = ('index', 'tag', 'role', 'text', 'attributes', 'bbox')
+
+# Walks the DOM (including open shadow roots) once, tags every interactive element with
+# `arguments[0]` and returns one row per element; see `index_interactive_elements`.
+INDEX_INTERACTIVE_ELEMENTS_SCRIPT = r"""
+var indexAttribute = arguments[0];
+var onlyVisible = arguments[1];
+var maxTextLength = arguments[2];
+var keyAttributes = arguments[3];
+
+var INTERACTIVE_TAGS = {
+    'a': 1, 'button': 1, 'input': 1, 'select': 1, 'textarea': 1,
+    'summary': 1, 'option': 1, 'label': 1, 'details': 1
+};
+var INTERACTIVE_ROLES = {
+    'button': 1, 'link': 1, 'checkbox': 1, 'radio': 1, 'switch': 1, 'tab': 1, 'menuitem': 1,
+    'menuitemcheckbox': 1, 'menuitemradio': 1, 'option': 1, 'combobox': 1, 'textbox': 1,
+    'searchbox': 1, 'listbox': 1, 'slider': 1, 'spinbutton': 1, 'treeitem': 1, 'gridcell': 1
+};
+var IMPLICIT_ROLES = {
+    'a': 'link', 'button': 'button', 'select': 'combobox', 'textarea': 'textbox',
+    'summary': 'button', 'option': 'option'
+};
+var INPUT_ROLES = {
+    'checkbox': 'checkbox', 'radio': 'radio', 'range': 'slider', 'number': 'spinbutton',
+    'button': 'button', 'submit': 'button', 'reset': 'button', 'image': 'button', 'search': 'searchbox'
+};
+
+function isInteractive(element, tag) {
+    if (INTERACTIVE_TAGS[tag]) {
+        if (tag === 'a') return element.hasAttribute('href') || element.hasAttribute('onclick');
+        if (tag === 'input') return (element.getAttribute('type') || '').toLowerCase() !== 'hidden';
+        return true;
+    }
+    var role = element.getAttribute('role');
+    if (role && INTERACTIVE_ROLES[role.toLowerCase()]) return true;
+    if (element.hasAttribute('onclick') || element.isContentEditable) return true;
+    var tabIndex = element.getAttribute('tabindex');
+    return tabIndex !== null && parseInt(tabIndex, 10) >= 0;
+}
+
+function getRole(element, tag) {
+    var role = element.getAttribute('role');
+    if (role) return role;
+    if (tag === 'input') {
+        return INPUT_ROLES[(element.getAttribute('type') || 'text').toLowerCase()] || 'textbox';
+    }
+    return IMPLICIT_ROLES[tag] || null;
+}
+
+function getText(element, tag) {
+    var text = (tag === 'input' || tag === 'textarea' || tag === 'select')
+        ? (element.value || '')
+        : (element.innerText || element.textContent || '');
+    text = text.replace(/\s+/g, ' ').trim();
+    return text.length > maxTextLength ? text.substring(0, maxTextLength) : text;
+}
+
+var nextIndex = window.__bobaElementIndexNext || 0;
+var rows = [];
+var scrollX = window.scrollX, scrollY = window.scrollY;
+
+function visit(root) {
+    var walker = document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT);
+    var element = walker.nextNode();
+    while (element) {
+        if (element.shadowRoot) visit(element.shadowRoot);
+        var tag = element.tagName.toLowerCase();
+        if (isInteractive(element, tag)) {
+            var rect = element.getBoundingClientRect();
+            var visible = rect.width > 0 && rect.height > 0;
+            if (visible) {
+                var style = window.getComputedStyle(element);
+                visible = style.visibility !== 'hidden' && style.display !== 'none';
+            }
+            if (visible || !onlyVisible) {
+                var index = element.getAttribute(indexAttribute);
+                if (index === null || !/^\d+$/.test(index)) {
+                    index = String(nextIndex++);
+                    element.setAttribute(indexAttribute, index);
+                } else if (+index >= nextIndex) {
+                    nextIndex = +index + 1;
+                }
+                var attributes = {};
+                for (var i = 0; i < keyAttributes.length; i++) {
+                    var value = element.getAttribute(keyAttributes[i]);
+                    if (value !== null && value !== '') {
+                        attributes[keyAttributes[i]] = value.length > maxTextLength ? value.substring(0, maxTextLength) : value;
+                    }
+                }
+                rows.push([
+                    +index, tag, getRole(element, tag), getText(element, tag), attributes,
+                    [Math.round(rect.left + scrollX), Math.round(rect.top + scrollY), Math.round(rect.width), Math.round(rect.height)]
+                ]);
+            }
+        }
+        element = walker.nextNode();
+    }
+}
+
+visit(document.documentElement);
+window.__bobaElementIndexNext = nextIndex;
+return rows;
+"""
+
+
+# Defines `querySelectorAllDeep`, which finds the elements matching a CSS selector in the document
+# and in all open shadow roots (which `document.querySelectorAll` does not search), in document order.
+QUERY_SELECTOR_ALL_DEEP_FUNCTION = r"""
+function querySelectorAllDeep(selector, root) {
+    root = root || document;
+    var elements = [];
+    var walker = document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT);
+    for (var element = walker.nextNode(); element; element = walker.nextNode()) {
+        if (element.matches(selector)) elements.push(element);
+        if (element.shadowRoot) elements = elements.concat(querySelectorAllDeep(selector, element.shadowRoot));
+    }
+    return elements;
+}
+"""
+
+# Finds the elements tagged with an index, given the CSS selector of the index (see `get_element_index_selector`);
+# the open shadow roots are searched only if the index is not in the document itself.
+FIND_ELEMENTS_BY_INDEX_SCRIPT = QUERY_SELECTOR_ALL_DEEP_FUNCTION + r"""
+var elements = document.querySelectorAll(arguments[0]);
+return elements.length ? Array.prototype.slice.call(elements) : querySelectorAllDeep(arguments[0]);
+"""
+
+
+def index_interactive_elements(
+        driver: WebDriver,
+        index_attribute: str = DEFAULT_ELEMENT_INDEX_ATTRIBUTE,
+        only_visible: bool = True,
+        max_text_length: int = 80,
+        key_attributes: Sequence[str] = DEFAULT_ELEMENT_INDEX_KEY_ATTRIBUTES
+) -> List[Mapping[str, Any]]:
+    """
+    Walks the DOM once inside the page (including open shadow roots) by `INDEX_INTERACTIVE_ELEMENTS_SCRIPT`,
+    tags every interactive element (links, buttons, form controls, elements with an interactive ARIA role,
+    click handler, non-negative tabindex or contenteditable) with `index_attribute`, and returns one row per element.
+
+    Indexes are stable: an element keeps the index it was tagged with by a previous call, and new elements
+    get indexes after the largest one assigned in the page, so an index never refers to two different elements
+    of the same page. An action can then resolve its target 'index:<index>' by a CSS attribute lookup
+    (see `find_element_by_index`) instead of an XPath or HTML matching; the lookup also finds the elements
+    indexed in open shadow roots.
+
+    Args:
+        driver: The Selenium WebDriver instance.
+        index_attribute: The data attribute to tag the elements with.
+        only_visible: True to skip the elements with an empty bounding box or hidden by CSS.
+        max_text_length: The maximum length of the text and attribute values in the rows.
+        key_attributes: The attributes to include in the rows, if present and non-empty.
+
+    Returns:
+        A list of rows, one per element in document order, with keys `ELEMENT_INDEX_TABLE_COLUMNS`;
+        'text' is the visible text (or the value of a form control), and 'bbox' is `[x, y, width, height]`
+        in document coordinates.
+
+    Examples:
+        >>> index_interactive_elements(driver)  # doctest: +SKIP
+        [{'index': 0, 'tag': 'a', 'role': 'link', 'text': 'Flights', 'attributes': {'href': '/flights'}, 'bbox': [16, 8, 52, 20]}, ...]
+    """
+    rows = driver.execute_script(
+        INDEX_INTERACTIVE_ELEMENTS_SCRIPT,
+        index_attribute,
+        only_visible,
+        max_text_length,
+        list(key_attributes)
+    )
+    return [dict(zip(ELEMENT_INDEX_TABLE_COLUMNS, row)) for row in rows]
+
+
+def format_element_index_table(rows: Sequence[Mapping[str, Any]]) -> str:
+    """
+    Formats the rows returned by `index_interactive_elements` as a compact one-line-per-element table,
+    e.g. for a model prompt.
+
+    Examples:
+        >>> print(format_element_index_table([
+        ...     {'index': 0, 'tag': 'a', 'role': 'link', 'text': 'Flights', 'attributes': {'href': '/flights'}, 'bbox': [16, 8, 52, 20]},
+        ...     {'index': 1, 'tag': 'input', 'role': 'textbox', 'text': '', 'attributes': {'name': 'q'}, 'bbox': [80, 8, 200, 24]}
+        ... ]))
+        [0] a link "Flights" href=/flights @16,8,52,20
+        [1] input textbox name=q @80,8,200,24
+    """
+    lines = []
+    for row in rows:
+        parts = [f"[{row['index']}]", row['tag']]
+        if row['role'] and row['role'] != row['tag']:
+            parts.append(row['role'])
+        if row['text']:
+            parts.append(f'"{row["text"]}"')
+        parts.extend(f'{name}={value}' for name, value in row['attributes'].items())
+        parts.append('@' + ','.join(map(str, row['bbox'])))
+        lines.append(' '.join(parts))
+    return '\n'.join(lines)
+
+
+def get_element_index_selector(index, index_attribute: str = DEFAULT_ELEMENT_INDEX_ATTRIBUTE) -> str:
+    """
+    Returns the CSS selector of the element tagged with `index` by `index_interactive_elements`.
+
+    Examples:
+        >>> get_element_index_selector(57)
+        '[data-boba-index="57"]'
+    """
+    return f'[{index_attribute}="{index}"]'
+
+
+def find_elements_by_index_selector(driver: WebDriver, index_selector: str) -> List[WebElement]:
+    """
+    Finds the elements matching the CSS selector of an index (see `get_element_index_selector`)
+    by `FIND_ELEMENTS_BY_INDEX_SCRIPT`, in the document or, if not there, in open shadow roots.
+    """
+    return driver.execute_script(FIND_ELEMENTS_BY_INDEX_SCRIPT, index_selector) or []
+
+
+def find_element_by_index(
+        driver: WebDriver,
+        index,
+        index_attribute: str = DEFAULT_ELEMENT_INDEX_ATTRIBUTE
+) -> Optional[WebElement]:
+    """
+    Finds the element tagged with `index` by `index_interactive_elements` with a CSS attribute lookup
+    (see `find_elements_by_index_selector`); returns None if no such element is in the page.
+    """
+    elements = find_elements_by_index_selector(driver, get_element_index_selector(index, index_attribute))
+    return elements[0] if elements else None
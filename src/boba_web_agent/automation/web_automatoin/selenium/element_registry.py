@@ -0,0 +1,151 @@
+from collections.abc import MutableMapping
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from selenium.common import StaleElementReferenceException
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.remote.webelement import WebElement
+
+PageGeneration = Tuple[str, int]
+
+# Returns the URL, an id stamped on the window object (a new document gets a new one), and whether the given elements
+# are all still in the document; passing an element of an unloaded document raises `StaleElementReferenceException`.
+GET_PAGE_GENERATION_SCRIPT = """
+    if (!window.__bobaDocumentId) {
+        window.__bobaDocumentId = Date.now().toString(36) + Math.random().toString(36).substring(2);
+    }
+    var elements = arguments[0] || [];
+    return [
+        location.href,
+        window.__bobaDocumentId,
+        elements.every(function (element) { return element && element.isConnected; })
+    ];
+"""
+
+
+class ElementRegistryEntry:
+    """An element selector with its cached handles, the page generation they were resolved in, and statistics."""
+    __slots__ = ('selector', 'elements', 'generation', 'hits', 'misses')
+
+    def __init__(self, selector: str):
+        self.selector = selector
+        self.elements: Optional[List[WebElement]] = None
+        self.generation: Optional[PageGeneration] = None
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self):
+        self.elements = None
+        self.generation = None
+
+    def __repr__(self):
+        return (
+            f'{type(self).__name__}(selector={self.selector!r}, cached={self.elements is not None}, '
+            f'generation={self.generation}, hits={self.hits}, misses={self.misses})'
+        )
+
+
+class ElementRegistry(MutableMapping):
+    """
+    A mapping from element names to selectors (the 'elements' of a task config), caching the elements resolved
+    for each selector together with the page generation they were resolved in.
+
+    A page generation is the URL plus a navigation counter, which the registry increments whenever it sees a new
+    document (stamped with an id on its window object). A cached handle is only used if it was resolved in the
+    current generation and is still attached to the document, both checked in one small `execute_script` call;
+    otherwise the selector is resolved again, so long sessions never act on stale elements.
+
+    Examples:
+        >>> registry = ElementRegistry({'search_button': '//button[@type="submit"]'})
+        >>> registry['search_button']
+        '//button[@type="submit"]'
+        >>> registry['from_input'] = 'html:<input aria-label="Leaving from">'
+        >>> sorted(registry)
+        ['from_input', 'search_button']
+        >>> registry.get_entry('search_button')
+        ElementRegistryEntry(selector='//button[@type="submit"]', cached=False, generation=None, hits=0, misses=0)
+    """
+
+    def __init__(self, selectors: Mapping[str, str] = None):
+        self._entries: Dict[str, ElementRegistryEntry] = {}
+        self._document_id: Optional[str] = None
+        self.navigation_count = 0
+        if selectors:
+            self.update(selectors)
+
+    # region mapping of names to selectors
+    def __getitem__(self, name: str) -> str:
+        return self._entries[name].selector
+
+    def __setitem__(self, name: str, selector: str):
+        if not isinstance(selector, str):
+            raise TypeError(f"the selector of element '{name}' must be a string; got '{selector}' of type '{type(selector)}'")
+        self._entries[name] = ElementRegistryEntry(selector)
+
+    def __delitem__(self, name: str):
+        del self._entries[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, name) -> bool:
+        return name in self._entries
+
+    # endregion
+
+    def get_entry(self, name: str) -> ElementRegistryEntry:
+        return self._entries[name]
+
+    def get_statistics(self) -> Dict[str, Tuple[int, int]]:
+        """Returns the cache `(hits, misses)` of each element."""
+        return {name: (entry.hits, entry.misses) for name, entry in self._entries.items()}
+
+    def invalidate(self, name: str = None):
+        """Drops the cached elements of `name`, or of all elements if `name` is not specified."""
+        for entry in (self._entries.values() if name is None else (self._entries[name],)):
+            entry.invalidate()
+
+    def get_page_generation(self, driver: WebDriver, elements: Sequence[WebElement] = None) -> Tuple[PageGeneration, bool]:
+        """
+        Returns the current page generation, and whether `elements` are all still attached to the current document.
+        """
+        try:
+            url, document_id, attached = driver.execute_script(GET_PAGE_GENERATION_SCRIPT, list(elements or ()))
+        except StaleElementReferenceException:
+            url, document_id, attached = driver.execute_script(GET_PAGE_GENERATION_SCRIPT, [])
+            attached = False
+        if document_id != self._document_id:
+            self._document_id = document_id
+            self.navigation_count += 1
+        return (url, self.navigation_count), attached
+
+    def resolve(
+            self,
+            driver: WebDriver,
+            name: str,
+            resolve_selector: Callable[[str], Optional[Sequence[WebElement]]]
+    ) -> Optional[Sequence[WebElement]]:
+        """
+        Returns the elements of `name`: the cached ones if they were resolved in the current page generation and
+        are still attached, or otherwise the ones `resolve_selector` finds by the selector, which are then cached.
+        """
+        entry = self._entries[name]
+        generation = None
+        if entry.elements is not None:
+            generation, attached = self.get_page_generation(driver, entry.elements)
+            if attached and generation == entry.generation:
+                entry.hits += 1
+                return entry.elements
+
+        entry.misses += 1
+        elements = resolve_selector(entry.selector)
+        if elements:
+            if generation is None:
+                generation, _ = self.get_page_generation(driver)
+            entry.elements = list(elements)
+            entry.generation = generation
+        else:
+            entry.invalidate()
+        return elements
@@ -1,29 +1,54 @@
 from enum import Enum
-from typing import Optional, Mapping, Any, Sequence, Tuple
+from functools import lru_cache
+from typing import Optional, Mapping, Any, Sequence, Tuple, NamedTuple, Union
 
+from selenium.common import NoSuchElementException
 from selenium.webdriver.chrome.webdriver import WebDriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 
 from boba_python_utils.common_utils import promote_keys, get_relevant_named_args
 from boba_web_agent.automation.web_automatoin.html_utils import get_xpath, get_tag_text_and_attributes_from_element_html, is_html_style_string
+from boba_web_agent.automation.web_automatoin.selenium.element_index import get_element_index_selector, find_elements_by_index_selector
+from boba_web_agent.automation.web_automatoin.selenium.element_registry import ElementRegistry
+from boba_web_agent.automation.web_automatoin.selenium.text_index import TEXT_INDEX_FUNCTIONS, find_elements_by_text
+from boba_web_agent.automation.web_automatoin.selenium.selector_cache import LearnedSelectorCache
 from boba_web_agent.automation.web_automatoin.selenium.types import ElementDict
 
+# the tag name, the text and the attributes of an HTML snippet, as of `get_tag_text_and_attributes_from_element_html`
+ParsedHtml = Tuple[Optional[str], Optional[str], Mapping[str, Any]]
+
 
 def find_element_by_xpath(
         driver,
         tag_name: Optional[str] = '*',
         attributes: Mapping[str, Any] = None,
         text: str = None,
-        immediate_text: str = None
+        immediate_text: str = None,
+        use_text_index: bool = True
 ):
-    xpath = get_xpath(
+    """
+    Finds the first element matching the XPath from `get_xpath`; raises `NoSuchElementException` if none.
+    See `find_elements_by_xpath` for `use_text_index`.
+    """
+    elements = find_elements_by_xpath(
+        driver=driver,
         tag_name=tag_name,
         attributes=attributes,
         text=text,
-        immediate_text=immediate_text
+        immediate_text=immediate_text,
+        use_text_index=use_text_index
     )
-    return driver.find_element(By.XPATH, xpath)
+    if not elements:
+        xpath = get_xpath(
+            tag_name=tag_name,
+            attributes=attributes,
+            text=text,
+            immediate_text=immediate_text,
+            normalize_whitespace=use_text_index
+        )
+        raise NoSuchElementException(f"no element matches {xpath}")
+    return elements[0]
 
 
 def find_elements_by_xpath(
@@ -31,18 +56,205 @@ def find_elements_by_xpath(
         tag_name: Optional[str] = '*',
         attributes: Mapping[str, Any] = None,
         text: str = None,
-        immediate_text: str = None
+        immediate_text: str = None,
+        use_text_index: bool = True
 ):
+    """
+    Finds the elements matching the XPath from `get_xpath`.
+
+    With `text` or `immediate_text` and `use_text_index`, the elements are looked up by the page-side text index
+    (see `find_elements_by_text`) instead of an XPath scan over all candidate elements, and the XPath is only
+    evaluated if the index finds nothing. The index matches texts with whitespace normalized on both sides
+    (so `text='Book now'` also matches 'Book\\n  now'), and so does the XPath then
+    (see `normalize_whitespace` of `get_xpath`); without `use_text_index`, texts are matched as they are.
+    """
+    if use_text_index and (text or immediate_text):
+        elements = find_elements_by_text(
+            driver=driver,
+            text=text,
+            tag_name=tag_name,
+            attributes=attributes,
+            immediate_text=immediate_text
+        )
+        if elements:
+            return elements
+
     xpath = get_xpath(
         tag_name=tag_name,
         attributes=attributes,
         text=text,
-        immediate_text=immediate_text
+        immediate_text=immediate_text,
+        normalize_whitespace=use_text_index
     )
     return driver.find_elements(By.XPATH, xpath)
 
 
-def find_element_by_html(driver, target_element_html: str, identifying_attributes=('id', 'aria-label', 'class'), always_return_single_element: bool = False):
+class HtmlMatchingEngines(str, Enum):
+    PYTHON = 'python'
+    JAVASCRIPT = 'javascript'
+
+
+FIND_ELEMENT_BY_HTML_SCRIPT = TEXT_INDEX_FUNCTIONS + """
+    var xpathWithText = arguments[0];
+    var xpathWithoutText = arguments[1];
+    var attributes = arguments[2];
+    var identifyingAttributes = arguments[3];
+    var tagName = arguments[4];
+    var text = arguments[5];
+
+    function evaluateXPath(xpath) {
+        var snapshot = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        var elements = [];
+        for (var i = 0; i < snapshot.snapshotLength; i++) {
+            elements.push(snapshot.snapshotItem(i));
+        }
+        return elements;
+    }
+
+    function splitValues(values) {
+        values = values.trim();
+        return values ? values.split(/\\s+/) : [];
+    }
+
+    function winner(element) {
+        return {winner: element, candidates: null};
+    }
+
+    // the text index answers the text probe with the same elements as the XPath, both normalizing whitespace
+    // (including a text over several text nodes), so a single element found is the unique match;
+    // the XPath scan is only the fallback
+    var elements = text ? findElementsByText(text, tagName, [], null) : [];
+    if (elements.length === 0) {
+        elements = evaluateXPath(xpathWithText);
+    }
+    if (elements.length === 1) {
+        return winner(elements[0]);
+    } else if (elements.length === 0) {
+        elements = evaluateXPath(xpathWithoutText);
+        if (elements.length === 1) {
+            return winner(elements[0]);
+        } else if (elements.length === 0) {
+            return null;
+        }
+    }
+
+    for (var i = 0; i < attributes.length; i++) {
+        var attr = attributes[i][0];
+        var targetAttrValues = attributes[i][1];
+        var elemAttrValues = [];
+        for (var j = 0; j < elements.length; j++) {
+            var values = elements[j].getAttribute(attr);
+            if (values !== null) {
+                elemAttrValues.push([elements[j], splitValues(values)]);
+            }
+        }
+
+        if (elemAttrValues.length === 1) {
+            return winner(elemAttrValues[0][0]);
+        } else if (elemAttrValues.length === 0) {
+            return null;
+        }
+
+        var _elemAttrValues = elemAttrValues;
+        for (var k = 0; k < targetAttrValues.length; k++) {
+            var singleTargetAttrValue = targetAttrValues[k];
+            _elemAttrValues = _elemAttrValues.filter(function (item) {
+                return item[1].indexOf(singleTargetAttrValue) !== -1;
+            });
+            if (_elemAttrValues.length === 1) {
+                return winner(_elemAttrValues[0][0]);
+            } else if (_elemAttrValues.length === 0) {
+                if (identifyingAttributes.indexOf(attr) !== -1) {
+                    return null;
+                } else {
+                    break;
+                }
+            }
+        }
+        if (_elemAttrValues.length) {
+            elemAttrValues = _elemAttrValues;
+        }
+
+        elements = elemAttrValues.map(function (item) { return item[0]; });
+    }
+
+    return {winner: null, candidates: elements};
+"""
+
+
+def get_find_element_by_html_script_arguments(
+        target_element_html: str,
+        identifying_attributes=('id', 'aria-label', 'class'),
+        parsed_html: ParsedHtml = None
+) -> list:
+    """
+    Returns the arguments of `FIND_ELEMENT_BY_HTML_SCRIPT` to find the element of `target_element_html`;
+    `parsed_html` saves parsing the snippet again if it is already parsed (see `compile_target`).
+    """
+    tag_name, text, attributes = parsed_html or get_tag_text_and_attributes_from_element_html(target_element_html)
+    attributes = [
+        (attr, (target_attr_values.split() if isinstance(target_attr_values, str) else list(target_attr_values)))
+        for attr, target_attr_values in promote_keys(attributes, keys_to_promote=identifying_attributes).items()
+    ]
+    return [
+        get_xpath(tag_name=tag_name, text=text, normalize_whitespace=True),
+        get_xpath(tag_name=tag_name),
+        attributes,
+        list(identifying_attributes),
+        tag_name or '*',
+        text
+    ]
+
+
+def find_element_by_html_in_page(
+        driver,
+        target_element_html: str,
+        identifying_attributes=('id', 'aria-label', 'class'),
+        always_return_single_element: bool = False,
+        parsed_html: ParsedHtml = None
+):
+    """
+    Same as `find_element_by_html`, but runs the candidate search and the progressive attribute filtering
+    inside the page through a single `execute_script` call, instead of one WebDriver round trip
+    per candidate element and attribute.
+
+    Args:
+        driver: A Selenium WebDriver instance used to interact with the web page.
+        target_element_html: A string representing an HTML snippet of the target element.
+        identifying_attributes: Attributes tried first; a mismatch on any of them means no element matches.
+        always_return_single_element: If True, returns the top-ranked candidate when no unique match is found.
+        parsed_html: The parsed `target_element_html` if already parsed (see `compile_target`).
+
+    Returns:
+        The uniquely matched web element; otherwise the ranked candidates (or the top one if
+        `always_return_single_element` is True); or None if no element matches.
+    """
+    result = driver.execute_script(
+        FIND_ELEMENT_BY_HTML_SCRIPT,
+        *get_find_element_by_html_script_arguments(target_element_html, identifying_attributes, parsed_html=parsed_html)
+    )
+
+    if not result:
+        return None
+    if result['winner'] is not None:
+        return result['winner']
+
+    elements = result['candidates']
+    if always_return_single_element:
+        return elements[0]
+    else:
+        return elements
+
+
+def find_element_by_html(
+        driver,
+        target_element_html: str,
+        identifying_attributes=('id', 'aria-label', 'class'),
+        always_return_single_element: bool = False,
+        matching_engine: HtmlMatchingEngines = HtmlMatchingEngines.PYTHON,
+        selector_cache: LearnedSelectorCache = None,
+        parsed_html: ParsedHtml = None
+):
     """
     Finds an element by an HTML snippet, using a combination of tag name, text content, and attributes.
     The function first tries to find elements by tag name and text. If multiple elements are found,
@@ -55,11 +267,45 @@ def find_element_by_html(driver, target_element_html: str, identifying_attribute
     Args:
         driver: A Selenium WebDriver instance used to interact with the web page.
         target_element_html: A string representing an HTML snippet of the target element.
+        matching_engine: `HtmlMatchingEngines.PYTHON` filters candidates with one WebDriver call per element
+            and attribute; `HtmlMatchingEngines.JAVASCRIPT` runs the same filtering in the page
+            in a single round trip (see `find_element_by_html_in_page`).
+        selector_cache: An optional `LearnedSelectorCache`; its learned selector for the target is tried first,
+            and full matching only runs (and teaches the cache) when it misses.
+        parsed_html: The parsed `target_element_html` if already parsed (see `compile_target`),
+            so that the snippet is not parsed again on every lookup.
 
     Returns:
         The first web element that uniquely matches the generated criteria or None if no such element is found.
     """
-    tag_name, text, attributes = get_tag_text_and_attributes_from_element_html(target_element_html)
+    if selector_cache is not None:
+        element = selector_cache.find_element(driver, target_element_html)
+        if element is not None:
+            return element
+        elements = find_element_by_html(
+            driver=driver,
+            target_element_html=target_element_html,
+            identifying_attributes=identifying_attributes,
+            matching_engine=matching_engine,
+            parsed_html=parsed_html
+        )
+        if isinstance(elements, WebElement):
+            # only a unique match is learned, not a pick out of ambiguous candidates
+            selector_cache.learn(driver, target_element_html, elements)
+        elif elements and always_return_single_element:
+            return elements[0]
+        return elements
+
+    if matching_engine == HtmlMatchingEngines.JAVASCRIPT:
+        return find_element_by_html_in_page(
+            driver=driver,
+            target_element_html=target_element_html,
+            identifying_attributes=identifying_attributes,
+            always_return_single_element=always_return_single_element,
+            parsed_html=parsed_html
+        )
+
+    tag_name, text, attributes = parsed_html or get_tag_text_and_attributes_from_element_html(target_element_html)
     elements = find_elements_by_xpath(driver=driver, tag_name=tag_name, text=text)
 
     if len(elements) == 1:
@@ -115,6 +361,7 @@ class TargetTypes(Enum):
     ID = "id"
     XPATH = "xpath"
     HTML = "html"
+    INDEX = "index"
 
 
 def get_find_elements_target_type(target: str) -> Tuple[TargetTypes, str]:
@@ -138,44 +385,125 @@ def get_find_elements_target_type(target: str) -> Tuple[TargetTypes, str]:
     return target_type, target
 
 
-def _find_element(driver, target: str, **kwargs) -> WebElement:
-    target_type, target = get_find_elements_target_type(target)
+class CompiledTarget(NamedTuple):
+    """
+    A target selector classified and, for an HTML snippet, parsed once by `compile_target`,
+    so that locating it does no string classification or HTML parsing.
+
+    Attributes:
+        selector: The selector as written, e.g. 'xpath://ul' or '<button>Search</button>'.
+        target_type: The type of the selector.
+        value: The selector without its type prefix; for `TargetTypes.INDEX`, the CSS selector of the index.
+        html_tag_name: The tag name of an HTML snippet.
+        html_text: The text of an HTML snippet.
+        html_attributes: The attributes of an HTML snippet, as `(name, value)` pairs.
+        element_name: The element name this selector was resolved from, if any.
+    """
+    selector: str
+    target_type: TargetTypes
+    value: str
+    html_tag_name: Optional[str] = None
+    html_text: Optional[str] = None
+    html_attributes: Tuple[Tuple[str, Any], ...] = ()
+    element_name: Optional[str] = None
+
+    @property
+    def parsed_html(self) -> Optional[ParsedHtml]:
+        if self.target_type == TargetTypes.HTML:
+            return self.html_tag_name, self.html_text, dict(self.html_attributes)
+
+
+@lru_cache(maxsize=1024)
+def _compile_selector(selector: str) -> CompiledTarget:
+    target_type, value = get_find_elements_target_type(selector)
+    if target_type == TargetTypes.INDEX:
+        return CompiledTarget(selector, target_type, get_element_index_selector(value))
+    if target_type == TargetTypes.HTML:
+        tag_name, text, attributes = get_tag_text_and_attributes_from_element_html(value)
+        return CompiledTarget(
+            selector,
+            target_type,
+            value,
+            html_tag_name=tag_name,
+            html_text=text,
+            html_attributes=tuple(
+                (attr, (attr_value if isinstance(attr_value, str) else tuple(attr_value)))
+                for attr, attr_value in attributes.items()
+            )
+        )
+    return CompiledTarget(selector, target_type, value)
+
 
-    if target_type == TargetTypes.XPATH:
-        return driver.find_element(By.XPATH, target)
-    elif target_type == TargetTypes.ID:
-        return driver.find_element(By.ID, target)
+def compile_target(target: str, elements_dict: ElementDict = None) -> CompiledTarget:
+    """
+    Compiles a target, either a selector or the name of an element in `elements_dict`, into a `CompiledTarget`.
+    Compiled selectors are memoized, so a selector used repeatedly is only classified and parsed once.
+
+    Examples:
+        >>> compile_target('//button[@type="submit"]')
+        CompiledTarget(selector='//button[@type="submit"]', target_type=<TargetTypes.XPATH: 'xpath'>, value='//button[@type="submit"]', html_tag_name=None, html_text=None, html_attributes=(), element_name=None)
+        >>> compile_target('search', elements_dict={'search': 'index:12'}).value
+        '[data-boba-index="12"]'
+        >>> compile_target('search', elements_dict={'search': 'index:12'}).element_name
+        'search'
+    """
+    if elements_dict is not None and target in elements_dict:
+        selector = elements_dict[target]
+        if not isinstance(selector, str):
+            raise TypeError(f"element '{target}' is already resolved to elements and has no selector to compile")
+        return _compile_selector(selector)._replace(element_name=target)
+    return _compile_selector(target)
+
+
+def _find_element(driver, target: Union[str, CompiledTarget], **kwargs) -> WebElement:
+    if isinstance(target, str):
+        target = _compile_selector(target)
+
+    if target.target_type == TargetTypes.XPATH:
+        return driver.find_element(By.XPATH, target.value)
+    elif target.target_type == TargetTypes.ID:
+        return driver.find_element(By.ID, target.value)
+    elif target.target_type == TargetTypes.INDEX:
+        elements = find_elements_by_index_selector(driver, target.value)
+        if not elements:
+            raise NoSuchElementException(f"no element is tagged with the index of '{target.selector}'")
+        return elements[0]
     else:
         return find_element_by_html(
             driver=driver,
-            target_element_html=target,
+            target_element_html=target.value,
             always_return_single_element=True,
+            parsed_html=target.parsed_html,
             **get_relevant_named_args(
                 find_element_by_html,
-                exclusion=['target_element_html', 'always_return_single_element'],
+                exclusion=['target_element_html', 'always_return_single_element', 'parsed_html'],
                 **kwargs
             )
         )
 
 
-def _find_elements(driver, target: str, explicit_multiple_elements: bool = False, **kwargs) -> Sequence[WebElement]:
-    if explicit_multiple_elements and target[0] != '*':
+def _find_elements(driver, target: Union[str, CompiledTarget], explicit_multiple_elements: bool = False, **kwargs) -> Sequence[WebElement]:
+    if isinstance(target, str):
+        target = _compile_selector(target)
+
+    if explicit_multiple_elements and target.selector[0] != '*':
         element = _find_element(driver, target, **kwargs)
         if element is not None:
             return [element]
     else:
-        target_type, target = get_find_elements_target_type(target)
-
-        if target_type == TargetTypes.XPATH:
-            return driver.find_elements(By.XPATH, target)
-        elif target_type == TargetTypes.ID:
-            return driver.find_elements(By.ID, target)
+        if target.target_type == TargetTypes.XPATH:
+            return driver.find_elements(By.XPATH, target.value)
+        elif target.target_type == TargetTypes.ID:
+            return driver.find_elements(By.ID, target.value)
+        elif target.target_type == TargetTypes.INDEX:
+            return find_elements_by_index_selector(driver, target.value)
         else:
             elements = find_element_by_html(
                 driver=driver,
-                target_element_html=target,
+                target_element_html=target.value,
+                parsed_html=target.parsed_html,
                 **get_relevant_named_args(
-                    find_element_by_html, **kwargs
+                    find_element_by_html, exclusion=['target_element_html', 'parsed_html'], **kwargs
                 )
             )
 
@@ -185,49 +513,96 @@ def _find_elements(driver, target: str, explicit_multiple_elements: bool = False
                 return elements
 
 
+def _get_element_name(
+        target: Union[str, CompiledTarget],
+        elements_dict: ElementDict = None
+) -> Tuple[Optional[str], Optional[CompiledTarget]]:
+    """Returns the element name of `target` in `elements_dict` (None if it is a selector), and `target` if compiled."""
+    if isinstance(target, CompiledTarget):
+        if elements_dict is not None and target.element_name is not None and target.element_name in elements_dict:
+            return target.element_name, target
+        return None, target
+    if elements_dict is not None and target in elements_dict:
+        return target, None
+    return None, None
+
+
+def _get_selector_resolution(compiled_target: Optional[CompiledTarget], selector: str) -> Union[str, CompiledTarget]:
+    """Returns `compiled_target` if it was compiled from `selector` (the element has not been re-assigned since)."""
+    if compiled_target is not None and compiled_target.selector == selector:
+        return compiled_target
+    return selector
+
+
 def find_element(
         driver: WebDriver,
-        target: str,
+        target: Union[str, CompiledTarget],
         elements_dict: ElementDict = None,
         **kwargs
 ) -> Optional[WebElement]:
+    """
+    Finds the element of `target`, which is either a selector, or the name of an element in `elements_dict`,
+    or a `CompiledTarget` of either; with an `ElementRegistry`, the cached element is reused only while it is valid
+    in the current page generation.
+    """
     if target:
-        if target in elements_dict:
-            target_key = target
-            target = elements_dict[target]
+        element_name, compiled_target = _get_element_name(target, elements_dict)
+        if element_name is None:
+            return _find_element(driver, target, **kwargs)
+
+        if isinstance(elements_dict, ElementRegistry):
+            elements = elements_dict.resolve(
+                driver,
+                element_name,
+                lambda selector: _as_elements(
+                    _find_element(driver, _get_selector_resolution(compiled_target, selector), **kwargs)
+                )
+            )
+            element = elements[0] if elements else None
+        else:
+            target = elements_dict[element_name]
             if isinstance(target, str):
-                element = _find_element(driver, target, **kwargs)
+                element = _find_element(driver, _get_selector_resolution(compiled_target, target), **kwargs)
                 if element is not None:
-                    elements_dict[target_key] = [element]
+                    elements_dict[element_name] = [element]
             else:
                 element = target[0]
-        else:
-            element = _find_element(driver, target, **kwargs)
         return element
 
 
 def find_elements(
         driver: WebDriver,
-        target: str,
+        target: Union[str, CompiledTarget],
         explicit_multiple_elements: bool = False,
         elements_dict: ElementDict = None,
         **kwargs
 ) -> Optional[Sequence[WebElement]]:
+    """Same as `find_element`, but finds all elements of `target`; see `_find_elements` for `explicit_multiple_elements`."""
     if target:
-        if target in elements_dict:
-            target_key = target
-            target = elements_dict[target]
+        element_name, compiled_target = _get_element_name(target, elements_dict)
+        if element_name is None:
+            return _find_elements(driver, target, **kwargs)
+
+        def _resolve(selector: str):
+            return _find_elements(
+                driver=driver,
+                target=_get_selector_resolution(compiled_target, selector),
+                explicit_multiple_elements=explicit_multiple_elements,
+                **kwargs
+            )
+
+        if isinstance(elements_dict, ElementRegistry):
+            elements = elements_dict.resolve(driver, element_name, _resolve)
+        else:
+            target = elements_dict[element_name]
             if isinstance(target, str):
-                elements = _find_elements(
-                    driver=driver,
-                    target=target,
-                    explicit_multiple_elements=explicit_multiple_elements,
-                    **kwargs
-                )
+                elements = _resolve(target)
                 if elements is not None:
-                    elements_dict[target_key] = elements
+                    elements_dict[element_name] = elements
             else:
                 elements = target
-        else:
-            elements = _find_elements(driver, target, **kwargs)
         return elements
+
+
+def _as_elements(element: Optional[WebElement]) -> Optional[Sequence[WebElement]]:
+    return None if element is None else [element]
@@ -1,104 +1,204 @@
 from os import path
-from typing import Mapping, Union
+from typing import Mapping, Union, Callable, Sequence
 
+from selenium.common import NoSuchElementException
 from selenium.webdriver.chrome.webdriver import WebDriver
 from selenium.webdriver.remote.webelement import WebElement
 
-from boba_python_utils.common_utils import iter__
 from boba_python_utils.common_utils.workflow import Repeat
-from boba_python_utils.io_utils.json_io import write_json_objs
-from boba_python_utils.io_utils.text_io import write_all_text
-from boba_python_utils.path_utils.common import ensure_dir_existence
-
 from boba_python_utils.time_utils.common import random_sleep
-from boba_web_agent.automation.web_automatoin.constants.task_config import FIELD_NAME_TASK_CONFIG_ACTION_INIT_COND, FIELD_NAME_TASK_CONFIG_ACTION_ARGS, FIELD_NAME_TASK_CONFIG_ACTION_TARGET, FIELD_NAME_TASK_CONFIG_ACTION_NAME, FIELD_NAME_TASK_CONFIG_ACTION_REPEAT_COND, FIELD_NAME_TASK_CONFIG_ACTION_REPEAT, FIELD_NAME_TASK_CONFIG_ACTION_SCREENSHOT
-from boba_web_agent.automation.web_automatoin.selenium.actions import send_keys_with_random_delay, capture_full_page_screenshot, open_url
-from boba_web_agent.automation.web_automatoin.selenium.conditions import check_elements
+from boba_web_agent.automation.web_automatoin.selenium.actions import capture_full_page_screenshot_as_base64, capture_element_screenshot_as_base64, get_element_screenshot_format, open_url, input_text, click_at_point, InputTextPolicy, ScreenshotModes
+from boba_web_agent.automation.web_automatoin.selenium.conditions import evaluate_compiled_element_conditions, wait_for_compiled_element_conditions
 from boba_web_agent.automation.web_automatoin.selenium.element_selection import find_element
+from boba_web_agent.automation.web_automatoin.selenium.recording import ActionRecordWriter, get_html_snapshot_page_key
+from boba_web_agent.automation.web_automatoin.selenium.task_plan import ACTION_ARG_FALLBACK_POINT, ActionPlan, TaskPlan, CompiledConditions, compile_task_plan, get_target_label
 from boba_web_agent.automation.web_automatoin.selenium.types import ElementDict, ElementConditions
 from boba_web_agent.automation.web_automatoin.selenium.common import get_element_html, get_body_html, get_element_text, wait_for_page_loading
 
 
-def execute_single_action(driver: WebDriver, element: WebElement, action_name: str, action_args: Mapping = None):
+def _get_fallback_point(action_name: str, action_args: Mapping = None):
+    """Returns the `[x, y]` document coordinates to click if the target of a click action cannot be resolved."""
+    if action_name == 'click' and action_args:
+        return action_args.get(ACTION_ARG_FALLBACK_POINT, None)
+
+
+def _get_condition_check(
+        driver: WebDriver,
+        clauses: CompiledConditions,
+        timeout: float = None,
+        elements_dict: ElementDict = None,
+        **kwargs
+) -> Callable[[], bool]:
+    """
+    Returns the check of compiled conditions (see `compile_element_conditions`) for `Repeat`; with `timeout`,
+    the check waits up to `timeout` seconds for the conditions to hold (see `wait_for_element_conditions`)
+    instead of checking them once. `elements_dict` and `kwargs` (the options of `find_element`) resolve the targets
+    not resolved inside the page the same way as action targets.
+    """
+    if isinstance(clauses, bool):
+        return lambda: clauses
+    if timeout:
+        return lambda: wait_for_compiled_element_conditions(
+            driver, clauses, timeout=timeout, elements_dict=elements_dict, **kwargs
+        )['result']
+    return lambda: evaluate_compiled_element_conditions(driver, clauses, elements_dict=elements_dict, **kwargs)['result']
+
+
+def _get_repeat(
+        driver: WebDriver,
+        repeat: int,
+        repeat_when: CompiledConditions,
+        init_cond: CompiledConditions,
+        cond_timeout: float = None,
+        repeat_cond_timeout: float = None,
+        elements_dict: ElementDict = None,
+        **kwargs
+) -> Repeat:
+    return Repeat(
+        repeat=repeat,
+        repeat_cond=_get_condition_check(
+            driver, repeat_when, timeout=repeat_cond_timeout, elements_dict=elements_dict, **kwargs
+        ),
+        init_cond=(
+            True if init_cond is None
+            else _get_condition_check(driver, init_cond, timeout=cond_timeout, elements_dict=elements_dict, **kwargs)
+        )
+    )
+
+
+def execute_single_action(
+        driver: WebDriver,
+        element: WebElement,
+        action_name: str,
+        action_args: Mapping = None,
+        quiet_window: float = None,
+        input_text_policy: InputTextPolicy = None
+):
     if action_name == 'get_text':
         return get_element_text(element)
     if action_name == 'get_html':
         return get_element_html(element)
     else:
         if action_name == 'click':
-            element.click()
+            fallback_point = _get_fallback_point(action_name, action_args)
+            if element is None and fallback_point is not None:
+                click_at_point(driver, *fallback_point)
+            else:
+                element.click()
         elif action_name == 'input_text':
-            send_keys_with_random_delay(element, **action_args)
+            input_text(driver, element, input_text_policy=input_text_policy, **action_args)
         elif action_name == 'open_url':
             open_url(driver, **action_args)
-        wait_for_page_loading(driver)
+        wait_for_page_loading(driver, quiet_window=quiet_window)
 
 
 def _execute_actions(
         driver: WebDriver,
-        actions: Mapping,
+        actions: Sequence[ActionPlan],
         elements_dict: ElementDict = None,
         output_path_action_records: str = None,
+        quiet_window: float = None,
+        input_text_policy: InputTextPolicy = None,
+        use_html_snapshot_store: bool = False,
+        screenshot_mode: ScreenshotModes = ScreenshotModes.FULL_PAGE,
+        screenshot_format: str = 'png',
+        screenshot_quality: int = None,
+        dedup_screenshots: bool = False,
+        compress_html: bool = False,
+        max_record_queue_size: int = 4,
         **kwargs
 ):
     if output_path_action_records:
-        action_records = []
-
-    for action_index, action in enumerate(actions):
-        if output_path_action_records:
-            output_path_action_root = ensure_dir_existence(
-                path.join(output_path_action_records, f'action_{action_index}')
-            )
-            action_records_jobj = {'action_index': action_index}
-
-        action_name = action[FIELD_NAME_TASK_CONFIG_ACTION_NAME]
-        action_target = action.get(FIELD_NAME_TASK_CONFIG_ACTION_TARGET, None)
-        action_args = action.get(FIELD_NAME_TASK_CONFIG_ACTION_ARGS, None)
-        action_cond = action.get(FIELD_NAME_TASK_CONFIG_ACTION_INIT_COND, None)
-        action_repeat_when = action.get(FIELD_NAME_TASK_CONFIG_ACTION_REPEAT_COND, None)
-        action_repeat = action.get(FIELD_NAME_TASK_CONFIG_ACTION_REPEAT, int(not bool(action_repeat_when)))
-        action_screenshot = action.get(FIELD_NAME_TASK_CONFIG_ACTION_SCREENSHOT, True)
-        repeat = Repeat(
-            repeat=action_repeat,
-            repeat_cond=lambda: check_elements(driver=driver, conditions=action_repeat_when, elements_dict=elements_dict),
-            init_cond=(True if action_cond is None else lambda: check_elements(driver=driver, conditions=action_cond, elements_dict=elements_dict))
+        record_writer = ActionRecordWriter(
+            output_path_action_records,
+            max_queue_size=max_record_queue_size,
+            compress_html=compress_html,
+            use_html_snapshot_store=use_html_snapshot_store,
+            dedup_screenshots=dedup_screenshots
         )
+        screenshot_file_extension = (
+            'png' if screenshot_mode != ScreenshotModes.ELEMENT
+            else get_element_screenshot_format(driver, screenshot_format)
+        )
+        if screenshot_file_extension == 'jpeg':
+            screenshot_file_extension = 'jpg'
 
-        while repeat:
+    try:
+        for action_index, action in enumerate(actions):
+            if output_path_action_records:
+                action_records_dir_name = f'action_{action_index}'
+                action_records_jobj = {'action_index': action_index}
 
-            base_action_records_jobj = action_records_jobj.copy()
-            base_action_records_jobj['action_repeat_index'] = repeat.index
+            repeat = _get_repeat(
+                driver, action.repeat, action.repeat_when, action.init_cond, action.cond_timeout,
+                action.repeat_cond_timeout, elements_dict=elements_dict, **kwargs
+            )
 
-            for action_target_index, _action_target in enumerate(iter__(action_target, iter_none=True)):
-                element = find_element(driver, _action_target, elements_dict=elements_dict, **kwargs)
+            while repeat:
 
                 if output_path_action_records:
-                    output_path_html_before_action = path.join(output_path_action_root, f'html_before_action-target_{action_target_index}-repeat_{repeat.index}.html')
-                    write_all_text(get_body_html(driver, return_dynamic_contents=True), output_path_html_before_action)
-                    if action_screenshot:
-                        output_path_screenshot_before_action = path.join(output_path_action_root, f'screenshot_before_action-target_{action_target_index}-repeat_{repeat.index}.png')
-                        capture_full_page_screenshot(driver, output_path_screenshot_before_action, center_element=element)
+                    base_action_records_jobj = action_records_jobj.copy()
+                    base_action_records_jobj['action_repeat_index'] = repeat.index
 
-                action_result = execute_single_action(driver, element, action_name, action_args)
+                for action_target_index, _action_target in enumerate(action.targets):
+                    try:
+                        element = find_element(driver, _action_target, elements_dict=elements_dict, **kwargs)
+                    except NoSuchElementException:
+                        if action.fallback_point is None:
+                            raise
+                        element = None
 
-                if output_path_action_records:
-                    _action_records_jobj = base_action_records_jobj.copy()
-                    if _action_target is not None:
-                        _action_records_jobj['action_target_index'] = action_target_index
-                        _action_records_jobj['action_target'] = _action_target
-                    if element is not None:
-                        _action_records_jobj['action_target_element'] = get_element_html(element)
-                    if action_result is not None:
-                        _action_records_jobj['action_result'] = action_result
-                    action_records.append(_action_records_jobj)
-
-                random_sleep(0.3, 2)
+                    if output_path_action_records:
+                        record_writer.write_html(
+                            path.join(action_records_dir_name, f'html_before_action-target_{action_target_index}-repeat_{repeat.index}.html'),
+                            get_body_html(driver, return_dynamic_contents=True),
+                            page_key=(
+                                get_html_snapshot_page_key(driver.current_url)
+                                if record_writer.html_snapshot_store is not None else None
+                            )
+                        )
+                        if action.screenshot and (element is not None or screenshot_mode != ScreenshotModes.ELEMENT):
+                            record_writer.write_screenshot(
+                                path.join(action_records_dir_name, f'screenshot_before_action-target_{action_target_index}-repeat_{repeat.index}.{screenshot_file_extension}'),
+                                (
+                                    capture_element_screenshot_as_base64(driver, element, image_format=screenshot_format, quality=screenshot_quality)
+                                    if screenshot_mode == ScreenshotModes.ELEMENT
+                                    else capture_full_page_screenshot_as_base64(driver, center_element=element, quiet_window=quiet_window)
+                                )
+                            )
 
-    if output_path_action_records:
-        write_json_objs(
-            action_records,
-            path.join(output_path_action_records, 'action_records.jsonl')
-        )
+                    action_result = execute_single_action(
+                        driver,
+                        element,
+                        action.name,
+                        action.args,
+                        quiet_window=quiet_window,
+                        input_text_policy=input_text_policy
+                    )
+
+                    if output_path_action_records:
+                        _action_records_jobj = base_action_records_jobj.copy()
+                        if _action_target is not None:
+                            _action_records_jobj['action_target_index'] = action_target_index
+                            _action_records_jobj['action_target'] = get_target_label(_action_target)
+                        if element is not None:
+                            _action_records_jobj['action_target_element'] = get_element_html(element)
+                        elif action.fallback_point is not None:
+                            _action_records_jobj['action_fallback_point'] = list(action.fallback_point)
+                        if action_result is not None:
+                            _action_records_jobj['action_result'] = action_result
+                        record_writer.append_action_record(_action_records_jobj)
+
+                    if quiet_window is None:
+                        random_sleep(0.3, 2)
+    except BaseException:
+        # an error in writing the recordings must not replace the error already propagating
+        if output_path_action_records:
+            record_writer.close(raise_error=False)
+        raise
+    else:
+        if output_path_action_records:
+            record_writer.close()
 
 
 def execute_actions(
@@ -109,18 +209,92 @@ def execute_actions(
         repeat_when: ElementConditions = None,
         elements_dict: ElementDict = None,
         output_path_action_records: str = None,
+        quiet_window: float = None,
+        input_text_policy: InputTextPolicy = None,
+        use_html_snapshot_store: bool = False,
+        screenshot_mode: ScreenshotModes = ScreenshotModes.FULL_PAGE,
+        screenshot_format: str = 'png',
+        screenshot_quality: int = None,
+        dedup_screenshots: bool = False,
+        compress_html: bool = False,
+        max_record_queue_size: int = 4,
+        cond_timeout: float = None,
+        repeat_cond_timeout: float = None,
         **kwargs
 ):
-    repeat = Repeat(
-        repeat=repeat,
-        repeat_cond=lambda: check_elements(driver=driver, conditions=repeat_when, elements_dict=elements_dict),
-        init_cond=(True if init_cond is None else lambda: check_elements(driver=driver, conditions=init_cond, elements_dict=elements_dict))
+    """
+    Executes a sequence of actions, optionally repeated while `repeat_when` holds.
+
+    If `quiet_window` is specified, each action waits for the page to settle (no network activity and no DOM
+    mutation for `quiet_window` seconds) instead of sleeping for fixed or random times.
+
+    The strategy of `input_text` actions is given by the action's `strategy` arg, or picked by `input_text_policy`,
+    or otherwise defaults to the humanlike typing.
+
+    If `use_html_snapshot_store` is True, the HTML snapshots before actions are recorded into a delta-encoded
+    `HtmlSnapshotStore` instead of one full HTML file per action; otherwise, if `compress_html` is True, the HTML files
+    are gzip-compressed. Recordings are written in the background with up to `max_record_queue_size` captures pending
+    (see `ActionRecordWriter`).
+
+    With `screenshot_mode` being `ScreenshotModes.ELEMENT`, only a padded clip around the target element is captured,
+    in `screenshot_format` ('png', 'jpeg' or 'webp') with `screenshot_quality`; `screenshot_format` applies to this mode only.
+    If `dedup_screenshots` is True, screenshots looking the same as the previous one are not written.
+
+    If `cond_timeout` is specified, `init_cond` is waited for up to `cond_timeout` seconds by a MutationObserver
+    in the page (see `wait_for_element_conditions`) instead of being checked once; `repeat_when` is waited for likewise
+    up to `repeat_cond_timeout` seconds. `repeat_when` has its own timeout because it is expected to turn false
+    at the end of a loop (e.g. no next page), where waiting costs the full timeout; leave `repeat_cond_timeout`
+    unspecified, or keep it short, unless the next iteration's elements load slowly. An action's own `cond` and
+    `repeat_when` are waited for likewise with its `cond_timeout` and `repeat_cond_timeout` fields.
+    """
+    execute_task_plan(
+        driver=driver,
+        plan=compile_task_plan(
+            actions=actions,
+            init_cond=init_cond,
+            repeat=repeat,
+            repeat_when=repeat_when,
+            elements_dict=elements_dict,
+            cond_timeout=cond_timeout,
+            repeat_cond_timeout=repeat_cond_timeout
+        ),
+        elements_dict=elements_dict,
+        output_path_action_records=output_path_action_records,
+        quiet_window=quiet_window,
+        input_text_policy=input_text_policy,
+        use_html_snapshot_store=use_html_snapshot_store,
+        screenshot_mode=screenshot_mode,
+        screenshot_format=screenshot_format,
+        screenshot_quality=screenshot_quality,
+        dedup_screenshots=dedup_screenshots,
+        compress_html=compress_html,
+        max_record_queue_size=max_record_queue_size,
+        **kwargs
+    )
+
+
+def execute_task_plan(
+        driver: WebDriver,
+        plan: TaskPlan,
+        elements_dict: ElementDict = None,
+        output_path_action_records: str = None,
+        **kwargs
+):
+    """
+    Executes a task compiled by `compile_task_plan`; no field is read, no target classified or parsed and no condition
+    compiled during the execution, which does only the browser work. `kwargs` are the execution options
+    of `execute_actions`, overriding the options of the plan.
+    """
+    kwargs = {**plan.options, **kwargs}
+    repeat = _get_repeat(
+        driver, plan.repeat, plan.repeat_when, plan.init_cond, plan.cond_timeout, plan.repeat_cond_timeout,
+        elements_dict=elements_dict, **kwargs
     )
 
     while repeat:
         _execute_actions(
             driver=driver,
-            actions=actions,
+            actions=plan.actions,
             elements_dict=elements_dict,
             output_path_action_records=(
                 None if output_path_action_records is None
@@ -0,0 +1,253 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.remote.webelement import WebElement
+
+LAYOUT_FLAG_VISIBLE = 1
+LAYOUT_FLAG_CLICKABLE = 2
+LAYOUT_FLAG_RECEIVES_POINTER = 4
+
+# Collects the bounding boxes (in document coordinates), flags and approximate stacking levels of all elements
+# of the body in one pass, column by column, and keeps the elements in the page to map snapshot ids back to them,
+# under a token unique to the snapshot (a later snapshot replaces the kept elements; see `GET_LAYOUT_ELEMENT_SCRIPT`).
+GET_LAYOUT_SCRIPT = r"""
+var CLICKABLE_TAGS = {'a': 1, 'button': 1, 'input': 1, 'select': 1, 'textarea': 1, 'summary': 1, 'option': 1, 'label': 1};
+var CLICKABLE_ROLES = {
+    'button': 1, 'link': 1, 'checkbox': 1, 'radio': 1, 'switch': 1, 'tab': 1, 'menuitem': 1,
+    'option': 1, 'combobox': 1, 'textbox': 1, 'searchbox': 1, 'treeitem': 1
+};
+
+var elements = [document.body];
+Array.prototype.push.apply(elements, document.body.getElementsByTagName('*'));
+var scrollX = window.scrollX, scrollY = window.scrollY;
+var boxes = new Array(elements.length * 4), flags = new Array(elements.length);
+var levels = new Array(elements.length), tags = new Array(elements.length);
+var positions = new Map();
+
+for (var i = 0; i < elements.length; i++) {
+    var element = elements[i];
+    positions.set(element, i);
+    var rect = element.getBoundingClientRect();
+    var style = window.getComputedStyle(element);
+    var tag = element.tagName.toLowerCase();
+    boxes[i * 4] = rect.left + scrollX;
+    boxes[i * 4 + 1] = rect.top + scrollY;
+    boxes[i * 4 + 2] = rect.right + scrollX;
+    boxes[i * 4 + 3] = rect.bottom + scrollY;
+
+    var flag = 0;
+    if (rect.width > 0 && rect.height > 0 && style.display !== 'none' && style.visibility !== 'hidden') flag |= 1;
+    var role = element.getAttribute('role');
+    if (CLICKABLE_TAGS[tag] || (role && CLICKABLE_ROLES[role]) || element.hasAttribute('onclick')
+            || style.cursor === 'pointer' || element.isContentEditable) flag |= 2;
+    if (style.pointerEvents !== 'none') flag |= 4;
+    flags[i] = flag;
+
+    // a positioned element with a z-index starts a new level, other elements stay on the level of their parent
+    var parentPosition = positions.get(element.parentElement);
+    var level = parentPosition === undefined ? 0 : levels[parentPosition];
+    if (style.position !== 'static' && style.zIndex !== 'auto') level = parseInt(style.zIndex, 10) || 0;
+    levels[i] = level;
+    tags[i] = tag;
+}
+
+var token = Date.now().toString(36) + '-' + Math.random().toString(36).substring(2);
+window.__bobaLayoutSnapshot = {token: token, elements: elements};
+return {
+    token: token, boxes: boxes, flags: flags, levels: levels, tags: tags,
+    scroll: [scrollX, scrollY], viewport: [window.innerWidth, window.innerHeight]
+};
+"""
+
+# Returns the element `arguments[1]` kept by the snapshot of token `arguments[0]`, or null if a later snapshot
+# (or a navigation) replaced it.
+GET_LAYOUT_ELEMENT_SCRIPT = """
+var snapshot = window.__bobaLayoutSnapshot;
+if (!snapshot || snapshot.token !== arguments[0]) return null;
+return snapshot.elements[arguments[1]] || null;
+"""
+
+
+class LayoutSnapshot:
+    """
+    A snapshot of the layout of all elements of the page body taken by one script call (see `get_layout_snapshot`),
+    with a uniform grid index over the bounding boxes, so that geometric queries are answered locally.
+
+    Elements are identified by their document order (0 is the body). Boxes are `[x0, y0, x1, y1]` in document
+    coordinates. The stacking order is approximated by the z-index of the nearest positioned ancestor-or-self
+    with one, then the document order (a later element paints over an earlier one at the same level).
+
+    Examples:
+        >>> snapshot = LayoutSnapshot(
+        ...     boxes=[[0, 0, 800, 600], [10, 10, 110, 40], [0, 0, 800, 600], [300, 200, 500, 260]],
+        ...     flags=[5, 7, 5, 7],
+        ...     levels=[0, 0, 10, 10],
+        ...     tags=['body', 'button', 'div', 'a']
+        ... )
+        >>> snapshot.elements_at(50, 20)
+        [2, 1, 0]
+        >>> snapshot.element_at(400, 230)
+        3
+        >>> snapshot.elements_in_region(0, 0, 200, 100, fully_contained=True)
+        [1]
+        >>> snapshot.nearest_clickable(130, 25)
+        1
+    """
+
+    def __init__(
+            self,
+            boxes,
+            flags,
+            levels,
+            tags: List[str],
+            scroll: Tuple[float, float] = (0, 0),
+            viewport: Tuple[int, int] = None,
+            cell_size: int = 128,
+            token: str = None
+    ):
+        """
+        Args:
+            boxes: The `[x0, y0, x1, y1]` bounding boxes of the elements in document coordinates.
+            flags: The bitwise combinations of `LAYOUT_FLAG_VISIBLE`, `LAYOUT_FLAG_CLICKABLE` and
+                `LAYOUT_FLAG_RECEIVES_POINTER` of the elements.
+            levels: The stacking levels (effective z-indexes) of the elements.
+            tags: The tag names of the elements.
+            scroll: The scroll position of the window when the snapshot was taken.
+            viewport: The viewport size when the snapshot was taken.
+            cell_size: The size in pixels of the cells of the grid index.
+            token: The token of the snapshot in the page, to map element ids back to the elements (see `get_element`);
+                None for a snapshot not taken from a page.
+        """
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        flags = np.asarray(flags, dtype=np.int32)
+        self.visible = (flags & LAYOUT_FLAG_VISIBLE) != 0
+        self.clickable = (flags & LAYOUT_FLAG_CLICKABLE) != 0
+        self.receives_pointer = (flags & LAYOUT_FLAG_RECEIVES_POINTER) != 0
+        self.levels = np.asarray(levels, dtype=np.int64)
+        self.tags = tags
+        self.scroll = tuple(scroll)
+        self.viewport = None if viewport is None else tuple(viewport)
+        self.cell_size = cell_size
+        self.token = token
+
+        # rank of the elements from bottom to top, by stacking level then document order
+        self.stacking_ranks = np.empty(len(self.boxes), dtype=np.int64)
+        self.stacking_ranks[np.lexsort((np.arange(len(self.boxes)), self.levels))] = np.arange(len(self.boxes))
+
+        self._clickable_ids = np.flatnonzero(self.visible & self.clickable)
+        self._build_grid()
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def _build_grid(self):
+        """Indexes each visible element in the grid cells its box overlaps."""
+        cells = {}
+        ids = np.flatnonzero(self.visible)
+        cell_ranges = np.floor(self.boxes[ids] / self.cell_size).astype(np.int64)
+        for element_id, (cx0, cy0, cx1, cy1) in zip(ids.tolist(), cell_ranges.tolist()):
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    cell = cells.get((cx, cy))
+                    if cell is None:
+                        cells[(cx, cy)] = [element_id]
+                    else:
+                        cell.append(element_id)
+        self._grid = {cell: np.asarray(element_ids, dtype=np.int64) for cell, element_ids in cells.items()}
+
+    def _sort_top_first(self, ids: np.ndarray) -> List[int]:
+        return ids[np.argsort(-self.stacking_ranks[ids], kind='stable')].tolist()
+
+    def elements_at(self, x: float, y: float, receiving_pointer_only: bool = False) -> List[int]:
+        """Returns the visible elements whose boxes contain the point in document coordinates, topmost first."""
+        ids = self._grid.get((int(x // self.cell_size), int(y // self.cell_size)))
+        if ids is None:
+            return []
+        boxes = self.boxes[ids]
+        mask = (boxes[:, 0] <= x) & (x <= boxes[:, 2]) & (boxes[:, 1] <= y) & (y <= boxes[:, 3])
+        if receiving_pointer_only:
+            mask &= self.receives_pointer[ids]
+        return self._sort_top_first(ids[mask])
+
+    def element_at(self, x: float, y: float) -> Optional[int]:
+        """Returns the topmost visible element at the point receiving pointer events, like `document.elementFromPoint`."""
+        ids = self.elements_at(x, y, receiving_pointer_only=True)
+        return ids[0] if ids else None
+
+    def elements_in_region(self, x0: float, y0: float, x1: float, y1: float, fully_contained: bool = False) -> List[int]:
+        """Returns the visible elements overlapping (or if `fully_contained`, inside) the region, in document order."""
+        cell_size = self.cell_size
+        candidates = [
+            self._grid[cell]
+            for cell in (
+                (cx, cy)
+                for cx in range(int(x0 // cell_size), int(x1 // cell_size) + 1)
+                for cy in range(int(y0 // cell_size), int(y1 // cell_size) + 1)
+            )
+            if cell in self._grid
+        ]
+        if not candidates:
+            return []
+        ids = np.unique(np.concatenate(candidates))
+        boxes = self.boxes[ids]
+        if fully_contained:
+            mask = (boxes[:, 0] >= x0) & (boxes[:, 2] <= x1) & (boxes[:, 1] >= y0) & (boxes[:, 3] <= y1)
+        else:
+            mask = (boxes[:, 0] <= x1) & (boxes[:, 2] >= x0) & (boxes[:, 1] <= y1) & (boxes[:, 3] >= y0)
+        return ids[mask].tolist()
+
+    def nearest_clickable(self, x: float, y: float, max_distance: float = None) -> Optional[int]:
+        """
+        Returns the visible clickable element nearest to the point (distance 0 if its box contains the point,
+        preferring the topmost one), or None if there is none within `max_distance`.
+        """
+        ids = self._clickable_ids
+        if len(ids) == 0:
+            return None
+        boxes = self.boxes[ids]
+        dx = np.maximum(np.maximum(boxes[:, 0] - x, x - boxes[:, 2]), 0)
+        dy = np.maximum(np.maximum(boxes[:, 1] - y, y - boxes[:, 3]), 0)
+        distances = np.hypot(dx, dy)
+        nearest = np.flatnonzero(distances == distances.min())
+        if max_distance is not None and distances[nearest[0]] > max_distance:
+            return None
+        return self._sort_top_first(ids[nearest])[0]
+
+    def get_center(self, element_id: int) -> Tuple[float, float]:
+        """Returns the center of the element's box in document coordinates."""
+        x0, y0, x1, y1 = self.boxes[element_id].tolist()
+        return (x0 + x1) / 2, (y0 + y1) / 2
+
+    def get_element(self, driver: WebDriver, element_id: int) -> Optional[WebElement]:
+        """
+        Returns the live element of `element_id` kept in the page when this snapshot was taken;
+        returns None if the page only keeps the elements of a later snapshot (or navigated since),
+        as the element ids of this snapshot would then refer to other elements.
+        """
+        if self.token is None:
+            return None
+        return driver.execute_script(GET_LAYOUT_ELEMENT_SCRIPT, self.token, element_id)
+
+
+def get_layout_snapshot(driver: WebDriver, cell_size: int = 128) -> LayoutSnapshot:
+    """
+    Takes a `LayoutSnapshot` of all elements of the page body with one `execute_script` call,
+    instead of querying the geometry element by element over the WebDriver connection.
+
+    Examples:
+        >>> snapshot = get_layout_snapshot(driver)  # doctest: +SKIP
+        >>> snapshot.tags[snapshot.element_at(400, 230)]  # doctest: +SKIP
+        'button'
+    """
+    layout = driver.execute_script(GET_LAYOUT_SCRIPT)
+    return LayoutSnapshot(
+        boxes=layout['boxes'],
+        flags=layout['flags'],
+        levels=layout['levels'],
+        tags=layout['tags'],
+        scroll=layout['scroll'],
+        viewport=layout['viewport'],
+        cell_size=cell_size,
+        token=layout['token']
+    )
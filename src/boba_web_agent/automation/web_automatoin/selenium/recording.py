@@ -0,0 +1,222 @@
+import base64
+import gzip
+import hashlib
+import json
+import threading
+from io import BytesIO
+from os import path, makedirs
+from queue import Queue
+from typing import Mapping, Optional
+from urllib.parse import urlsplit
+
+from boba_web_agent.automation.web_automatoin.html_snapshot_store import HtmlSnapshotStore
+
+ACTION_RECORDS_FILE_NAME = 'action_records.jsonl'
+HTML_SNAPSHOT_STORE_DIR_NAME = 'html_snapshots'
+SCREENSHOT_DUPLICATES_FILE_NAME = 'screenshot_duplicates.jsonl'
+
+_RECORD_ITEM_TYPE_HTML = 'html'
+_RECORD_ITEM_TYPE_SCREENSHOT = 'screenshot'
+
+
+def get_html_snapshot_page_key(url: str) -> str:
+    """
+    Returns the key of the page at `url` for `HtmlSnapshotStore.put`, i.e. the URL without its query and fragment,
+    so that the snapshots of a page (e.g. of its results for different queries) share a base snapshot.
+
+    Examples:
+        >>> get_html_snapshot_page_key('https://www.example.com/search?q=hotels#results')
+        'https://www.example.com/search'
+    """
+    parts = urlsplit(url)
+    return f'{parts.scheme}://{parts.netloc}{parts.path}'
+
+
+def compute_image_difference_hash(image_data: bytes, hash_size: int = 8) -> Optional[int]:
+    """
+    Computes the difference hash (dHash) of an image, a perceptual hash robust to small rendering differences
+    and re-encoding. Requires `Pillow`; returns None if it is not installed.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    image = Image.open(BytesIO(image_data)).convert('L').resize((hash_size + 1, hash_size))
+    pixels = list(image.getdata())
+    image_hash = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            image_hash = (image_hash << 1) | int(left > right)
+    return image_hash
+
+
+class ActionRecordWriter:
+    """
+    Writes action recordings (HTML snapshots, screenshots and action records) in a background thread,
+    so that the browser does not sit idle while recordings are encoded, compressed and written.
+
+    Captures are handed over as raw data (HTML strings, base64 screenshot data from the browser)
+    to a bounded queue; the capturing side only blocks when `max_queue_size` items are pending.
+    An action record is appended to `action_records.jsonl` and flushed on the caller's thread, once the captures
+    queued before it are written; the captures of an action are written while the action runs, so this wait is
+    usually short. A crash therefore loses at most the recordings of the action in flight.
+
+    Examples:
+        >>> with ActionRecordWriter('recordings/turn_1') as writer:  # doctest: +SKIP
+        ...     writer.write_html('action_0/html_before_action-target_0-repeat_0.html', html)
+        ...     writer.write_screenshot('action_0/screenshot_before_action-target_0-repeat_0.png', screenshot_base64)
+        ...     writer.append_action_record({'action_index': 0})
+    """
+
+    def __init__(
+            self,
+            output_path: str,
+            max_queue_size: int = 4,
+            compress_html: bool = False,
+            use_html_snapshot_store: bool = False,
+            dedup_screenshots: bool = False,
+            max_screenshot_hash_distance: int = 0
+    ):
+        """
+        Args:
+            output_path: The root directory of the recordings.
+            max_queue_size: The maximum number of captures pending to be written.
+            compress_html: True to write HTML snapshots gzip-compressed, with an extra '.gz' file extension.
+            use_html_snapshot_store: True to write HTML snapshots into a delta-encoded `HtmlSnapshotStore`
+                under `<output_path>/html_snapshots`, named by their relative paths, instead of individual files.
+            dedup_screenshots: True to skip writing a screenshot that looks the same as the previous one,
+                i.e. their perceptual hashes (see `compute_image_difference_hash`) differ in at most
+                `max_screenshot_hash_distance` bits; skipped screenshots are listed in `screenshot_duplicates.jsonl`.
+                Without `Pillow`, only byte-identical screenshots are skipped.
+            max_screenshot_hash_distance: See `dedup_screenshots`.
+        """
+        self.output_path = output_path
+        self.compress_html = compress_html
+        self.html_snapshot_store = (
+            HtmlSnapshotStore(path.join(output_path, HTML_SNAPSHOT_STORE_DIR_NAME))
+            if use_html_snapshot_store else None
+        )
+        self._queue = Queue(maxsize=max_queue_size)
+        self.dedup_screenshots = dedup_screenshots
+        self.max_screenshot_hash_distance = max_screenshot_hash_distance
+        self._last_screenshot = None
+        self._error: Optional[Exception] = None
+        self._action_records_file = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _get_output_path(self, relative_path: str) -> str:
+        output_path = path.join(self.output_path, relative_path)
+        makedirs(path.dirname(output_path), exist_ok=True)
+        return output_path
+
+    def _write(self, item_type: str, relative_path: Optional[str], data):
+        if item_type == _RECORD_ITEM_TYPE_HTML:
+            data, page_key = data
+            if self.html_snapshot_store is not None:
+                self.html_snapshot_store.put(relative_path, data, page_key=page_key)
+                return
+            data = data.encode('utf-8')
+            if self.compress_html:
+                with gzip.open(self._get_output_path(relative_path + '.gz'), 'wb') as f:
+                    f.write(data)
+                return
+            with open(self._get_output_path(relative_path), 'wb') as f:
+                f.write(data)
+        elif item_type == _RECORD_ITEM_TYPE_SCREENSHOT:
+            if isinstance(data, str):
+                data = base64.b64decode(data)
+            if self.dedup_screenshots and self._is_duplicate_screenshot(relative_path, data):
+                return
+            with open(self._get_output_path(relative_path), 'wb') as f:
+                f.write(data)
+
+    def _is_duplicate_screenshot(self, relative_path: str, data: bytes) -> bool:
+        image_hash = compute_image_difference_hash(data)
+        if image_hash is None:
+            image_hash = hashlib.sha1(data).hexdigest()
+
+        if self._last_screenshot is not None:
+            last_relative_path, last_image_hash = self._last_screenshot
+            if isinstance(image_hash, int):
+                is_duplicate = bin(image_hash ^ last_image_hash).count('1') <= self.max_screenshot_hash_distance
+            else:
+                is_duplicate = image_hash == last_image_hash
+            if is_duplicate:
+                with open(self._get_output_path(SCREENSHOT_DUPLICATES_FILE_NAME), 'a') as f:
+                    f.write(json.dumps({'screenshot': relative_path, 'duplicate_of': last_relative_path}) + '\n')
+                return True
+
+        self._last_screenshot = (relative_path, image_hash)
+        return False
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            try:
+                self._write(*item)
+            except Exception as error:
+                if self._error is None:
+                    self._error = error
+            finally:
+                self._queue.task_done()
+
+    def _put(self, item_type: str, relative_path: Optional[str], data):
+        if self._error is not None:
+            raise self._error
+        self._queue.put((item_type, relative_path, data))
+
+    def write_html(self, relative_path: str, html: str, page_key: str = None):
+        """
+        Writes an HTML snapshot. With an `HtmlSnapshotStore`, `page_key` identifies the page of the snapshot
+        (see `get_html_snapshot_page_key`), so that it is delta-encoded against the base snapshot of the same page.
+        """
+        self._put(_RECORD_ITEM_TYPE_HTML, relative_path, (html, page_key))
+
+    def write_screenshot(self, relative_path: str, screenshot):
+        """Writes a screenshot given as raw PNG bytes or base64-encoded data."""
+        self._put(_RECORD_ITEM_TYPE_SCREENSHOT, relative_path, screenshot)
+
+    def append_action_record(self, action_record: Mapping):
+        """
+        Appends an action record after the captures queued before it are written, and flushes it,
+        so that a written record never refers to captures lost in a crash.
+        """
+        self._queue.join()
+        if self._error is not None:
+            raise self._error
+        if self._action_records_file is None:
+            self._action_records_file = open(self._get_output_path(ACTION_RECORDS_FILE_NAME), 'w')
+        self._action_records_file.write(json.dumps(action_record) + '\n')
+        self._action_records_file.flush()
+
+    @property
+    def error(self) -> Optional[Exception]:
+        """The first error occurred in writing, if any."""
+        return self._error
+
+    def close(self, raise_error: bool = True):
+        """
+        Waits for all pending captures to be written; raises the first error occurred in writing, if any,
+        unless `raise_error` is False (e.g. when another error is already propagating; see `error`).
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self._action_records_file is not None:
+            self._action_records_file.close()
+            self._action_records_file = None
+        if raise_error and self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close(raise_error=exc_type is None)
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import tempfile
+from functools import lru_cache
+from os import path
+from typing import Optional, Mapping, Sequence, Any
+
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.remote.webelement import WebElement
+
+from boba_python_utils.path_utils.common import ensure_dir_existence
+from boba_web_agent.automation.web_automatoin.html_utils import get_tag_text_and_attributes_from_element_html
+
+LEARN_SELECTOR_SCRIPT = """
+    var element = arguments[0];
+
+    function isUnique(selector) {
+        try {
+            return document.querySelectorAll(selector).length === 1;
+        } catch (e) {
+            return false;
+        }
+    }
+
+    var selectorType = null;
+    var selector = null;
+    if (element.id && isUnique('#' + CSS.escape(element.id))) {
+        selectorType = 'id';
+        selector = element.id;
+    } else {
+        var parts = [];
+        var node = element;
+        while (node && node.nodeType === Node.ELEMENT_NODE) {
+            if (node !== element && node.id && isUnique('#' + CSS.escape(node.id))) {
+                parts.unshift('#' + CSS.escape(node.id));
+                break;
+            }
+            var part = node.tagName.toLowerCase();
+            var parent = node.parentElement;
+            if (parent) {
+                var index = 1;
+                for (var sibling = node.previousElementSibling; sibling; sibling = sibling.previousElementSibling) {
+                    if (sibling.tagName === node.tagName) {
+                        index++;
+                    }
+                }
+                part += ':nth-of-type(' + index + ')';
+            }
+            parts.unshift(part);
+            node = parent;
+        }
+        selectorType = 'css';
+        selector = parts.join(' > ');
+    }
+    return {origin: window.location.origin, selector_type: selectorType, selector: selector, tag: element.tagName.toLowerCase()};
+"""
+
+# a unique element of the expected tag is only a hit if it also has the text and the identifying attributes
+# of the target (see `get_target_fingerprint`); on dynamic pages a learned path (e.g. with `:nth-of-type`)
+# can point at another element of the same tag
+FIND_BY_LEARNED_SELECTOR_SCRIPT = r"""
+    var entries = arguments[0];
+    var fingerprint = arguments[1];
+    var entry = entries[window.location.origin];
+    if (!entry) {
+        return {origin: window.location.origin, found: false, element: null};
+    }
+    var elements = [];
+    try {
+        if (entry.selector_type === 'id') {
+            var element = document.getElementById(entry.selector);
+            if (element) {
+                elements.push(element);
+            }
+        } else {
+            elements = document.querySelectorAll(entry.selector);
+        }
+    } catch (e) {
+        elements = [];
+    }
+    function isTarget(element) {
+        if (fingerprint.text && element.textContent.replace(/\s+/g, '').indexOf(fingerprint.text) === -1) {
+            return false;
+        }
+        return fingerprint.attributes.every(function (attribute) {
+            var value = element.getAttribute(attribute[0]);
+            if (value === null) {
+                return false;
+            }
+            var values = value.trim().split(/\s+/);
+            return attribute[1].every(function (targetValue) { return values.indexOf(targetValue) !== -1; });
+        });
+    }
+    if (elements.length === 1 && elements[0].tagName.toLowerCase() === entry.tag && isTarget(elements[0])) {
+        return {origin: window.location.origin, found: true, element: elements[0]};
+    }
+    return {origin: window.location.origin, found: true, element: null};
+"""
+
+
+def get_element_html_hash(element_html: str) -> str:
+    return hashlib.sha1(element_html.encode('utf-8')).hexdigest()
+
+
+@lru_cache(maxsize=1024)
+def _get_target_fingerprint(target_element_html: str, identifying_attributes: Sequence[str]) -> Mapping[str, Any]:
+    _, text, attributes = get_tag_text_and_attributes_from_element_html(target_element_html)
+    return {
+        'text': ''.join((text or '').split()),
+        'attributes': [
+            [attr, (attributes[attr].split() if isinstance(attributes[attr], str) else list(attributes[attr]))]
+            for attr in identifying_attributes if attr in attributes
+        ]
+    }
+
+
+def get_target_fingerprint(target_element_html: str, identifying_attributes=('id', 'aria-label', 'class')) -> Mapping[str, Any]:
+    """
+    Returns what an element found by a learned selector must have to be the target of `target_element_html`:
+    the target's text with whitespace removed (contained in the element's text), and the values of its
+    identifying attributes (all contained in the element's attribute values).
+
+    Examples:
+        >>> get_target_fingerprint('<a class="result-link x" href="/f/1">Seattle  to Paris</a>')
+        {'text': 'SeattletoParis', 'attributes': [['class', ['result-link', 'x']]]}
+    """
+    return _get_target_fingerprint(target_element_html, tuple(identifying_attributes))
+
+
+class LearnedSelectorCache:
+    """
+    An on-disk cache from HTML-snippet targets to fast selectors learned after a successful resolution.
+
+    Entries are keyed by the hash of the target HTML snippet and the origin of the page where the target
+    was resolved. Each entry stores either the element id (if unique on the page) or a unique CSS path.
+    Both the lookup and the learning step take a single `execute_script` round trip.
+
+    Examples:
+        >>> cache = LearnedSelectorCache('selector_cache.json')
+        >>> element = find_element_by_html(driver, target_html, selector_cache=cache)  # doctest: +SKIP
+        >>> cache.stats  # doctest: +SKIP
+        {'hits': 0, 'misses': 1, 'invalidations': 0}
+    """
+
+    def __init__(self, cache_path: str = None, autosave: bool = True, identifying_attributes=('id', 'aria-label', 'class')):
+        """
+        Args:
+            cache_path: The json file to persist the learned selectors; if None, the cache lives in memory only.
+            autosave: True to write the cache file whenever an entry is learned or invalidated.
+            identifying_attributes: The attributes of the target an element found by a learned selector must have
+                (see `get_target_fingerprint`).
+        """
+        self.cache_path = cache_path
+        self.autosave = autosave
+        self.identifying_attributes = tuple(identifying_attributes)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = {}
+        if cache_path and path.exists(cache_path):
+            try:
+                with open(cache_path) as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                # an unreadable or corrupt cache file (e.g. written by an older version non-atomically)
+                # only costs relearning the selectors; it is overwritten by the next save
+                pass
+
+    @property
+    def stats(self) -> Mapping[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations
+        }
+
+    def __len__(self):
+        return sum(len(entries_by_origin) for entries_by_origin in self._entries.values())
+
+    def find_element(self, driver: WebDriver, target_element_html: str) -> Optional[WebElement]:
+        """
+        Tries the learned selector of the target on the current page.
+
+        Returns:
+            The element if the learned selector resolves to exactly one element of the expected tag,
+            with the text and identifying attributes of the target; otherwise None,
+            in which case the caller should fall back to full matching.
+        """
+        target_hash = get_element_html_hash(target_element_html)
+        entries_by_origin = self._entries.get(target_hash, None)
+        if not entries_by_origin:
+            self.misses += 1
+            return None
+
+        result = driver.execute_script(
+            FIND_BY_LEARNED_SELECTOR_SCRIPT,
+            entries_by_origin,
+            get_target_fingerprint(target_element_html, self.identifying_attributes)
+        )
+        if not result['found']:
+            self.misses += 1
+            return None
+        if result['element'] is None:
+            # the page has changed since the selector was learned
+            self.invalidations += 1
+            del entries_by_origin[result['origin']]
+            if not entries_by_origin:
+                del self._entries[target_hash]
+            if self.autosave:
+                self.save()
+            return None
+
+        self.hits += 1
+        return result['element']
+
+    def learn(self, driver: WebDriver, target_element_html: str, element: WebElement):
+        """
+        Learns a fast selector for an element resolved from the target HTML snippet.
+        """
+        entry = driver.execute_script(LEARN_SELECTOR_SCRIPT, element)
+        origin = entry.pop('origin')
+        self._entries.setdefault(get_element_html_hash(target_element_html), {})[origin] = entry
+        if self.autosave:
+            self.save()
+
+    def clear(self):
+        self._entries.clear()
+        if self.autosave:
+            self.save()
+
+    def save(self, cache_path: str = None):
+        cache_path = cache_path or self.cache_path
+        if cache_path:
+            # written to a temporary file and moved in place, so that a crash or a parallel worker saving
+            # the same file never leaves it truncated
+            cache_dir = path.dirname(cache_path)
+            if cache_dir:
+                ensure_dir_existence(cache_dir)
+            with tempfile.NamedTemporaryFile('w', dir=cache_dir or '.', suffix='.tmp', delete=False) as f:
+                json.dump(self._entries, f)
+            os.replace(f.name, cache_path)
@@ -0,0 +1,268 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from os import path
+from typing import Any, Mapping, NamedTuple, Optional, Sequence, Tuple, Union
+
+from boba_python_utils.common_utils import iter__
+from boba_python_utils.path_utils.common import ensure_dir_existence
+from boba_web_agent.automation.web_automatoin.constants.task_config import (
+    FIELD_NAME_TASK_CONFIG_ACTION_NAME,
+    FIELD_NAME_TASK_CONFIG_ACTION_TARGET,
+    FIELD_NAME_TASK_CONFIG_ACTION_ARGS,
+    FIELD_NAME_TASK_CONFIG_ACTION_INIT_COND,
+    FIELD_NAME_TASK_CONFIG_ACTION_REPEAT,
+    FIELD_NAME_TASK_CONFIG_ACTION_REPEAT_COND,
+    FIELD_NAME_TASK_CONFIG_ACTION_COND_TIMEOUT,
+    FIELD_NAME_TASK_CONFIG_ACTION_REPEAT_COND_TIMEOUT,
+    FIELD_NAME_TASK_CONFIG_ACTION_SCREENSHOT
+)
+from boba_web_agent.automation.web_automatoin.selenium.conditions import compile_element_conditions
+from boba_web_agent.automation.web_automatoin.selenium.element_selection import CompiledTarget, compile_target
+from boba_web_agent.automation.web_automatoin.selenium.types import ElementDict, ElementConditions
+
+# bumped whenever the plan classes change, so that plans cached on disk by an older version are not loaded
+TASK_PLAN_FORMAT_VERSION = 3
+
+ACTION_ARG_FALLBACK_POINT = 'fallback_point'
+
+# conditions compiled by `compile_element_conditions`; a bool for a constant condition, or None for no condition
+CompiledConditions = Union[None, bool, Sequence[Mapping[str, Any]]]
+# a compiled selector; an element name if the element is already resolved to elements; None for no target
+PlannedTarget = Union[None, str, CompiledTarget]
+
+
+class ActionPlan(NamedTuple):
+    """
+    An action of a task config with its fields read, its targets compiled (see `compile_target`),
+    its conditions compiled (see `compile_element_conditions`) and its defaults applied.
+    """
+    name: str
+    targets: Tuple[PlannedTarget, ...]
+    args: Optional[Mapping[str, Any]]
+    init_cond: CompiledConditions
+    repeat: int
+    repeat_when: CompiledConditions
+    cond_timeout: Optional[float]
+    repeat_cond_timeout: Optional[float]
+    screenshot: bool
+    fallback_point: Optional[Tuple[float, float]]
+
+
+class TaskPlan(NamedTuple):
+    """
+    A task config compiled by `compile_task_plan`, so that executing it (see `execute_task_plan`)
+    does only browser work. `options` are the other execution options of the task config, e.g. 'quiet_window'.
+    """
+    actions: Tuple[ActionPlan, ...]
+    init_cond: CompiledConditions
+    repeat: int
+    repeat_when: CompiledConditions
+    cond_timeout: Optional[float]
+    repeat_cond_timeout: Optional[float]
+    options: Mapping[str, Any]
+
+
+def get_target_label(target: PlannedTarget) -> Optional[str]:
+    """Returns the target of an action as written in the task config, i.e. the element name or the selector."""
+    if isinstance(target, CompiledTarget):
+        return target.selector if target.element_name is None else target.element_name
+    return target
+
+
+def _compile_target(target: Optional[str], elements_dict: ElementDict = None) -> PlannedTarget:
+    if target is None:
+        return None
+    if elements_dict is not None and target in elements_dict and not isinstance(elements_dict[target], str):
+        return target
+    return compile_target(target, elements_dict)
+
+
+def _compile_conditions(conditions: Union[bool, ElementConditions], elements_dict: ElementDict = None) -> CompiledConditions:
+    if conditions is None or isinstance(conditions, bool):
+        return conditions
+    return tuple(compile_element_conditions(conditions, elements_dict=elements_dict))
+
+
+def compile_action_plan(action: Mapping[str, Any], elements_dict: ElementDict = None) -> ActionPlan:
+    """
+    Compiles an action of a task config into an `ActionPlan`.
+
+    Examples:
+        >>> plan = compile_action_plan(
+        ...     {'name': 'click', 'target': ['search', '<button>Search</button>'], 'repeat_when': {'exists': 'next'}},
+        ...     elements_dict={'search': 'index:3'}
+        ... )
+        >>> [get_target_label(target) for target in plan.targets]
+        ['search', '<button>Search</button>']
+        >>> plan.targets[1].target_type, plan.targets[1].html_text
+        (<TargetTypes.HTML: 'html'>, 'Search')
+        >>> plan.repeat, plan.repeat_when[0]['exists']
+        (0, [{'type': 'id', 'value': 'next', 'single': False}])
+    """
+    name = action[FIELD_NAME_TASK_CONFIG_ACTION_NAME]
+    args = action.get(FIELD_NAME_TASK_CONFIG_ACTION_ARGS, None)
+    repeat_when = action.get(FIELD_NAME_TASK_CONFIG_ACTION_REPEAT_COND, None)
+    fallback_point = args.get(ACTION_ARG_FALLBACK_POINT, None) if (name == 'click' and args) else None
+    return ActionPlan(
+        name=name,
+        targets=tuple(
+            _compile_target(target, elements_dict)
+            for target in iter__(action.get(FIELD_NAME_TASK_CONFIG_ACTION_TARGET, None), iter_none=True)
+        ),
+        args=args,
+        init_cond=_compile_conditions(action.get(FIELD_NAME_TASK_CONFIG_ACTION_INIT_COND, None), elements_dict),
+        repeat=action.get(FIELD_NAME_TASK_CONFIG_ACTION_REPEAT, int(not bool(repeat_when))),
+        repeat_when=_compile_conditions(repeat_when, elements_dict),
+        cond_timeout=action.get(FIELD_NAME_TASK_CONFIG_ACTION_COND_TIMEOUT, None),
+        repeat_cond_timeout=action.get(FIELD_NAME_TASK_CONFIG_ACTION_REPEAT_COND_TIMEOUT, None),
+        screenshot=action.get(FIELD_NAME_TASK_CONFIG_ACTION_SCREENSHOT, True),
+        fallback_point=None if fallback_point is None else tuple(fallback_point)
+    )
+
+
+def compile_task_plan(
+        actions: Sequence[Mapping[str, Any]],
+        init_cond: Union[bool, ElementConditions] = None,
+        repeat: int = 0,
+        repeat_when: ElementConditions = None,
+        elements_dict: ElementDict = None,
+        cond_timeout: float = None,
+        repeat_cond_timeout: float = None,
+        **options
+) -> TaskPlan:
+    """
+    Compiles a task config, given by the same arguments as `execute_actions`, into a `TaskPlan`.
+
+    The field names of each action are read and its defaults applied once; its targets are classified, HTML snippets
+    parsed and element index selectors built once (see `compile_target`); and its conditions are compiled once into
+    the clauses evaluated in the page (see `compile_element_conditions`). Targets and conditions naming an element of
+    `elements_dict` are compiled with the element's selector, or only with the element's name if it is already resolved
+    to element handles, so that the plan holds no handle and can be cached and pickled; the elements themselves are
+    resolved at execution, through the registry if `elements_dict` is an `ElementRegistry`.
+
+    Raises:
+        ValueError: If a condition is not supported; see `compile_element_conditions`.
+    """
+    return TaskPlan(
+        actions=tuple(compile_action_plan(action, elements_dict) for action in actions),
+        init_cond=_compile_conditions(init_cond, elements_dict),
+        repeat=repeat,
+        repeat_when=_compile_conditions(repeat_when, elements_dict),
+        cond_timeout=cond_timeout,
+        repeat_cond_timeout=repeat_cond_timeout,
+        options=options
+    )
+
+
+def _encode_task_config_value(value):
+    # the hash must not change across runs, so no value is encoded by its `str` or `repr` (e.g. of a set, whose order
+    # changes with the string hash seed, or of an object, which includes its address)
+    if isinstance(value, (set, frozenset)):
+        return sorted(json.dumps(item, sort_keys=True, default=_encode_task_config_value) for item in value)
+    raise TypeError(f"the task config value {value!r} of type '{type(value).__name__}' cannot be hashed")
+
+
+def get_task_plan_hash(task_config: Mapping[str, Any], elements_dict: ElementDict = None) -> str:
+    """
+    Returns the hash identifying the plan of `task_config` with `elements_dict` (the selectors the plan is compiled
+    with), which changes with either of them and with `TASK_PLAN_FORMAT_VERSION`. Elements already resolved to
+    handles are compiled by their names only, so the handles do not change the hash.
+
+    Raises:
+        TypeError: If `task_config` has a value other than JSON values, tuples and sets.
+
+    Examples:
+        >>> get_task_plan_hash({'actions': [], 'tags': {'a', 'b', 'c'}}) == get_task_plan_hash({'actions': [], 'tags': {'c', 'b', 'a'}})
+        True
+    """
+    selectors = {
+        name: (selector if isinstance(selector, str) else None)
+        for name, selector in (elements_dict or {}).items()
+    }
+    return hashlib.sha1(
+        json.dumps(
+            [TASK_PLAN_FORMAT_VERSION, task_config, selectors],
+            sort_keys=True,
+            default=_encode_task_config_value
+        ).encode('utf-8')
+    ).hexdigest()
+
+
+class TaskPlanCache:
+    """
+    An on-disk cache of `TaskPlan`s keyed by the hash of the task config and the element selectors
+    (see `get_task_plan_hash`), so that an unchanged task config is not compiled again across runs.
+    Plans are pickled one file per hash under `cache_dir`; compiled plans are also kept in memory.
+
+    Examples:
+        >>> cache = TaskPlanCache('task_plans')  # doctest: +SKIP
+        >>> plan = cache.get_task_plan(task_config, elements_dict=registry)  # doctest: +SKIP
+        >>> cache.stats  # doctest: +SKIP
+        {'hits': 0, 'misses': 1}
+    """
+
+    def __init__(self, cache_dir: str = None):
+        """
+        Args:
+            cache_dir: The directory to persist the compiled plans; if None, the cache lives in memory only.
+        """
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._plans = {}
+
+    @property
+    def stats(self) -> Mapping[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+    def _get_plan_path(self, plan_hash: str) -> str:
+        return path.join(self.cache_dir, f'{plan_hash}.pkl')
+
+    def get_task_plan(self, task_config: Mapping[str, Any], elements_dict: ElementDict = None) -> TaskPlan:
+        """
+        Returns the cached plan of `task_config` with `elements_dict`, compiling and caching it on a miss.
+
+        Raises:
+            TypeError: If `task_config` cannot be hashed; see `get_task_plan_hash`.
+        """
+        plan_hash = get_task_plan_hash(task_config, elements_dict)
+        plan = self._plans.get(plan_hash, None)
+        if plan is None and self.cache_dir and path.exists(self._get_plan_path(plan_hash)):
+            try:
+                with open(self._get_plan_path(plan_hash), 'rb') as f:
+                    plan = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, AttributeError, EOFError, ImportError, TypeError):
+                # an unreadable or incompatible plan file is compiled again and overwritten
+                plan = None
+            if plan is not None:
+                self._plans[plan_hash] = plan
+
+        if plan is not None:
+            self.hits += 1
+            return plan
+
+        self.misses += 1
+        plan = compile_task_plan(elements_dict=elements_dict, **task_config)
+        self._plans[plan_hash] = plan
+        if self.cache_dir:
+            # written to a temporary file and moved in place, so that a failed or concurrent write
+            # never leaves a truncated plan file
+            ensure_dir_existence(self.cache_dir)
+            with tempfile.NamedTemporaryFile('wb', dir=self.cache_dir, suffix='.tmp', delete=False) as f:
+                try:
+                    pickle.dump(plan, f)
+                except BaseException:
+                    f.close()
+                    os.remove(f.name)
+                    raise
+            os.replace(f.name, self._get_plan_path(plan_hash))
+        return plan
+
+    def clear(self):
+        self._plans.clear()
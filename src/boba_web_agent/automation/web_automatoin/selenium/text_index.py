@@ -0,0 +1,230 @@
+from typing import Optional, Mapping, Any, List, Sequence
+
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.remote.webelement import WebElement
+
+# Defines `findElementsByText`, backed by a per-document index of the text nodes built once by a TreeWalker
+# and kept up to date by a MutationObserver (rebuilt instead if more than `MAX_PENDING_TEXT_INDEX_RECORDS`
+# mutation records pile up between lookups), so that a text lookup scans the text nodes once,
+# instead of computing the string value of every candidate element as `contains(., text)` in XPath does.
+TEXT_INDEX_FUNCTIONS = r"""
+var MAX_PENDING_TEXT_INDEX_RECORDS = 10000;
+var MAX_SPLIT_TEXT_NODES = 64;
+
+// as `normalize-space()` of XPath, which only treats spaces, tabs and line breaks as whitespace
+function normalizeText(text) {
+    return text.replace(/[ \t\r\n]+/g, ' ').replace(/^ | $/g, '');
+}
+
+function getTextIndex() {
+    var root = document.documentElement;
+    var index = window.__bobaTextIndex;
+    if (index && index.root === root && !index.overflow) {
+        if (index.pendingRecords.length) updateTextIndex(index);
+        return index;
+    }
+    if (index) index.observer.disconnect();
+
+    index = window.__bobaTextIndex = {root: root, texts: new Map(), pendingRecords: [], overflow: false};
+    addTextNodes(index, root);
+    index.observer = new MutationObserver(function (records) {
+        if (index.overflow) return;
+        Array.prototype.push.apply(index.pendingRecords, records);
+        // re-indexing the document is cheaper than replaying this many records, and the buffer stays bounded
+        if (index.pendingRecords.length > MAX_PENDING_TEXT_INDEX_RECORDS) {
+            index.pendingRecords = [];
+            index.overflow = true;
+        }
+    });
+    index.observer.observe(root, {childList: true, subtree: true, characterData: true});
+    return index;
+}
+
+function addTextNodes(index, node) {
+    if (node.nodeType === 3) {
+        index.texts.set(node, normalizeText(node.data));
+        return;
+    }
+    var walker = document.createTreeWalker(node, NodeFilter.SHOW_TEXT);
+    for (var textNode = walker.nextNode(); textNode; textNode = walker.nextNode()) {
+        index.texts.set(textNode, normalizeText(textNode.data));
+    }
+}
+
+function removeTextNodes(index, node) {
+    if (node.nodeType === 3) {
+        index.texts.delete(node);
+        return;
+    }
+    var walker = document.createTreeWalker(node, NodeFilter.SHOW_TEXT);
+    for (var textNode = walker.nextNode(); textNode; textNode = walker.nextNode()) {
+        index.texts.delete(textNode);
+    }
+}
+
+function updateTextIndex(index) {
+    var records = index.pendingRecords.concat(index.observer.takeRecords());
+    index.pendingRecords = [];
+    records.forEach(function (record) {
+        if (record.type === 'characterData') {
+            if (index.texts.has(record.target)) index.texts.set(record.target, normalizeText(record.target.data));
+            return;
+        }
+        record.removedNodes.forEach(function (node) { removeTextNodes(index, node); });
+        record.addedNodes.forEach(function (node) { if (node.isConnected) addTextNodes(index, node); });
+    });
+}
+
+function matchesElement(element, tagName, attributeConditions) {
+    if (tagName !== '*' && element.localName !== tagName) return false;
+    for (var i = 0; i < attributeConditions.length; i++) {
+        var value = element.getAttribute(attributeConditions[i][0]);
+        if (value === null) return false;
+        if (attributeConditions[i][2] ? value.indexOf(attributeConditions[i][1]) === -1 : value !== attributeConditions[i][1]) {
+            return false;
+        }
+    }
+    return true;
+}
+
+function endsWithPrefixOf(nodeText, text) {
+    for (var i = Math.max(0, nodeText.length - text.length + 1); i < nodeText.length; i++) {
+        if (nodeText.charCodeAt(i) === text.charCodeAt(0) && text.startsWith(nodeText.substring(i))) return true;
+    }
+    return false;
+}
+
+// Returns the lowest element whose string value contains `text` starting in `textNode` and spanning the text nodes
+// after it (e.g. 'Book <b>now</b>'), or null if the text nodes after it do not complete `text`.
+function findSplitTextElement(index, textNode, nodeText, text) {
+    var walker = document.createTreeWalker(index.root, NodeFilter.SHOW_TEXT);
+    walker.currentNode = textNode;
+    var data = textNode.data;
+    var maxLength = nodeText.length + text.length + 1;
+    for (var i = 0, next = walker.nextNode(); next && i < MAX_SPLIT_TEXT_NODES; i++, next = walker.nextNode()) {
+        data += next.data;
+        var normalizedData = normalizeText(data);
+        if (normalizedData.indexOf(text) !== -1) {
+            var range = document.createRange();
+            range.setStartBefore(textNode);
+            range.setEndAfter(next);
+            return range.commonAncestorContainer;
+        }
+        if (normalizedData.length > maxLength) break;
+    }
+    return null;
+}
+
+// Matches the string value of the elements as `contains(., text)` of XPath (or with `immediate`, the elements' own
+// text nodes): a text node containing `text` matches its ancestors, and one ending with a prefix of `text` matches
+// the ancestors of the text nodes that complete it.
+function collectElementsByText(index, text, immediate) {
+    text = normalizeText(text);
+    var elements = new Set();
+    function addAncestors(element) {
+        for (; element && !elements.has(element); element = element.parentElement) {
+            elements.add(element);
+            if (immediate) break;
+        }
+    }
+    index.texts.forEach(function (nodeText, textNode) {
+        if (!nodeText || !textNode.isConnected) return;
+        if (nodeText.indexOf(text) !== -1) {
+            addAncestors(textNode.parentElement);
+        } else if (!immediate && endsWithPrefixOf(nodeText, text)) {
+            var element = findSplitTextElement(index, textNode, nodeText, text);
+            if (element !== null) addAncestors(element);
+        }
+    });
+    return elements;
+}
+
+// Returns the elements whose text contains `text` and whose own text nodes contain `immediateText` (either can be
+// null), as `contains(normalize-space(.), text)` and `text()[contains(normalize-space(.), immediateText)]` of XPath
+// with `text` and `immediateText` normalized likewise, in document order.
+function findElementsByText(text, tagName, attributeConditions, immediateText) {
+    var index = getTextIndex();
+    tagName = (tagName || '*').toLowerCase();
+    attributeConditions = attributeConditions || [];
+    var containing = text ? collectElementsByText(index, text, false) : null;
+    if (immediateText) {
+        var immediateContaining = collectElementsByText(index, immediateText, true);
+        if (containing !== null) {
+            immediateContaining.forEach(function (element) {
+                if (!containing.has(element)) immediateContaining.delete(element);
+            });
+        }
+        containing = immediateContaining;
+    }
+    var elements = [];
+    containing.forEach(function (element) {
+        if (matchesElement(element, tagName, attributeConditions)) elements.push(element);
+    });
+    elements.sort(function (a, b) {
+        return a === b ? 0 : (a.compareDocumentPosition(b) & Node.DOCUMENT_POSITION_FOLLOWING ? -1 : 1);
+    });
+    return elements;
+}
+"""
+
+FIND_ELEMENTS_BY_TEXT_SCRIPT = TEXT_INDEX_FUNCTIONS + r"""
+return findElementsByText(arguments[0], arguments[1], arguments[2], arguments[3]);
+"""
+
+
+def get_attribute_conditions(attributes: Mapping[str, Any] = None) -> List[list]:
+    """
+    Converts attribute key-value pairs into the `[name, value, is_substring]` conditions of `findElementsByText`,
+    the same conditions `get_xpath` puts into an XPath.
+
+    Examples:
+        >>> get_attribute_conditions({'class': ['uitk-tab-anchor'], 'href': '/Flights'})
+        [['class', 'uitk-tab-anchor', True], ['href', '/Flights', False]]
+    """
+    conditions = []
+    if attributes:
+        for key, value in attributes.items():
+            if isinstance(value, str):
+                conditions.append([key, value, False])
+            elif isinstance(value, Sequence):
+                conditions.extend([key, str(v), True] for v in value)
+            else:
+                conditions.append([key, str(value), False])
+    return conditions
+
+
+def find_elements_by_text(
+        driver: WebDriver,
+        text: str = None,
+        tag_name: Optional[str] = '*',
+        attributes: Mapping[str, Any] = None,
+        immediate_text: str = None
+) -> List[WebElement]:
+    """
+    Finds the elements containing `text` and `immediate_text` by the page-side text index (see `TEXT_INDEX_FUNCTIONS`).
+
+    The index is built once per document by a TreeWalker over the text nodes, mapping each text node's
+    whitespace-normalized text to its parent element, and is refreshed incrementally from a MutationObserver,
+    so a lookup scans the text nodes once instead of evaluating `contains(., text)` on every candidate element.
+    An element matches if its text (the text of all its descendant text nodes) contains `text`, including a text split
+    over several text nodes (e.g. 'Book <b>Now</b>'), and one of its own text nodes contains `immediate_text`, both
+    with whitespace normalized on both sides as by `normalize-space()`; i.e. it matches the elements of the XPath
+    from `get_xpath(..., normalize_whitespace=True)`, so `text='Book now'` also matches 'Book\\n  now'.
+
+    Args:
+        driver: The Selenium WebDriver instance.
+        text: The text to search for in the elements, as of `text` of `get_xpath`.
+        tag_name: The tag name of the elements; '*' for any tag.
+        attributes: The attribute conditions of the elements, as of `get_xpath`.
+        immediate_text: The text to search for in the elements' own text nodes, as of `immediate_text` of `get_xpath`.
+
+    Returns:
+        The matched elements in document order.
+    """
+    return driver.execute_script(
+        FIND_ELEMENTS_BY_TEXT_SCRIPT,
+        text,
+        tag_name or '*',
+        get_attribute_conditions(attributes),
+        immediate_text
+    )
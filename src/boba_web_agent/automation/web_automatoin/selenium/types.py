@@ -2,6 +2,10 @@ from typing import Dict, Union, Sequence, Mapping
 
 from selenium.webdriver.remote.webelement import WebElement
 
-ElementDict = Dict[str, Union[str, Sequence[WebElement]]]
+from boba_web_agent.automation.web_automatoin.selenium.element_registry import ElementRegistry
+
+# a plain mapping from element names to selectors or resolved elements is still accepted for compatibility,
+# but caches resolved elements without noticing navigations; prefer `ElementRegistry`
+ElementDict = Union[ElementRegistry, Dict[str, Union[str, Sequence[WebElement]]]]
 ElementCondition = Mapping[str, Union[str, Sequence[str]]]
 ElementConditions = Union[ElementCondition, Sequence[ElementCondition]]
@@ -1,33 +1,47 @@
 from collections.abc import MutableMapping
-from typing import Mapping, Union
+from typing import Mapping, Optional, Union
 
 from boba_python_utils.io_utils.json_io import read_json
 from boba_web_agent.automation.web_automatoin.constants.task_config import FIELD_NAME_TASK_CONFIG_ELEMENTS, FIELD_NAME_TASK_CONFIG_TASKS
-from boba_web_agent.automation.web_automatoin.selenium.types import ElementDict
+from boba_web_agent.automation.web_automatoin.selenium.element_registry import ElementRegistry
+from boba_web_agent.automation.web_automatoin.selenium.task_plan import TaskPlan, TaskPlanCache
 from boba_web_agent.automation.web_automatoin.web_driver import WebDriver
 
 
 class TaskRuntime(MutableMapping):
-    def __init__(self, task_config: Union[str, Mapping]):
+    def __init__(self, task_config: Union[str, Mapping], plan_cache_dir: str = None):
+        """
+        Args:
+            task_config: The task config, or the path to its json file.
+            plan_cache_dir: The directory to cache the compiled task plans across runs (see `TaskPlanCache`);
+                if None, plans are only cached in memory.
+        """
         task_config: Mapping = read_json(task_config)
         self.tasks: Mapping = task_config[FIELD_NAME_TASK_CONFIG_TASKS]
-        self.elements: ElementDict = task_config[FIELD_NAME_TASK_CONFIG_ELEMENTS].copy()
+        self.elements = ElementRegistry(task_config[FIELD_NAME_TASK_CONFIG_ELEMENTS])
+        self.plan_cache = TaskPlanCache(plan_cache_dir)
 
     def get_task_config(self, task_name: str) -> Mapping:
         return self.tasks.get(task_name, None)
 
+    def get_task_plan(self, task_name: str) -> Optional[TaskPlan]:
+        """Returns the plan of the task compiled with the current element selectors (see `compile_task_plan`)."""
+        task_config = self.get_task_config(task_name)
+        if task_config:
+            return self.plan_cache.get_task_plan(task_config, elements_dict=self.elements)
+
     def execute_task(
             self,
             task_name: str,
             driver: WebDriver,
             output_path_action_records: str = None
     ):
-        task_config = self.get_task_config(task_name)
-        if task_config:
-            driver.execute_actions(
+        plan = self.get_task_plan(task_name)
+        if plan is not None:
+            driver.execute_task_plan(
+                plan,
                 elements_dict=self.elements,
-                output_path_action_records=output_path_action_records,
-                **task_config
+                output_path_action_records=output_path_action_records
             )
 
     # region exposing `elements` for `Mapping`
@@ -9,10 +9,8 @@ from selenium.webdriver.common.service import Service
 from selenium.webdriver.firefox.options import Options as FirefoxOptions
 from selenium.webdriver.firefox.service import Service as FirefoxService
 from selenium.webdriver.remote.webelement import WebElement
-from webdriver_manager.chrome import ChromeDriverManager
-from webdriver_manager.firefox import GeckoDriverManager
-from webdriver_manager.microsoft import EdgeChromiumDriverManager
 
+from boba_web_agent.automation.web_automatoin.driver_registry import DriverBinaryRegistry, get_default_driver_registry
 from boba_web_agent.automation.web_automatoin.selenium.types import ElementConditions, ElementDict
 
 DEFAULT_USER_AGENT_STRING = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
@@ -31,7 +29,9 @@ def get_driver(
         headless: bool = True,
         user_agent: str = None,
         timeout: int = 120,
-        options: List[str] = None
+        options: List[str] = None,
+        enable_network_tracking: bool = False,
+        driver_registry: DriverBinaryRegistry = None
 ) -> Union[
     webdriver.Firefox,
     webdriver.Chrome,
@@ -47,6 +47,10 @@ def get_driver(
         user_agent (bool, optional): If True, sets the browser's user-agent to a predefined default string. Default is True.
         timeout (int, optional): The time in seconds to wait for a page to be loaded before raising a timeout error. Default is 30 seconds.
         options (List[str], optional): Additional browser-specific options to be added to the browser on startup.
+        enable_network_tracking (bool, optional): If True, enables the performance log of Chrome-based drivers,
+            so that DevTools network events can be used to detect in-flight requests (see `wait_for_page_settle`).
+        driver_registry (DriverBinaryRegistry, optional): The registry to resolve the driver binaries for Firefox,
+            Chrome and Edge; the default on-disk registry is used if not specified.
 
     Returns:
         webdriver: An instance of a Selenium WebDriver configured for the specified browser with the provided options.
@@ -63,12 +67,15 @@ def get_driver(
         driver = get_driver(driver_type=WebAutomationDrivers.Chrome, options=custom_options)
     """
 
+    if driver_registry is None:
+        driver_registry = get_default_driver_registry()
+
     if driver_type == WebAutomationDrivers.Firefox:
-        webdriver_service = FirefoxService(GeckoDriverManager().install())
+        webdriver_service = FirefoxService(driver_registry.resolve(driver_type))
         _options = FirefoxOptions()
         driver_class = webdriver.Firefox
     elif driver_type == WebAutomationDrivers.Chrome:
-        webdriver_service = ChromeService(ChromeDriverManager(version='latest').install())
+        webdriver_service = ChromeService(driver_registry.resolve(driver_type))
         _options = ChromeOptions()
         driver_class = webdriver.Chrome
     elif driver_type == WebAutomationDrivers.UndetectedChrome:
@@ -76,7 +83,7 @@ def get_driver(
         _options = uc.ChromeOptions()
         driver_class = uc.Chrome
     elif driver_type == WebAutomationDrivers.Edge:
-        webdriver_service = Service(EdgeChromiumDriverManager().install())
+        webdriver_service = Service(driver_registry.resolve(driver_type))
         _options = ChromeOptions()  # Edge uses Chrome options
         driver_class = webdriver.Edge
     elif driver_type == WebAutomationDrivers.Safari:
@@ -90,6 +97,8 @@ def get_driver(
         _options.add_experimental_option("excludeSwitches", ["enable-automation"])
         _options.add_experimental_option('useAutomationExtension', False)
         _options.add_argument("--disable-blink-features=AutomationControlled")
+        if enable_network_tracking:
+            _options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
 
     if _options is not None:
         if headless:
@@ -125,7 +134,9 @@ class WebDriver:
                  headless: bool = True,
                  user_agent: str = None,
                  timeout: int = 120,
-                 options: List[str] = None):
+                 options: List[str] = None,
+                 enable_network_tracking: bool = False,
+                 driver_registry: DriverBinaryRegistry = None):
         """
         Initializes a WebDriver instance with the specified configuration upon creation of the class instance.
 
@@ -135,6 +146,9 @@ class WebDriver:
             user_agent (bool): Whether to use a default user-agent string. Default is True.
             timeout (int): The maximum time to wait for a page to load. Default is 30 seconds.
             options (List[str]): Additional browser-specific options to set. Default is None.
+            enable_network_tracking (bool): Whether to track in-flight network requests through the DevTools
+                performance log for page settle detection. Default is False.
+            driver_registry (DriverBinaryRegistry): The registry to resolve driver binaries. Default is the on-disk registry.
         """
 
         # Instantiate the driver using the provided configuration
@@ -143,7 +157,9 @@ class WebDriver:
             headless=headless,
             user_agent=user_agent,
             timeout=timeout,
-            options=options
+            options=options,
+            enable_network_tracking=enable_network_tracking,
+            driver_registry=driver_registry
         )
 
     def open_url(self, url: str = None, wait_after_opening_url: float = 0):
@@ -171,16 +187,90 @@ class WebDriver:
             return_dynamic_contents=return_dynamic_contents
         )
 
+    def get_clean_body_html(self, index_name: str = None, element=None, **clean_html_args) -> str:
+        """Cleans the body HTML inside the page, so that only the cleaned HTML is transferred; see `get_clean_body_html`."""
+        from boba_web_agent.automation.web_automatoin.selenium.common import get_clean_body_html
+        return get_clean_body_html(
+            driver=self.driver,
+            index_name=index_name,
+            element=element,
+            **clean_html_args
+        )
+
+    def build_page_observation(self, token_budget: int, element=None, **build_observation_args) -> str:
+        """Builds an observation of the current page fitting a token budget; see `build_page_observation`."""
+        from boba_web_agent.automation.web_automatoin.html_observation import build_page_observation
+        return build_page_observation(
+            driver=self.driver,
+            token_budget=token_budget,
+            element=element,
+            **build_observation_args
+        )
+
+    def get_body_html_changes(self, max_buffered_records: int = 5000, **clean_html_args) -> Mapping[str, Any]:
+        """Returns the cleaned changes of the body HTML since the previous call; see `get_body_html_changes`."""
+        from boba_web_agent.automation.web_automatoin.selenium.dom_changes import get_body_html_changes
+        return get_body_html_changes(
+            driver=self.driver,
+            max_buffered_records=max_buffered_records,
+            **clean_html_args
+        )
+
+    def index_interactive_elements(self, only_visible: bool = True, max_text_length: int = 80) -> List[Mapping[str, Any]]:
+        """Tags the interactive elements with stable indexes and returns their table; see `index_interactive_elements`."""
+        from boba_web_agent.automation.web_automatoin.selenium.element_index import index_interactive_elements
+        return index_interactive_elements(
+            driver=self.driver,
+            only_visible=only_visible,
+            max_text_length=max_text_length
+        )
+
+    def find_element_by_index(self, index) -> Optional[WebElement]:
+        from boba_web_agent.automation.web_automatoin.selenium.element_index import find_element_by_index
+        return find_element_by_index(driver=self.driver, index=index)
+
+    def get_accessibility_snapshot(self, source: str = None, max_name_length: int = 80) -> Mapping[str, Any]:
+        """Takes a compact role/name/value snapshot of the accessibility tree; see `get_accessibility_snapshot`."""
+        from boba_web_agent.automation.web_automatoin.selenium.accessibility import get_accessibility_snapshot
+        return get_accessibility_snapshot(driver=self.driver, source=source, max_name_length=max_name_length)
+
+    def find_element_by_accessibility_node_id(self, node_id: int, source: str) -> Optional[WebElement]:
+        from boba_web_agent.automation.web_automatoin.selenium.accessibility import find_element_by_accessibility_node_id
+        return find_element_by_accessibility_node_id(driver=self.driver, node_id=node_id, source=source)
+
+    def get_layout_snapshot(self, cell_size: int = 128):
+        """Takes a layout snapshot of all elements with a grid index for coordinate queries; see `LayoutSnapshot`."""
+        from boba_web_agent.automation.web_automatoin.selenium.layout import get_layout_snapshot
+        return get_layout_snapshot(driver=self.driver, cell_size=cell_size)
+
+    def click_at_point(self, x: float, y: float):
+        from boba_web_agent.automation.web_automatoin.selenium.actions import click_at_point
+        click_at_point(driver=self.driver, x=x, y=y)
+
     def get_element_html(self, element) -> str:
         from boba_web_agent.automation.web_automatoin.selenium.common import get_element_html
         return get_element_html(element=element)
 
-    def wait_for_page_loading(self, timeout: int = 30, extra_wait_min=1, extra_wait_max=5):
+    def wait_for_page_loading(self, timeout: int = 30, extra_wait_min=1, extra_wait_max=5, quiet_window: float = None):
+        """
+        Waits for the page to be loaded, then either waits for the page to settle if `quiet_window` is specified,
+        or otherwise sleeps for a random extra time between `extra_wait_min` and `extra_wait_max` seconds.
+        """
         from boba_web_agent.automation.web_automatoin.selenium.common import wait_for_page_loading
-        wait_for_page_loading(self.driver, timeout=timeout)
-        import random
-        from time import sleep
-        sleep(random.uniform(extra_wait_min, extra_wait_max))
+        wait_for_page_loading(self.driver, timeout=timeout, quiet_window=quiet_window)
+        if quiet_window is None:
+            import random
+            from time import sleep
+            sleep(random.uniform(extra_wait_min, extra_wait_max))
+
+    def wait_for_page_settle(self, quiet_window: float = 0.5, timeout: float = 20, max_inflight_requests: int = 0) -> bool:
+        from boba_web_agent.automation.web_automatoin.selenium.common import wait_for_page_settle
+        return wait_for_page_settle(
+            driver=self.driver,
+            quiet_window=quiet_window,
+            timeout=timeout,
+            max_inflight_requests=max_inflight_requests
+        )
 
     def find_element_by_xpath(
             self,
@@ -214,13 +304,15 @@ class WebDriver:
             immediate_text=immediate_text
         )
 
-    def find_element_by_html(self, target_element_html, identifying_attributes=('id', 'aria-label', 'class'), always_return_single_element: bool = False):
+    def find_element_by_html(self, target_element_html, identifying_attributes=('id', 'aria-label', 'class'), always_return_single_element: bool = False, matching_engine: str = 'python', selector_cache=None):
         from boba_web_agent.automation.web_automatoin.selenium.element_selection import find_element_by_html
         return find_element_by_html(
             driver=self.driver,
             target_element_html=target_element_html,
             identifying_attributes=identifying_attributes,
-            always_return_single_element=always_return_single_element
+            always_return_single_element=always_return_single_element,
+            matching_engine=matching_engine,
+            selector_cache=selector_cache
         )
 
     def capture_full_page_screenshot(
@@ -229,7 +321,8 @@ class WebDriver:
             center_element: WebElement = None,
             restore_window_size: bool = False,
             reset_zoom: bool = True,
-            use_cdp_cmd_for_chrome: bool = False
+            use_cdp_cmd_for_chrome: bool = False,
+            quiet_window: float = None
     ):
         from boba_web_agent.automation.web_automatoin.selenium.actions import capture_full_page_screenshot
         capture_full_page_screenshot(
@@ -238,18 +331,31 @@ class WebDriver:
             center_element=center_element,
             restore_window_size=restore_window_size,
             reset_zoom=reset_zoom,
-            use_cdp_cmd_for_chrome=use_cdp_cmd_for_chrome
+            use_cdp_cmd_for_chrome=use_cdp_cmd_for_chrome,
+            quiet_window=quiet_window
         )
 
-    def execute_single_action(self, element: WebElement, action_name: str, action_args: Mapping = None):
+    def execute_single_action(self, element: WebElement, action_name: str, action_args: Mapping = None, quiet_window: float = None, input_text_policy=None):
         from boba_web_agent.automation.web_automatoin.selenium.execution import execute_single_action
         execute_single_action(
             driver=self.driver,
             element=element,
             action_name=action_name,
-            action_args=action_args
+            action_args=action_args,
+            quiet_window=quiet_window,
+            input_text_policy=input_text_policy
         )
 
+    def evaluate_element_conditions(self, conditions: ElementConditions, elements_dict: ElementDict = None, **kwargs) -> Mapping[str, Any]:
+        """Evaluates the element conditions inside the page in a single round trip; see `evaluate_element_conditions`."""
+        from boba_web_agent.automation.web_automatoin.selenium.conditions import evaluate_element_conditions
+        return evaluate_element_conditions(driver=self.driver, conditions=conditions, elements_dict=elements_dict, **kwargs)
+
+    def wait_for_element_conditions(self, conditions: ElementConditions, timeout: float = 10, elements_dict: ElementDict = None, **kwargs) -> Mapping[str, Any]:
+        """Waits until the element conditions hold by a MutationObserver in the page; see `wait_for_element_conditions`."""
+        from boba_web_agent.automation.web_automatoin.selenium.conditions import wait_for_element_conditions
+        return wait_for_element_conditions(driver=self.driver, conditions=conditions, timeout=timeout, elements_dict=elements_dict, **kwargs)
+
     def execute_actions(
             self,
             actions: Mapping,
@@ -258,6 +364,17 @@ class WebDriver:
             repeat_when: ElementConditions = None,
             elements_dict: ElementDict = None,
             output_path_action_records: str = None,
+            quiet_window: float = None,
+            input_text_policy=None,
+            use_html_snapshot_store: bool = False,
+            screenshot_mode: str = 'full_page',
+            screenshot_format: str = 'png',
+            screenshot_quality: int = None,
+            dedup_screenshots: bool = False,
+            compress_html: bool = False,
+            max_record_queue_size: int = 4,
+            cond_timeout: float = None,
+            repeat_cond_timeout: float = None,
             **kwargs
     ):
         from boba_web_agent.automation.web_automatoin.selenium.execution import execute_actions
@@ -269,5 +386,32 @@ class WebDriver:
             repeat_when=repeat_when,
             elements_dict=elements_dict,
             output_path_action_records=output_path_action_records,
+            quiet_window=quiet_window,
+            input_text_policy=input_text_policy,
+            use_html_snapshot_store=use_html_snapshot_store,
+            screenshot_mode=screenshot_mode,
+            screenshot_format=screenshot_format,
+            screenshot_quality=screenshot_quality,
+            dedup_screenshots=dedup_screenshots,
+            compress_html=compress_html,
+            max_record_queue_size=max_record_queue_size,
+            cond_timeout=cond_timeout,
+            repeat_cond_timeout=repeat_cond_timeout,
+            **kwargs
+        )
+
+    def execute_task_plan(
+            self,
+            plan,
+            elements_dict: ElementDict = None,
+            output_path_action_records: str = None,
+            **kwargs
+    ):
+        from boba_web_agent.automation.web_automatoin.selenium.execution import execute_task_plan
+        execute_task_plan(
+            driver=self.driver,
+            plan=plan,
+            elements_dict=elements_dict,
+            output_path_action_records=output_path_action_records,
             **kwargs
         )
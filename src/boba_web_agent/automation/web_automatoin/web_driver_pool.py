@@ -0,0 +1,336 @@
+import threading
+from contextlib import contextmanager
+from queue import Queue, Empty
+from typing import Optional, Iterator, Set
+from urllib.parse import urlparse
+
+from selenium.common import WebDriverException
+
+from boba_web_agent.automation.web_automatoin.web_driver import WebDriver
+
+# put into the idle queue when the last driver has failed to launch, to wake up the callers blocked in `acquire`
+_NO_DRIVER_LEFT = object()
+# put into the idle queue when the pool is closed, to wake up the callers blocked in `acquire`
+_POOL_CLOSED = object()
+
+GET_JS_HEAP_SIZE_SCRIPT = "return (window.performance && window.performance.memory) ? window.performance.memory.usedJSHeapSize : null"
+
+
+def get_browser_memory_usage(driver) -> Optional[int]:
+    """
+    Gets the memory usage in bytes of the browser behind a Selenium driver.
+
+    Sums up the resident memory of the browser processes if `psutil` is installed and the browser processes are found,
+    i.e. the descendants of the driver process, and the process tree of `driver.browser_pid` if the driver has one
+    (e.g. `UndetectedChrome`, which starts the browser detached from the driver process); otherwise falls back to
+    the JS heap size of the current page reported by Chrome-based browsers. Returns None if neither is available.
+    """
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+
+    if psutil is not None:
+        processes = {}
+        service_process = getattr(getattr(driver, 'service', None), 'process', None)
+        if service_process is not None:
+            try:
+                for process in psutil.Process(service_process.pid).children(recursive=True):
+                    processes[process.pid] = process
+            except psutil.Error:
+                pass
+        browser_pid = getattr(driver, 'browser_pid', None)
+        if browser_pid:
+            try:
+                browser_process = psutil.Process(browser_pid)
+                for process in (browser_process, *browser_process.children(recursive=True)):
+                    processes[process.pid] = process
+            except psutil.Error:
+                pass
+        memory_usage = 0
+        for process in processes.values():
+            try:
+                memory_usage += process.memory_info().rss
+            except psutil.Error:
+                # a process of the browser may have exited meanwhile
+                pass
+        if memory_usage:
+            return memory_usage
+
+    try:
+        return driver.execute_script(GET_JS_HEAP_SIZE_SCRIPT)
+    except WebDriverException:
+        return None
+
+
+def _get_origin(url: str) -> Optional[str]:
+    url = urlparse(url)
+    if url.scheme in ('http', 'https'):
+        return f'{url.scheme}://{url.netloc}'
+
+
+def get_visited_origins(driver) -> Set[str]:
+    """
+    Gets the http(s) origins visited in the open tabs of a Chrome-based driver, from the navigation history
+    of each tab (not only its current page) and the frames of its current page; switches to each tab to do so.
+    """
+    origins = set()
+    for window_handle in driver.window_handles:
+        driver.switch_to.window(window_handle)
+        history = driver.execute_cdp_cmd('Page.getNavigationHistory', {})
+        urls = [entry['url'] for entry in history['entries']]
+        frame_trees = [driver.execute_cdp_cmd('Page.getFrameTree', {})['frameTree']]
+        while frame_trees:
+            frame_tree = frame_trees.pop()
+            urls.append(frame_tree['frame']['url'])
+            frame_trees.extend(frame_tree.get('childFrames', ()))
+        origins.update(filter(None, map(_get_origin, urls)))
+    return origins
+
+
+def reset_driver_session(driver, origins=()) -> bool:
+    """
+    Resets the browser session cheaply without relaunching the browser: closes extra tabs,
+    clears cookies, cache and storage, and navigates to `about:blank`.
+
+    Storage (e.g. localStorage and IndexedDB) can only be cleared per origin. For Chrome-based drivers, it is cleared
+    through the DevTools protocol for `origins` and all origins in the navigation history of the open tabs
+    (see `get_visited_origins`); for other drivers only the storage of the current page can be cleared.
+
+    Returns:
+        True if the storage of all visited origins is cleared; False if storage of other origins may be left,
+        in which case the browser should be relaunched to not leak state to the next session.
+    """
+    cdp_available = hasattr(driver, 'execute_cdp_cmd')
+    origins = set(origins)
+    if cdp_available:
+        origins.update(get_visited_origins(driver))
+
+    window_handles = driver.window_handles
+    for window_handle in reversed(window_handles):
+        if window_handle != window_handles[0]:
+            driver.switch_to.window(window_handle)
+            driver.close()
+    driver.switch_to.window(window_handles[0])
+
+    if cdp_available:
+        driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        driver.execute_cdp_cmd('Network.clearBrowserCache', {})
+        for origin in origins:
+            driver.execute_cdp_cmd('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+        fully_cleared = True
+    else:
+        driver.delete_all_cookies()
+        try:
+            driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+        except WebDriverException:
+            pass
+        fully_cleared = False
+
+    driver.get('about:blank')
+    return fully_cleared
+
+
+class WebDriverPool:
+    """
+    Keeps a number of pre-launched `WebDriver` instances warm and leases them to callers.
+
+    A returned driver is reset by `reset_driver_session` instead of being relaunched. A driver is recycled
+    (quit and replaced by a newly launched one in the background) after `max_uses` leases, when its memory usage
+    exceeds `max_memory_bytes`, when its reset fails (e.g. the browser has crashed), or when its reset cannot
+    clear the storage of all visited origins (drivers without the DevTools protocol, e.g. Firefox).
+
+    A driver launch is tried `launch_retries` more times if it fails. The pool raises from `__init__` if any initial
+    driver fails to launch; a failed relaunch of a recycled driver is kept in `launch_errors`, and `acquire` raises
+    once no driver is left instead of blocking forever.
+
+    Examples:
+        >>> pool = WebDriverPool(size=4, max_uses=50, headless=True)  # doctest: +SKIP
+        >>> with pool.lease() as driver:  # doctest: +SKIP
+        ...     driver.open_url('https://www.google.com')
+        >>> pool.close()  # doctest: +SKIP
+    """
+
+    def __init__(
+            self,
+            size: int = 2,
+            max_uses: int = 100,
+            max_memory_bytes: int = None,
+            launch_retries: int = 2,
+            **driver_kwargs
+    ):
+        """
+        Args:
+            size: The number of drivers to keep.
+            max_uses: Recycles a driver after it has been leased this many times.
+            max_memory_bytes: Recycles a driver when its memory usage is above this number of bytes.
+            launch_retries: The number of times to retry a failed driver launch.
+            **driver_kwargs: Arguments to construct each `WebDriver`, e.g. `driver_type` and `headless`.
+        """
+        self.size = size
+        self.max_uses = max_uses
+        self.max_memory_bytes = max_memory_bytes
+        self.launch_retries = launch_retries
+        self.driver_kwargs = driver_kwargs
+        self.launch_errors = []
+        self._idle_drivers: Queue = Queue()
+        self._use_counts = {}
+        self._leased_drivers = set()
+        # the drivers alive or being launched
+        self._driver_count = size
+        self._lock = threading.Lock()
+        self._closed = False
+
+        launch_threads = [threading.Thread(target=self._launch_driver, daemon=True) for _ in range(size)]
+        for launch_thread in launch_threads:
+            launch_thread.start()
+        for launch_thread in launch_threads:
+            launch_thread.join()
+        if self.launch_errors:
+            self.close()
+            raise RuntimeError(
+                f"failed to launch {len(self.launch_errors)} of the {size} web drivers of the pool"
+            ) from self.launch_errors[0]
+
+    def _launch_driver(self):
+        launch_error = None
+        for _ in range(self.launch_retries + 1):
+            try:
+                web_driver = WebDriver(**self.driver_kwargs)
+                break
+            except Exception as error:
+                launch_error = error
+        else:
+            with self._lock:
+                self.launch_errors.append(launch_error)
+                self._driver_count -= 1
+                if self._driver_count == 0:
+                    # wakes up the callers blocked in `acquire`
+                    self._idle_drivers.put(_NO_DRIVER_LEFT)
+            return
+
+        with self._lock:
+            if self._closed:
+                web_driver.driver.quit()
+                return
+            self._use_counts[web_driver] = 0
+            # put under the lock, so that `close` either finds it in the idle queue or it sees the pool closed
+            self._idle_drivers.put(web_driver)
+
+    def _raise_no_driver_left(self):
+        raise RuntimeError("no web driver is left in the pool; the drivers failed to launch") from (
+            self.launch_errors[-1] if self.launch_errors else None
+        )
+
+    def _recycle_driver(self, web_driver: WebDriver):
+        with self._lock:
+            self._use_counts.pop(web_driver, None)
+        try:
+            web_driver.driver.quit()
+        except Exception:
+            # the browser may already be gone
+            pass
+        threading.Thread(target=self._launch_driver, daemon=True).start()
+
+    def acquire(self, timeout: float = None) -> WebDriver:
+        """
+        Leases a warm driver; blocks until one is available or `timeout` seconds have passed.
+
+        Raises:
+            TimeoutError: If no driver becomes available within the timeout.
+            RuntimeError: If the pool is closed, or no driver is left because the drivers failed to launch.
+        """
+        if self._closed:
+            raise RuntimeError("the web driver pool has been closed")
+        with self._lock:
+            if self._driver_count == 0:
+                self._raise_no_driver_left()
+        try:
+            web_driver = self._idle_drivers.get(timeout=timeout)
+        except Empty:
+            raise TimeoutError(f"no web driver is available in the pool after {timeout} seconds")
+        if web_driver is _POOL_CLOSED:
+            # passes the wake-up on to the other blocked callers
+            self._idle_drivers.put(_POOL_CLOSED)
+            raise RuntimeError("the web driver pool has been closed")
+        if web_driver is _NO_DRIVER_LEFT:
+            # passes the wake-up on to the other blocked callers
+            self._idle_drivers.put(_NO_DRIVER_LEFT)
+            self._raise_no_driver_left()
+        with self._lock:
+            self._use_counts[web_driver] += 1
+            self._leased_drivers.add(web_driver)
+        return web_driver
+
+    def release(self, web_driver: WebDriver):
+        """
+        Returns a leased driver to the pool; resets it, or recycles it if it is worn out.
+
+        Raises:
+            ValueError: If the driver is not currently leased from this pool, e.g. it is already released.
+        """
+        with self._lock:
+            if web_driver not in self._leased_drivers:
+                raise ValueError("the web driver is not leased from this pool or has already been released")
+            self._leased_drivers.discard(web_driver)
+            use_count = self._use_counts[web_driver]
+
+        if self._closed:
+            web_driver.driver.quit()
+            return
+
+        recycle = use_count >= self.max_uses
+        if not recycle and self.max_memory_bytes is not None:
+            memory_usage = get_browser_memory_usage(web_driver.driver)
+            recycle = memory_usage is not None and memory_usage > self.max_memory_bytes
+        if not recycle:
+            try:
+                recycle = not reset_driver_session(web_driver.driver)
+            except Exception:
+                # a crashed browser may also surface as connection errors from the driver's http client
+                recycle = True
+
+        if recycle:
+            self._recycle_driver(web_driver)
+            return
+        with self._lock:
+            if not self._closed:
+                self._idle_drivers.put(web_driver)
+                return
+        web_driver.driver.quit()
+
+    @contextmanager
+    def lease(self, timeout: float = None) -> Iterator[WebDriver]:
+        web_driver = self.acquire(timeout=timeout)
+        try:
+            yield web_driver
+        finally:
+            self.release(web_driver)
+
+    def close(self):
+        """
+        Quits all idle drivers; drivers still leased, or still being launched, are quit when released or launched.
+        Callers blocked in `acquire` raise.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        while True:
+            try:
+                web_driver = self._idle_drivers.get_nowait()
+            except Empty:
+                break
+            if web_driver is _NO_DRIVER_LEFT:
+                continue
+            try:
+                web_driver.driver.quit()
+            except WebDriverException:
+                pass
+        self._idle_drivers.put(_POOL_CLOSED)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
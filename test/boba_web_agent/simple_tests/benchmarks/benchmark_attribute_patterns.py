@@ -0,0 +1,46 @@
+import glob
+import time
+from os import path
+
+from bs4 import BeautifulSoup
+
+from boba_python_utils.string_utils import string_check
+from boba_web_agent.automation.web_automatoin.html_utils import (
+    compile_attribute_patterns,
+    get_attribute_names_excluding_pattern,
+    DEFAULT_HTML_CLEAN_ATTRIBUTE_TO_KEEP
+)
+
+recordings_root = path.join(
+    path.dirname(__file__), '..', '..', 'integrated_tests', 'action_sequence_reproduce', 'test_case_recordings'
+)
+html_file_paths = sorted(glob.glob(path.join(recordings_root, '**', '*.html'), recursive=True))
+elements = []
+for html_file_path in html_file_paths:
+    with open(html_file_path, encoding='utf-8') as f:
+        elements.extend(BeautifulSoup(f.read(), 'html.parser').find_all())
+
+
+def _get_attribute_names_excluding_pattern_uncompiled(element, attribute_pattern):
+    # the per-(attribute, pattern) checks before patterns are compiled
+    return [
+        attr for attr in element.attrs
+        if not any(string_check(attr, attr_pattern) for attr_pattern in attribute_pattern)
+    ]
+
+
+attribute_pattern = list(DEFAULT_HTML_CLEAN_ATTRIBUTE_TO_KEEP)
+start_time = time.perf_counter()
+uncompiled_results = [_get_attribute_names_excluding_pattern_uncompiled(element, attribute_pattern) for element in elements]
+uncompiled_seconds = time.perf_counter() - start_time
+
+compiled_attribute_pattern = compile_attribute_patterns(attribute_pattern)
+start_time = time.perf_counter()
+compiled_results = [get_attribute_names_excluding_pattern(element, compiled_attribute_pattern) for element in elements]
+compiled_seconds = time.perf_counter() - start_time
+
+assert compiled_results == uncompiled_results
+print(f'{len(elements)} elements from {len(html_file_paths)} pages')
+print(f'uncompiled: {uncompiled_seconds * 1e9 / len(elements):.0f} ns per element')
+print(f'compiled: {compiled_seconds * 1e9 / len(elements):.0f} ns per element')
+print(f'speedup: {uncompiled_seconds / compiled_seconds:.1f}x')
@@ -0,0 +1,67 @@
+import pytest
+from bs4 import Tag
+
+from boba_web_agent.automation.web_automatoin.html_parser_backends import (
+    HtmlParserBackends,
+    HTML_PARSER_BACKEND_CONFORMANCE_CASES,
+    check_html_parser_backend_conformance,
+    get_default_html_parser_backend,
+    is_html_parser_backend_available
+)
+from boba_web_agent.automation.web_automatoin.html_utils import (
+    add_unique_index_to_html,
+    clean_html,
+    find_element_by_any_attribute,
+    get_html_text,
+    get_tag_text_and_attributes_from_element_html
+)
+
+html_parser_backends = [
+    pytest.param(
+        parser_backend,
+        id=parser_backend.value,
+        marks=pytest.mark.skipif(
+            not is_html_parser_backend_available(parser_backend),
+            reason=f"the HTML parser backend '{parser_backend.value}' is not installed"
+        )
+    )
+    for parser_backend in HtmlParserBackends
+]
+
+
+def test_default_html_parser_backend():
+    assert get_default_html_parser_backend() == HtmlParserBackends.HTML_PARSER
+
+
+@pytest.mark.parametrize('parser_backend', html_parser_backends)
+def test_html_events(parser_backend):
+    assert check_html_parser_backend_conformance(parser_backend) == []
+
+
+@pytest.mark.parametrize('parser_backend', html_parser_backends)
+@pytest.mark.parametrize('html', HTML_PARSER_BACKEND_CONFORMANCE_CASES)
+def test_html_utils(parser_backend, html):
+    reference_parser_backend = HtmlParserBackends.HTML_PARSER
+    assert (
+            get_tag_text_and_attributes_from_element_html(html, parser_backend=parser_backend)
+            == get_tag_text_and_attributes_from_element_html(html, parser_backend=reference_parser_backend)
+    )
+    assert clean_html(html, parser_backend=parser_backend) == clean_html(html, parser_backend=reference_parser_backend)
+    assert add_unique_index_to_html(html, parser_backend=parser_backend) == add_unique_index_to_html(html, parser_backend=reference_parser_backend)
+    assert get_html_text(html, parser_backend=parser_backend) == get_html_text(html, parser_backend=reference_parser_backend)
+
+
+@pytest.mark.parametrize('parser_backend', html_parser_backends)
+@pytest.mark.parametrize('attributes', [{'id': 'main'}, {'class': 'btn'}, {'href': '/b'}, {'__id__': 'none', 'type': 'submit'}])
+def test_find_element_by_any_attribute(parser_backend, attributes):
+    html = ''.join(HTML_PARSER_BACKEND_CONFORMANCE_CASES)
+    found_element = find_element_by_any_attribute(html, attributes, parser_backend=parser_backend)
+    reference_element = find_element_by_any_attribute(html, attributes, parser_backend=HtmlParserBackends.HTML_PARSER)
+    assert isinstance(found_element, Tag)
+    assert str(found_element) == str(reference_element)
+    assert found_element.attrs == reference_element.attrs
+
+
+@pytest.mark.parametrize('parser_backend', html_parser_backends)
+def test_find_element_by_any_attribute_not_found(parser_backend):
+    assert find_element_by_any_attribute('<div id="a">A</div>', {'id': 'b'}, parser_backend=parser_backend) is None